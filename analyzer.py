@@ -1,33 +1,142 @@
-import cv2
-import numpy as np
+# analyzer.py
+# Быстрый анализатор на OpenCV: контуры свечей в зоне графика -> OHLC каждой свечи + тренд.
+#
+#   a = Analyzer()
+#   signal, prob, exp = a.analyze_image("screenshots/1.png")   # декодирование с уменьшением
+#   res = a.analyze(bgr)                                         # уже декодированный кадр (BGR)
+#
+# Для потока кадров: буферы gray/threshold выделяются один раз и переиспользуются, пока не
+# поменяется размер кадра; зона графика (ROI) — срез без копии. analyze_image декодирует PNG
+# сразу в уменьшенном виде (IMREAD_REDUCED_*) — контурам свечей полное разрешение не нужно.
+#
+# Координаты (support_px, resistance_px, свечи) — px полного разрешения относительно зоны
+# графика (ROI), как было всегда; screen_coords=True — относительно всего экрана (0 сверху).
+# auto_theme=True — порог по теме графика (тёмный фон — свечи светлее фона); по умолчанию,
+# как раньше, порог светлой темы.
+
+from lazy_import import lazy_module
+from engines import expiry_for
+
+# cv2 грузится ~секунду на телефоне — только при первом анализе (нет пакета — ImportError сразу)
+cv2 = lazy_module("cv2")
+np = lazy_module("numpy")
+
+ROI = (0.1, 0.15, 0.9, 0.55)   # зона свечей: left, top, right, bottom — доли кадра
+LIGHT_THRESHOLD = 180          # светлая тема: свеча — всё, что темнее фона
+DARK_THRESHOLD = 60            # тёмная тема: свеча — всё, что светлее фона
+AUTO_THEME = False             # True — выбирать порог по средней яркости зоны (тёмная/светлая тема)
+SCREEN_COORDS = False          # True — координаты относительно экрана, а не зоны графика
+MIN_CANDLE_H = 20              # px полного разрешения — мельче не свеча
+MIN_CANDLE_W = 5
+MAX_CANDLE_W_RATIO = 0.1       # шире этой доли зоны — линия сетки/плашка, а не свеча
+BODY_WIDTH_RATIO = 0.5         # строки контура шириной от этой доли максимума — тело, остальное — фитили
+MIN_ROI_WIDTH = 320            # px — уменьшать декодирование, пока зона не уже этого
+REDUCE_FLAGS = {1: "IMREAD_COLOR", 2: "IMREAD_REDUCED_COLOR_2",
+                4: "IMREAD_REDUCED_COLOR_4", 8: "IMREAD_REDUCED_COLOR_8"}
+
 
 class Analyzer:
 
-    def analyze(self, img):
+    def __init__(self, roi=ROI, reduce=None, auto_theme=AUTO_THEME, screen_coords=SCREEN_COORDS):
+        """reduce — 1/2/4/8 для analyze_image; None — подбирается по размеру кадра.
+           auto_theme / screen_coords — см. AUTO_THEME / SCREEN_COORDS."""
+        self.roi = roi
+        self.reduce = reduce
+        self.auto_theme = auto_theme
+        self.screen_coords = screen_coords
+        self._shape = None     # (h, w) ROI, под который выделены буферы
+        self._gray = None
+        self._th = None
+        self._full_size = None  # (w, h) полного кадра — для выбора уменьшения
+
+    # ----- буферы -----
+    def _buffers(self, h, w):
+        if self._shape != (h, w):
+            self._gray = np.empty((h, w), np.uint8)
+            self._th = np.empty((h, w), np.uint8)
+            self._shape = (h, w)
+        return self._gray, self._th
+
+    def _reduce_for(self):
+        if self.reduce:
+            return self.reduce
+        if self._full_size is None:
+            return 1           # первый кадр — в полном размере, заодно узнаём разрешение экрана
+        roi_w = self._full_size[0] * (self.roi[2] - self.roi[0])
+        for k in (8, 4, 2):
+            if roi_w / k >= MIN_ROI_WIDTH:
+                return k
+        return 1
+
+    # ----- контуры -> свечи -----
+    def _candle(self, roi, th, x, y, cw, ch, rgb=False):
+        """OHLC одной свечи по её контуру (в px ROI): тело — широкие строки, фитили — узкие."""
+        box = th[y:y + ch, x:x + cw]
+        widths = np.count_nonzero(box, axis=1)
+        rows = np.flatnonzero(widths >= max(widths.max() * BODY_WIDTH_RATIO, 1))
+        body_top, body_bottom = y + int(rows[0]), y + int(rows[-1])
+        # средний цвет только по пикселям свечи — фон не разбавляет
+        b, g, r, _ = cv2.mean(roi[body_top:body_bottom + 1, x:x + cw], mask=box[rows[0]:rows[-1] + 1])
+        if rgb:
+            b, r = r, b
+        color = 'up' if g > r else 'down'
+        return {
+            'x': x + cw / 2.0,
+            'open': body_bottom if color == 'up' else body_top,
+            'close': body_top if color == 'up' else body_bottom,
+            'high': y,
+            'low': y + ch - 1,
+            'color': color,
+        }
+
+    def analyze(self, img, scale=1, rgb=False):
+        """img — BGR-кадр (H, W, 3|4), при rgb=True — RGB (без перестановки каналов), или frame.Frame
+           (его 4-канальный буфер, без копии); scale — во сколько раз он уменьшен относительно экрана."""
+        if hasattr(img, "buf"):
+            img, rgb = img.buf, True
         h, w = img.shape[:2]
+        top, bottom = int(h * self.roi[1]), int(h * self.roi[3])
+        left, right = int(w * self.roi[0]), int(w * self.roi[2])
 
-        # --- Зона свечей (примерно 1/3 сверху экрана) ---
-        candles_roi = img[int(h*0.15):int(h*0.55), int(w*0.1):int(w*0.9)]
-        gray = cv2.cvtColor(candles_roi, cv2.COLOR_BGR2GRAY)
-        _, th = cv2.threshold(gray, 180, 255, cv2.THRESH_BINARY_INV)
+        # --- Зона свечей: срез без копии, gray/threshold — в готовые буферы ---
+        candles_roi = img[top:bottom, left:right]
+        gray, th = self._buffers(bottom - top, right - left)
+        if img.shape[2] == 4:
+            code = cv2.COLOR_RGBA2GRAY if rgb else cv2.COLOR_BGRA2GRAY
+        else:
+            code = cv2.COLOR_RGB2GRAY if rgb else cv2.COLOR_BGR2GRAY
+        cv2.cvtColor(candles_roi, code, dst=gray)
+        if self.auto_theme and cv2.mean(gray)[0] < 128:
+            cv2.threshold(gray, DARK_THRESHOLD, 255, cv2.THRESH_BINARY, dst=th)
+        else:
+            cv2.threshold(gray, LIGHT_THRESHOLD, 255, cv2.THRESH_BINARY_INV, dst=th)
 
         # --- Контуры свечей ---
         contours, _ = cv2.findContours(th, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        min_h = max(int(MIN_CANDLE_H / scale), 1)
+        min_w = max(int(MIN_CANDLE_W / scale), 1)
+        max_w = (right - left) * MAX_CANDLE_W_RATIO
 
-        candle_centers = []
-
+        candles = []
         for c in contours:
             x, y, cw, ch = cv2.boundingRect(c)
-
-            # фильтрация мелких точек
-            if ch < 20 or cw < 5:
+            # фильтрация мелких точек и линий сетки
+            if ch < min_h or cw < min_w or cw > max_w:
                 continue
+            candles.append(self._candle(candles_roi, th, x, y, cw, ch, rgb))
+        candles.sort(key=lambda c: c['x'])
 
-            cx = x + cw // 2
-            cy = y + ch // 2
-            candle_centers.append((cx, cy))
-
-        candle_centers = sorted(candle_centers)
+        # в px полного разрешения: от зоны графика или (screen_coords) от экрана;
+        # центр — y + h // 2 по рамке контура, как считался всегда
+        dx, dy = (left, top) if self.screen_coords else (0, 0)
+        candle_centers = []
+        for c in candles:
+            cy = c['high'] + (c['low'] - c['high'] + 1) // 2
+            candle_centers.append((int((dx + c['x']) * scale), int((dy + cy) * scale)))
+        for c in candles:
+            c['x'] = int((dx + c['x']) * scale)
+            for k in ('open', 'close', 'high', 'low'):
+                c[k] = int((dy + c[k]) * scale)
 
         # --- Определение тренда ---
         trend = "FLAT"
@@ -45,8 +154,8 @@ class Analyzer:
                 probability = 65.0
 
         # --- Уровни поддержки/сопротивления ---
-        support = np.min([cy for _, cy in candle_centers]) if candle_centers else None
-        resistance = np.max([cy for _, cy in candle_centers]) if candle_centers else None
+        support = min(cy for _, cy in candle_centers) if candle_centers else None
+        resistance = max(cy for _, cy in candle_centers) if candle_centers else None
 
         # --- Сигнал ---
         if trend == "UP":
@@ -60,6 +169,23 @@ class Analyzer:
             "signal": signal,
             "prob": probability,
             "trend": trend,
-            "support_px": int(support) if support else 0,
-            "resistance_px": int(resistance) if resistance else 0
-        }
\ No newline at end of file
+            "expiry_min": expiry_for(probability),
+            "support_px": int(support) if support is not None else 0,
+            "resistance_px": int(resistance) if resistance is not None else 0,
+            "candles": candles,
+        }
+
+    def analyze_file(self, path):
+        """Декодирует файл (с уменьшением, если можно) и возвращает полный результат analyze."""
+        k = self._reduce_for()
+        img = cv2.imread(path, getattr(cv2, REDUCE_FLAGS[k]))
+        if img is None:
+            raise ValueError(f"не удалось прочитать {path}")
+        h, w = img.shape[:2]
+        self._full_size = (w * k, h * k)
+        return self.analyze(img, scale=k)
+
+    def analyze_image(self, path):
+        """Файл или frame.Frame -> (signal, prob, exp): то, что ждёт run_screenshot_analyzer."""
+        res = self.analyze(path) if hasattr(path, "buf") else self.analyze_file(path)
+        return res["signal"], res["prob"], res["expiry_min"]
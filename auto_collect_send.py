@@ -3,6 +3,9 @@ import os
 import time
 import shutil
 from machine_learning import predict_direction
+from candle_analyzer import extract_candles_from_image
+from capture import grab_raw, publish_frame, default_archiver
+from frame import Frame
 
 try:
     import androidhelper
@@ -22,10 +25,21 @@ if not os.path.exists(BATCH_FOLDER):
     os.makedirs(BATCH_FOLDER)
 
 def take_screenshot():
+    """
+    Снимок экрана -> frame.Frame (frame.path — путь PNG в SCREENSHOT_FOLDER).
+    Если доступен screencap — сырые пиксели сразу идут в анализ (capture.py), а PNG и копия
+    в пакет пишутся в фоне. Иначе — как раньше: PNG через droid.screenshot и его декодирование.
+    """
     ts = time.strftime("%Y%m%d-%H%M%S")
-    filepath = os.path.join(SCREENSHOT_FOLDER, f"Screenshot_{ts}.png")
+    name = f"Screenshot_{ts}.png"
+    filepath = os.path.join(SCREENSHOT_FOLDER, name)
+    try:
+        return publish_frame(grab_raw(), filepath, os.path.join(BATCH_FOLDER, name))
+    except (OSError, ValueError):
+        pass
     droid.screenshot(filepath)
-    return filepath
+    shutil.copy(filepath, BATCH_FOLDER)
+    return Frame.from_file(filepath)
 
 def choose_expiration(probability):
     if probability < 0.7:
@@ -40,6 +54,7 @@ def send_batch_to_server(batch_folder=BATCH_FOLDER):
     Отправка пакета скриншотов на ноутбук через scp.
     Нужно, чтобы на ноутбуке был доступ по SSH.
     """
+    default_archiver().flush()  # дописываем PNG, которые ещё в фоновой очереди
     os.system(f"scp {batch_folder}/*.png user@{SERVER_IP}:{SERVER_FOLDER}")
     # После отправки очищаем папку
     for f in os.listdir(batch_folder):
@@ -51,14 +66,17 @@ def main():
     print("Авто-сбор скриншотов с отправкой на ноутбук каждые 1000 штук")
     
     while True:
-        screenshot_path = take_screenshot()
-        signal, prob = predict_direction()
+        frame = take_screenshot()
+        screenshot_path = frame.path
+        try:
+            candles = extract_candles_from_image(frame)
+        except Exception as e:
+            print("Не удалось извлечь свечи:", e)
+            candles = None
+        signal, prob = predict_direction(candles)
         exp = choose_expiration(prob/100)
         collected_count += 1
 
-        # Копируем скриншот в папку пакета
-        shutil.copy(screenshot_path, BATCH_FOLDER)
-
         print(f"[{time.strftime('%H:%M:%S')}] {screenshot_path} | Сигнал: {signal} | Вероятность: {prob:.2f}% | Экспирация: {exp} мин | Собрано: {collected_count}")
 
         if collected_count >= BATCH_SIZE:
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# backtest.py
+# Пакетный прогон candle_analyzer.predict_from_image по архиву скриншотов.
+# Запуск:
+#   python3 backtest.py screenshots/ -o backtest_out
+#   python3 backtest.py "archive/2025-11-*/*.png" -o bt_ratio55 --set AUTO_LAYOUT=0 --set RIGHT_REGION_RATIO=0.55 --set NUM_CANDLES=24
+#
+# - пул процессов по числу ядер, работа раздаётся пачками (CHUNK_SIZE файлов),
+#   каждый воркер один раз импортирует анализатор и применяет --set параметры;
+# - результаты пишутся по мере готовности в колоночные сегменты seg_XXXXXX.npz
+#   (по массиву на колонку, сжатые), в памяти держится не больше MAX_IN_FLIGHT пачек;
+# - повторный запуск с тем же -o пропускает уже посчитанные файлы (возобновление);
+#   в out_dir лежит manifest.json с параметрами анализатора и --set: если они другие,
+#   возобновлять нельзя (старые результаты посчитаны другим анализатором) — нужен другой -o.
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg')
+CHUNK_SIZE = 64          # файлов в одной единице работы
+MAX_IN_FLIGHT = 2        # пачек в очереди на каждый процесс
+SEGMENT_PREFIX = "seg_"
+MANIFEST_FILE = "manifest.json"
+FEATURE_KEYS = ('last_change', 'avg_change', 'up_count', 'down_count', 'volatility', 'range_ratio', 'slope')
+
+
+def list_images(source):
+    """Каталог или glob-шаблон -> отсортированный список путей к картинкам."""
+    if os.path.isdir(source):
+        with os.scandir(source) as it:
+            paths = [e.path for e in it if e.is_file() and e.name.lower().endswith(IMAGE_EXTS)]
+    else:
+        paths = [p for p in glob.glob(source, recursive=True) if p.lower().endswith(IMAGE_EXTS)]
+    return sorted(paths)
+
+
+def parse_overrides(items):
+    """['NUM_CANDLES=24', 'RIGHT_REGION_RATIO=0.55'] -> {'NUM_CANDLES': 24, ...}
+       ValueError — не NAME=число."""
+    out = {}
+    for item in items or ():
+        name, sep, value = item.partition("=")
+        name, value = name.strip(), value.strip()
+        if not sep or not name:
+            raise ValueError(f"--set {item!r}: ожидается NAME=VALUE")
+        try:
+            out[name] = int(value)
+        except ValueError:
+            try:
+                out[name] = float(value)
+            except ValueError:
+                raise ValueError(f"--set {item!r}: значение должно быть числом") from None
+    return out
+
+
+def analyzer_params(overrides):
+    """Параметры candle_analyzer, от которых зависит результат, с учётом --set (для manifest.json).
+       ValueError — --set задаёт параметр, которого у анализатора нет."""
+    import candle_analyzer
+    unknown = [n for n in overrides if not hasattr(candle_analyzer, n)]
+    if unknown:
+        raise ValueError(f"у candle_analyzer нет параметров: {', '.join(unknown)}")
+    names = sorted(set(candle_analyzer.CACHE_PARAMS) | set(overrides))
+    return {n: repr(overrides[n] if n in overrides else getattr(candle_analyzer, n)) for n in names}
+
+
+def check_manifest(out_dir, params):
+    """Пишет manifest.json в новый out_dir; в существующем — сверяет параметры.
+       ValueError — в out_dir результаты с другими параметрами, возобновлять нельзя."""
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    manifest = {'analyzer': 'candle_analyzer.predict_from_image', 'params': params}
+    if os.path.exists(path):
+        with open(path) as f:
+            old = json.load(f)
+        if old != manifest:
+            changed = sorted(k for k in set(old.get('params', {})) | set(params)
+                             if old.get('params', {}).get(k) != params.get(k))
+            raise ValueError(f"{out_dir} посчитан с другими параметрами ({', '.join(changed) or 'анализатор'}); "
+                             f"укажите другой -o")
+        return
+    if _segments(out_dir):
+        raise ValueError(f"в {out_dir} сегменты без {MANIFEST_FILE} — параметры неизвестны; укажите другой -o")
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+# ----- воркер -----
+_analyzer = None
+
+
+def _init_worker(overrides):
+    """Один раз на процесс: импорт анализатора и подмена параметров модуля."""
+    global _analyzer
+    import candle_analyzer
+    for name, value in overrides.items():
+        if not hasattr(candle_analyzer, name):
+            raise AttributeError(f"candle_analyzer has no parameter {name}")
+        setattr(candle_analyzer, name, value)
+    _analyzer = candle_analyzer
+
+
+def _run_chunk(paths):
+    """Прогоняет пачку файлов и возвращает колонки (dict name -> list)."""
+    if _analyzer is None:
+        _init_worker({})
+    cols = {k: [] for k in ('path', 'signal', 'confidence', 'expiry_min', 'error', 'elapsed_ms') + FEATURE_KEYS}
+    for path in paths:
+        t0 = time.perf_counter()
+        try:
+            res = _analyzer.predict_from_image(path)
+            feats = res['features']
+            cols['signal'].append(res['signal'])
+            cols['confidence'].append(res['confidence'])
+            cols['expiry_min'].append(res['expiry_min'])
+            cols['error'].append("")
+            for k in FEATURE_KEYS:
+                cols[k].append(feats[k])
+        except Exception as e:
+            cols['signal'].append("ERROR")
+            cols['confidence'].append(np.nan)
+            cols['expiry_min'].append(0)
+            cols['error'].append(str(e)[:200])
+            for k in FEATURE_KEYS:
+                cols[k].append(np.nan)
+        cols['path'].append(path)
+        cols['elapsed_ms'].append((time.perf_counter() - t0) * 1000.0)
+    return cols
+
+
+# ----- сегменты -----
+def _segments(out_dir):
+    if not os.path.isdir(out_dir):
+        return []
+    return sorted(f for f in os.listdir(out_dir) if f.startswith(SEGMENT_PREFIX) and f.endswith(".npz"))
+
+
+def _write_segment(out_dir, index, cols):
+    """Атомарная запись одного колоночного сегмента (tmp + rename)."""
+    arrays = {
+        'path': np.array(cols['path'], dtype=str),
+        'signal': np.array(cols['signal'], dtype=str),
+        'error': np.array(cols['error'], dtype=str),
+        'confidence': np.array(cols['confidence'], dtype=np.float32),
+        'expiry_min': np.array(cols['expiry_min'], dtype=np.int8),
+        'elapsed_ms': np.array(cols['elapsed_ms'], dtype=np.float32),
+    }
+    for k in FEATURE_KEYS:
+        arrays[k] = np.array(cols[k], dtype=np.float32)
+    final = os.path.join(out_dir, f"{SEGMENT_PREFIX}{index:06d}.npz")
+    tmp = final + ".tmp"
+    with open(tmp, "wb") as f:
+        np.savez_compressed(f, **arrays)
+    os.replace(tmp, final)
+
+
+def done_files(out_dir):
+    """Множество файлов, уже посчитанных в out_dir (читается только колонка path)."""
+    done = set()
+    for seg in _segments(out_dir):
+        with np.load(os.path.join(out_dir, seg)) as z:
+            done.update(z['path'].tolist())
+    return done
+
+
+def load_results(out_dir, columns=None):
+    """Склеивает сегменты в dict колонка -> np.ndarray; columns — какие колонки читать."""
+    parts = {}
+    for seg in _segments(out_dir):
+        with np.load(os.path.join(out_dir, seg)) as z:
+            for k in (columns or z.files):
+                parts.setdefault(k, []).append(z[k])
+    return {k: np.concatenate(v) for k, v in parts.items()}
+
+
+# ----- прогон -----
+def run_backtest(source, out_dir, overrides=None, workers=None, chunk_size=CHUNK_SIZE, verbose=True):
+    """
+    Прогоняет predict_from_image по source (каталог или glob), пишет сегменты в out_dir.
+    Возвращает статистику: files, skipped, seconds, images_per_sec, images_per_sec_per_core.
+    ValueError — out_dir посчитан с другими параметрами (см. check_manifest).
+    """
+    overrides = overrides or {}
+    workers = workers or os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+    check_manifest(out_dir, analyzer_params(overrides))
+
+    paths = list_images(source)
+    done = done_files(out_dir)
+    todo = [p for p in paths if p not in done]
+    skipped = len(paths) - len(todo)
+    del done
+    segs = _segments(out_dir)
+    seg_index = int(segs[-1][len(SEGMENT_PREFIX):-4]) + 1 if segs else 0
+    if verbose:
+        print(f"Файлов: {len(paths)}, уже посчитано: {skipped}, к обработке: {len(todo)}, процессов: {workers}")
+
+    processed = 0
+    t_start = time.perf_counter()
+    chunks = (todo[i:i + chunk_size] for i in range(0, len(todo), chunk_size))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(overrides,)) as pool:
+        pending = set()
+        for chunk in chunks:
+            pending.add(pool.submit(_run_chunk, chunk))
+            # ограничиваем очередь, чтобы не держать все результаты в памяти
+            while len(pending) >= workers * MAX_IN_FLIGHT:
+                processed, seg_index = _drain(pending, out_dir, processed, seg_index, t_start, workers, verbose)
+        while pending:
+            processed, seg_index = _drain(pending, out_dir, processed, seg_index, t_start, workers, verbose)
+
+    seconds = time.perf_counter() - t_start
+    rate = processed / seconds if seconds > 0 else 0.0
+    stats = {
+        'files': processed,
+        'skipped': skipped,
+        'seconds': round(seconds, 3),
+        'images_per_sec': round(rate, 2),
+        'images_per_sec_per_core': round(rate / workers, 2),
+    }
+    if verbose:
+        print(f"Готово: {processed} файлов за {stats['seconds']} с — "
+              f"{stats['images_per_sec']} img/s, {stats['images_per_sec_per_core']} img/s/core")
+    return stats
+
+
+def _drain(pending, out_dir, processed, seg_index, t_start, workers, verbose):
+    finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for fut in finished:
+        pending.discard(fut)
+        cols = fut.result()
+        _write_segment(out_dir, seg_index, cols)
+        seg_index += 1
+        processed += len(cols['path'])
+        if verbose:
+            rate = processed / (time.perf_counter() - t_start)
+            print(f"  {processed} файлов, {rate:.1f} img/s, {rate / workers:.1f} img/s/core")
+    return processed, seg_index
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Бэктест candle_analyzer по архиву скриншотов")
+    ap.add_argument("source", help="каталог со скриншотами или glob-шаблон")
+    ap.add_argument("-o", "--out", default="backtest_out", help="каталог для сегментов результатов")
+    ap.add_argument("-j", "--workers", type=int, default=None, help="число процессов (по умолчанию — число ядер)")
+    ap.add_argument("--chunk", type=int, default=CHUNK_SIZE, help="файлов в одной пачке")
+    ap.add_argument("--set", action="append", metavar="NAME=VALUE",
+                    help="переопределить параметр candle_analyzer (AUTO_LAYOUT, RIGHT_REGION_RATIO, NUM_CANDLES, SLOPE_WEIGHT, ...)")
+    args = ap.parse_args(argv)
+    try:
+        overrides = parse_overrides(args.set)
+        analyzer_params(overrides)
+    except ValueError as e:
+        ap.error(str(e))
+    try:
+        run_backtest(args.source, args.out, overrides, args.workers, args.chunk)
+    except ValueError as e:
+        print("Ошибка:", e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
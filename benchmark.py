@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# benchmark.py
+# Воспроизводимый бенчмарк всех анализаторов на синтетических графиках (synthetic_chart.py).
+# Запуск:
+#   python3 benchmark.py -o bench_before.json
+#   python3 benchmark.py -o bench_after.json --compare bench_before.json
+#   python3 benchmark.py --width 720 --height 1600 --candles 60 --noise 8 --repeat 50
+#
+# По каждой функции: перцентили задержки (мс), изображений/сек, пик памяти (tracemalloc).
+# Анализатор без установленной зависимости (например, cv2 для analyzer.Analyzer) пропускается.
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+from synthetic_chart import make_chart
+
+REPEAT = 30
+WARMUP = 3
+REGRESSION_RATIO = 1.15   # на сколько p50 может вырасти, прежде чем считать регрессией
+
+
+def measure(fn, repeat=REPEAT, warmup=WARMUP):
+    """Прогоняет fn() и возвращает перцентили задержки, throughput и пик памяти."""
+    for _ in range(warmup):
+        fn()
+    times = np.empty(repeat)
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times[i] = time.perf_counter() - t0
+    # пик памяти — отдельным вызовом, tracemalloc заметно замедляет код
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    ms = times * 1000.0
+    return {
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p90_ms': round(float(np.percentile(ms, 90)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'mean_ms': round(float(ms.mean()), 3),
+        'min_ms': round(float(ms.min()), 3),
+        'images_per_sec': round(float(repeat / times.sum()), 2),
+        'peak_kb': round(peak / 1024.0, 1),
+    }
+
+
+def build_cases(img, path):
+    """Функции для замера: имя -> callable без аргументов (или строка-причина пропуска)."""
+    import candle_analyzer
+    import real_time_analyzer
+    import chart_layout
+    from frame import Frame
+
+    layout = candle_analyzer.frame_layout(img)
+    region, _ = candle_analyzer.crop_right_region(img, layout)
+    centers = candle_analyzer.estimate_candle_columns(region, layout)
+    candles = candle_analyzer.extract_candles_from_image(path)
+
+    cases = {
+        'candle_analyzer.extract_candles_from_image': lambda: candle_analyzer.extract_candles_from_image(path),
+        'candle_analyzer.analyze_column': lambda: candle_analyzer.analyze_column(region, centers[len(centers) // 2]),
+        'candle_analyzer.features_from_candles': lambda: candle_analyzer.features_from_candles(candles),
+        'candle_analyzer.predict_from_image': lambda: candle_analyzer.predict_from_image(path),
+        'real_time_analyzer.analyze_candles': lambda: real_time_analyzer.analyze_candles(img),
+        'chart_layout.detect_layout': lambda: chart_layout.detect_layout(img),
+        'frame.Frame.from_file': lambda: Frame.from_file(path),
+    }
+    # захват в память: сырые пиксели screencap -> Frame и круг через разделяемый буфер (capture.py)
+    import struct
+    import capture
+    w, h = img.size
+    raw = struct.pack("<III", w, h, 1) + img.convert("RGBA").tobytes()
+    shared = capture.SharedFrame(os.path.join(os.path.dirname(path), "frame.buf"))
+    frame = Frame.from_pil(img)
+    cases['capture.parse_raw_screencap'] = lambda: capture.parse_raw_screencap(raw)
+    cases['capture.SharedFrame.write+read'] = lambda: shared.read(shared.write(frame) - 2)
+    try:
+        from analyzer import Analyzer
+        bgr = np.ascontiguousarray(np.asarray(img)[:, :, ::-1])
+        analyzer = Analyzer()
+        cases['analyzer.Analyzer.analyze'] = lambda: analyzer.analyze(bgr)
+        cases['analyzer.Analyzer.analyze_image'] = lambda: analyzer.analyze_image(path)
+    except ImportError as e:
+        cases['analyzer.Analyzer.analyze'] = f"skipped: {e}"
+        cases['analyzer.Analyzer.analyze_image'] = f"skipped: {e}"
+    return cases
+
+
+def run(args):
+    img = make_chart(width=args.width, height=args.height, candles=args.candles,
+                     wick_scale=args.wick_scale, noise=args.noise, seed=args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.png")
+        img.save(path)
+        results = {}
+        for name, fn in build_cases(img, path).items():
+            if isinstance(fn, str):
+                results[name] = {'skipped': fn}
+            else:
+                results[name] = measure(fn, args.repeat, args.warmup)
+            print(f"{name:45s} {format_result(results[name])}")
+    return {
+        'created': time.strftime("%Y-%m-%d %H:%M:%S"),
+        'params': {k: getattr(args, k) for k in ('width', 'height', 'candles', 'wick_scale', 'noise', 'seed', 'repeat')},
+        'env': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'system': platform.system(),
+        },
+        'results': results,
+    }
+
+
+def format_result(r):
+    if 'skipped' in r:
+        return r['skipped']
+    return (f"p50={r['p50_ms']:.3f}ms p90={r['p90_ms']:.3f}ms p99={r['p99_ms']:.3f}ms "
+            f"{r['images_per_sec']:.1f}/s peak={r['peak_kb']:.0f}KB")
+
+
+def compare(current, baseline_path, ratio=REGRESSION_RATIO):
+    """Сравнение p50 с прошлым прогоном; возвращает число регрессий."""
+    with open(baseline_path) as f:
+        base = json.load(f)
+    if base.get('params') != current['params']:
+        print("⚠ параметры прогонов отличаются:", base.get('params'), "vs", current['params'])
+    regressions = 0
+    print(f"\nСравнение с {baseline_path}:")
+    for name, r in current['results'].items():
+        b = base.get('results', {}).get(name)
+        if not b or 'p50_ms' not in b or 'p50_ms' not in r:
+            continue
+        k = r['p50_ms'] / b['p50_ms'] if b['p50_ms'] else float('inf')
+        mark = "❌ регрессия" if k > ratio else ("✅ быстрее" if k < 1 / ratio else "")
+        regressions += k > ratio
+        print(f"{name:45s} {b['p50_ms']:.3f} -> {r['p50_ms']:.3f} ms (x{k:.2f}) {mark}")
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Бенчмарк анализаторов на синтетических графиках")
+    ap.add_argument("--width", type=int, default=1080)
+    ap.add_argument("--height", type=int, default=2400)
+    ap.add_argument("--candles", type=int, default=40)
+    ap.add_argument("--wick-scale", type=float, default=1.0)
+    ap.add_argument("--noise", type=float, default=4.0)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--repeat", type=int, default=REPEAT)
+    ap.add_argument("--warmup", type=int, default=WARMUP)
+    ap.add_argument("-o", "--out", help="сохранить результаты в JSON")
+    ap.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    args = ap.parse_args(argv)
+
+    report = run(args)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print("Сохранено:", args.out)
+    if args.compare:
+        return 1 if compare(report, args.compare) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,54 @@
-from PIL import Image
 import numpy as np
 import os
+import sys
+import time
+from result_cache import cached_by_file
+from frame_diff import ColumnCache
+from instrumentation import timed, span
+from indicators import INDICATORS, IncrementalIndicators, candles_to_ohlc, latest as indicators_latest
+from chart_layout import default_layouts
+from frame import Frame, as_frame, as_pil
 
-# Параметры — при необходимости подправь (ширина области справа, число свечей)
+# Область графика и колонки свечей ищутся автоматически (chart_layout, кэш по разрешению экрана).
+# RIGHT_REGION_RATIO / NUM_CANDLES — запасной вариант, если свечей не нашли или AUTO_LAYOUT выключен.
+AUTO_LAYOUT = True
 RIGHT_REGION_RATIO = 0.6   # правая часть экрана: берем правую 60% (если свечи занимают ~2/3 экрана справа)
 NUM_CANDLES = 20
 SAMPLE_X_MARGIN = 10       # отступ слева внутри правой-области (px)
 MIN_BODY_HEIGHT = 3        # минимальный размер тела свечи в px, чтобы считать не шумом
 
-def crop_right_region(img):
+# Веса правила rule_predict (подбираются бэктестом, см. backtest.py)
+SLOPE_WEIGHT = 2.0
+LAST_CHANGE_WEIGHT = 1.5
+COUNT_WEIGHT = 0.3
+
+# Индикаторы в features_from_candles (indicators.py): кортеж (вид, период), () — без индикаторов
+FEATURE_INDICATORS = INDICATORS
+
+def frame_layout(img):
+    """Раскладка кадра (chart_layout.Layout) или None — тогда RIGHT_REGION_RATIO / NUM_CANDLES."""
+    return default_layouts().get(img) if AUTO_LAYOUT else None
+
+def layout_fingerprint():
+    """Часть ключа result_cache: найденные раскладки (при AUTO_LAYOUT результат зависит от них)."""
+    return default_layouts().fingerprint() if AUTO_LAYOUT else ""
+
+@timed()
+def crop_right_region(img, layout=None):
+    """Область свечей: по X — найденная раскладка или правые RIGHT_REGION_RATIO экрана.
+       По Y не режем — координаты свечей остаются экранными (их ждёт price_calibration)."""
     w, h = img.size
-    left = int(w * (1 - RIGHT_REGION_RATIO))
-    return img.crop((left, 0, w, h)), left
+    if layout is not None:
+        left, right = layout.box[0], layout.box[2]
+    else:
+        left, right = int(w * (1 - RIGHT_REGION_RATIO)), w
+    return img.crop((left, 0, right, h)), left
 
-def estimate_candle_columns(region_img):
-    """Разделяем правую область на NUM_CANDLES вертикальных колонок (по X).
-       Возвращаем список x центров колонок (целые пиксели)."""
+def estimate_candle_columns(region_img, layout=None):
+    """x центров свечей внутри области: из раскладки, а без неё — делим область
+       на NUM_CANDLES равных колонок (целые пиксели)."""
+    if layout is not None:
+        return layout.columns()
     w, h = region_img.size
     # оставляем небольшой отступ по краям
     usable_w = w - SAMPLE_X_MARGIN * 2
@@ -23,118 +56,143 @@ def estimate_candle_columns(region_img):
     centers = [int(SAMPLE_X_MARGIN + step * (i + 0.5)) for i in range(NUM_CANDLES)]
     return centers
 
+@timed()
 def analyze_column(region_img, x):
     """По вертикальной колонке приближенно оцениваем open/high/low/close:
        - Находим сверху/снизу значимые изменения по яркости цвета тела (зел/крас).
        - Вернём (open_px, close_px, high_px, low_px, color)
        px — координаты по Y (0 сверху). color: 'up' или 'down' или 'neutral'."""
-    px = region_img.load()
-    w, h = region_img.size
+    return analyze_columns(region_img, [x])[0]
+
+def _column_strips(arr, centers):
+    """Полосы +-1 px вокруг каждого центра: (H, C, 3 соседа, 3 канала) uint8."""
+    w = arr.shape[1]
+    xs = np.clip(np.asarray(centers, dtype=np.intp)[:, None] + np.array([-1, 0, 1]), 0, w - 1)
+    return arr[:, xs, :3]
+
+def _column_profiles(arr, centers):
+    """Средние цвета полосы +-1 px вокруг каждого центра сразу для всех колонок.
+       arr — (H, W, 3) uint8. Возвращает r, g, b — матрицы (H, len(centers)) int."""
+    # сумма по соседям, целочисленное деление как раньше
+    strips = _column_strips(arr, centers).astype(np.int64).sum(axis=2) // 3
+    return strips[..., 0], strips[..., 1], strips[..., 2]
+
+@timed()
+def analyze_columns(region_img, centers):
+    """Батч-версия analyze_column: картинка переводится в numpy один раз,
+       яркость/доли цветов/score/пороги считаются матрицей (H, len(centers)).
+       Результат — список dict'ов, идентичный поколоночному analyze_column.
+       region_img — PIL Image или уже готовый numpy-массив (H, W, 3)."""
+    arr = np.asarray(region_img)
+    if arr.ndim == 2:
+        arr = np.repeat(arr[:, :, None], 3, axis=2)
+    h = arr.shape[0]
+    r, g, b = _column_profiles(arr, centers)
 
-    # собираем средние цвета по горизонтальной полосе +-1 пикселя по X
-    col_vals = []
-    for y in range(h):
-        cnt = 0
-        r_sum = g_sum = b_sum = 0
-        for dx in (-1, 0, 1):
-            xx = min(max(x + dx, 0), w - 1)
-            r,g,b = px[xx, y][:3]
-            r_sum += r; g_sum += g; b_sum += b
-            cnt += 1
-        col_vals.append((r_sum//cnt, g_sum//cnt, b_sum//cnt))
     # переведём в яркость/зеленость/красноту
-    brightness = np.array([0.299*r + 0.587*g + 0.114*b for (r,g,b) in col_vals])
-    green_ratio = np.array([g / (r+g+b+1e-6) for (r,g,b) in col_vals])
-    red_ratio = np.array([r / (r+g+b+1e-6) for (r,g,b) in col_vals])
-
-    # Ищем тело свечи: участок с высокой насыщенностью красного или зелёного
-    # Находим места с локальной разницей цвета относительно соседей
-    diff_green = np.abs(green_ratio - np.roll(green_ratio, 1))
-    diff_red = np.abs(red_ratio - np.roll(red_ratio, 1))
+    brightness = 0.299*r + 0.587*g + 0.114*b
+    total = r + g + b + 1e-6
+    green_ratio = g / total
+    red_ratio = r / total
+
+    # локальная разница цвета относительно соседей (по Y)
+    diff_green = np.abs(green_ratio - np.roll(green_ratio, 1, axis=0))
+    diff_red = np.abs(red_ratio - np.roll(red_ratio, 1, axis=0))
     score = diff_green + diff_red
-    # сглажим
-    score_s = np.convolve(score, np.ones(5)/5, mode='same')
-
-    # возьмём позиции самых больших score — кандидаты на границы тела
-    threshold = np.percentile(score_s, 85)
-    candidates = np.where(score_s >= threshold)[0]
-    if candidates.size == 0:
-        # не нашли явных тел — считаем нейтральной маленькой свечой
-        middle = h // 2
-        return {'open': middle+2, 'close': middle-2, 'high': middle+5, 'low': middle-5, 'color': 'neutral'}
-
-    y_min = int(candidates.min())
-    y_max = int(candidates.max())
-    body_height = y_max - y_min
-    if body_height < MIN_BODY_HEIGHT:
-        # маленькое тело — нейтрально
-        middle = (y_min + y_max)//2
-        return {'open': middle+1, 'close': middle-1, 'high': y_min-3, 'low': y_max+3, 'color': 'neutral'}
-
-    # определим цвет по средним ratios внутри тела
-    mean_green = green_ratio[y_min:y_max+1].mean()
-    mean_red = red_ratio[y_min:y_max+1].mean()
-    color = 'up' if mean_green > mean_red else 'down'
-
-    # Высота фитилей: ищем ближайшую яркую точку сверху/снизу (по brightness)
-    # high — минимальный y с brightness резко отличающейся от фонового
-    bright_diff = np.abs(brightness - np.median(brightness))
-    high_candidates = np.where((bright_diff[:y_min] > np.percentile(bright_diff, 70)))[0]
-    if high_candidates.size:
-        high = high_candidates.min()
-    else:
-        high = max(y_min-5,0)
-    low_candidates = np.where((bright_diff[y_max+1:] > np.percentile(bright_diff, 70)))[0]
-    if low_candidates.size:
-        low = (y_max+1) + low_candidates.max()
-    else:
-        low = min(y_max+5, h-1)
+    # сглажим: np.convolve по каждой колонке — края у него считаются через BLAS,
+    # скользящая сумма по матрице даёт отличия в последнем бите и сдвигает пороги
+    kernel = np.ones(5)/5
+    score_t = np.ascontiguousarray(score.T)
+    score_s = np.empty_like(score_t)
+    for i in range(score_t.shape[0]):
+        score_s[i] = np.convolve(score_t[i], kernel, mode='same')
+    score_s = score_s.T
+
+    thresholds = np.percentile(score_s, 85, axis=0)
+    bright_diff = np.abs(brightness - np.median(brightness, axis=0))
+    bright_thr = np.percentile(bright_diff, 70, axis=0)
+    is_candidate = score_s >= thresholds
+
+    candles = []
+    for i in range(len(centers)):
+        candidates = np.flatnonzero(is_candidate[:, i])
+        if candidates.size == 0:
+            # не нашли явных тел — считаем нейтральной маленькой свечой
+            middle = h // 2
+            candles.append({'open': middle+2, 'close': middle-2, 'high': middle+5, 'low': middle-5, 'color': 'neutral'})
+            continue
 
-    # open/close: ориентируемся на относительное положение: для зелёной (up) open > close по Y (y увеличивается вниз)
-    # возьмём верхнюю/нижнюю границы тела
-    open_px = y_max if color == 'up' else y_min
-    close_px = y_min if color == 'up' else y_max
+        y_min = int(candidates[0])
+        y_max = int(candidates[-1])
+        body_height = y_max - y_min
+        if body_height < MIN_BODY_HEIGHT:
+            # маленькое тело — нейтрально
+            middle = (y_min + y_max)//2
+            candles.append({'open': middle+1, 'close': middle-1, 'high': y_min-3, 'low': y_max+3, 'color': 'neutral'})
+            continue
 
-    return {'open': int(open_px), 'close': int(close_px), 'high': int(high), 'low': int(low), 'color': color}
+        # определим цвет по средним ratios внутри тела
+        mean_green = green_ratio[y_min:y_max+1, i].mean()
+        mean_red = red_ratio[y_min:y_max+1, i].mean()
+        color = 'up' if mean_green > mean_red else 'down'
+
+        # Высота фитилей: ищем ближайшую яркую точку сверху/снизу (по brightness)
+        # high — минимальный y с brightness резко отличающейся от фонового
+        bd = bright_diff[:, i]
+        high_candidates = np.flatnonzero(bd[:y_min] > bright_thr[i])
+        if high_candidates.size:
+            high = high_candidates[0]
+        else:
+            high = max(y_min-5,0)
+        low_candidates = np.flatnonzero(bd[y_max+1:] > bright_thr[i])
+        if low_candidates.size:
+            low = (y_max+1) + low_candidates[-1]
+        else:
+            low = min(y_max+5, h-1)
+
+        # open/close: для зелёной (up) open > close по Y (y увеличивается вниз)
+        # возьмём верхнюю/нижнюю границы тела
+        open_px = y_max if color == 'up' else y_min
+        close_px = y_min if color == 'up' else y_max
+
+        candles.append({'open': int(open_px), 'close': int(close_px), 'high': int(high), 'low': int(low), 'color': color})
+    return candles
 
 def extract_candles_from_image(image_path):
-    """Возвращает список свечей [левые→правые], каждая — dict с open/close/high/low (px) и color."""
-    img = Image.open(image_path).convert('RGB')
-    region, left_offset = crop_right_region(img)
-    centers = estimate_candle_columns(region)
-    candles = []
-    for x in centers:
-        c = analyze_column(region, x)
-        candles.append(c)
+    """Возвращает список свечей [левые→правые], каждая — dict с open/close/high/low (px) и color.
+       image_path — путь или уже декодированный frame.Frame."""
+    with span("decode"):
+        img = as_pil(image_path)
+    layout = frame_layout(img)
+    region, left_offset = crop_right_region(img, layout)
+    centers = estimate_candle_columns(region, layout)
+    candles = analyze_columns(region, centers)
     # порядок: левые→правые (как на экране слева->справа)
     return candles
 
-def features_from_candles(candles):
-    """Делаем простые числовые признаки: к-во up/down, last change, range ratios, slope"""
-    closes = []
-    colors = []
-    for c in candles:
-        # используем 'price' как вертикальную координату close (чем меньше px — выше цена)
-        closes.append(c['close'])
-        colors.append(c['color'])
-    closes = np.array(closes, dtype=float)
+@timed()
+def features_from_candles(candles, indicators=None):
+    """Делаем простые числовые признаки: к-во up/down, last change, range ratios, slope
+       + технические индикаторы (indicators.py, набор — FEATURE_INDICATORS)."""
+    closes = np.fromiter((c['close'] for c in candles), dtype=float, count=len(candles))
+    colors = np.array([c['color'] for c in candles])
     # Инвертируем px в относительную цену: smaller px -> larger price; нормируем
     inv = (closes.max() - closes)  # higher means higher price
     # признаки
     diffs = np.diff(inv)
     last_change = diffs[-1] if diffs.size else 0.0
     avg_change = diffs.mean() if diffs.size else 0.0
-    up_count = sum(1 for col in colors if col == 'up')
-    down_count = sum(1 for col in colors if col == 'down')
+    up_count = np.count_nonzero(colors == 'up')
+    down_count = np.count_nonzero(colors == 'down')
     volatility = np.std(diffs) if diffs.size else 0.0
     range_ratio = (inv.max() - inv.min()) / (np.mean(inv) + 1e-6)
-    # slope of last N (linear fit)
-    x = np.arange(len(inv))
+    # slope of last N (линейная регрессия в замкнутом виде вместо np.polyfit)
     if len(inv) >= 3:
-        coef = np.polyfit(x, inv, 1)[0]
+        xc = np.arange(len(inv)) - (len(inv) - 1) / 2.0
+        coef = np.dot(xc, inv - inv.mean()) / np.dot(xc, xc)
     else:
         coef = 0.0
-    return {
+    feats = {
         'last_change': float(last_change),
         'avg_change': float(avg_change),
         'up_count': int(up_count),
@@ -143,13 +201,18 @@ def features_from_candles(candles):
         'range_ratio': float(range_ratio),
         'slope': float(coef),
     }
+    config = FEATURE_INDICATORS if indicators is None else indicators
+    if config:
+        feats.update(indicators_latest(candles_to_ohlc(candles), config))
+    return feats
 
+@timed()
 def rule_predict(features):
     """Простое правило: комбинируем slope / last_change / counts -> вероятность"""
     score = 0.0
-    score += features['slope'] * 2.0
-    score += features['last_change'] * 1.5
-    score += (features['up_count'] - features['down_count']) * 0.3
+    score += features['slope'] * SLOPE_WEIGHT
+    score += features['last_change'] * LAST_CHANGE_WEIGHT
+    score += (features['up_count'] - features['down_count']) * COUNT_WEIGHT
     # normalize roughly to probability 0..1 by sigmoid
     prob = 1.0 / (1.0 + np.exp(-score))
     direction = 'UP' if prob > 0.55 else ('DOWN' if prob < 0.45 else 'NEUTRAL')
@@ -159,10 +222,8 @@ def rule_predict(features):
         confidence = 50.0
     return direction, confidence
 
-def predict_from_image(image_path):
-    if not os.path.exists(image_path):
-        raise FileNotFoundError(image_path)
-    candles = extract_candles_from_image(image_path)
+def predict_from_candles(candles):
+    """Признаки -> правило -> экспирация; общий хвост predict_from_image и IncrementalAnalyzer."""
     feats = features_from_candles(candles)
     direction, confidence = rule_predict(feats)
     # экспирация: если слабая уверенность -> 1 мин, средняя -> 2 мин, сильная -> 3 мин
@@ -180,6 +241,95 @@ def predict_from_image(image_path):
         'candles_px': candles
     }
 
+def predict_from_image(image_path):
+    if not isinstance(image_path, Frame) and not os.path.exists(image_path):
+        raise FileNotFoundError(image_path)
+    candles = extract_candles_from_image(image_path)
+    return predict_from_candles(candles)
+
+class IncrementalAnalyzer:
+    """
+    Анализатор потока кадров одного графика: помнит колонки прошлого кадра
+    (frame_diff.ColumnCache) и пересчитывает только изменившиеся свечи.
+    Результат совпадает с extract_candles_from_image / predict_from_image.
+    calibrator (price_calibration.Calibrator) — дополнительно отдаёт 'candles_ohlc':
+    свечи в ценах [[open, high, low, close], ...] или None, если шкалу не распознали.
+    history (candle_history.CandleHistory) — кадры сшиваются в непрерывный ряд, в результате
+    'history_len' и 'history_indicators': индикаторы по всей истории, а не по 20 видимым свечам.
+    Индикаторы истории считаются инкрементально (indicators.IncrementalIndicators): на кадр —
+    замена незакрытой свечи и новые свечи, цена кадра не растёт с длиной истории.
+    """
+
+    def __init__(self, calibrator=None, history=None):
+        self.columns = ColumnCache()
+        self.calibrator = calibrator
+        self.history = history
+        self._params = None
+        self._indicators = None
+
+    def extract_candles(self, img):
+        # смена параметров или раскладки меняет смысл колонок — начинаем с чистого листа
+        layout = frame_layout(img)
+        params = (tuple(globals()[n] for n in CACHE_PARAMS), layout and (layout.box, layout.centers))
+        if params != self._params:
+            self.columns.reset()
+            self._params = params
+        region, left_offset = crop_right_region(as_pil(img), layout)
+        arr = np.asarray(region)
+        centers = estimate_candle_columns(region, layout)
+        strips = _column_strips(arr, centers).transpose(1, 0, 2, 3)   # (C, H, 3, 3)
+        return self.columns.update(strips, lambda idx: analyze_columns(arr, [centers[i] for i in idx]))
+
+    def extract_candles_from_image(self, image_path):
+        with span("decode"):
+            frame = as_frame(image_path)
+        return self.extract_candles(frame)
+
+    def predict(self, img, frame_time=None):
+        """predict_from_image для уже декодированного кадра (frame.Frame или PIL Image RGB)."""
+        res = predict_from_candles(self.extract_candles(img))
+        if self.history is not None:
+            if frame_time is None:
+                frame_time = img.time if isinstance(img, Frame) else time.time()
+            added = self.history.update(res['candles_px'], frame_time)
+            res['history_len'] = self.history.count
+            res['history_indicators'] = self._history_indicators(added)
+        if self.calibrator is not None:
+            # y свечей — в координатах экрана (правая область обрезается только по X)
+            ohlc = self.calibrator.ohlc(img, res['candles_px'])
+            res['candles_ohlc'] = ohlc.round(6).tolist() if ohlc is not None else None
+        return res
+
+    def _history_indicators(self, added):
+        """Индикаторы по истории после history.update(), который вернул added."""
+        inc = self._indicators
+        if inc is None or added < 0 or inc.count == 0 or inc.config != tuple(FEATURE_INDICATORS):
+            # история начата заново (или впервые) — один полный проход по тому, что в ней есть
+            inc = self._indicators = IncrementalIndicators(FEATURE_INDICATORS)
+            inc.extend(self.history.ohlc())
+        else:
+            # бывшая незакрытая свеча заменена версией из нового кадра, за ней — новые
+            rows = self.history.tail_ohlc(added + 1)
+            inc.replace_last(*rows[0])
+            for row in rows[1:]:
+                inc.push(*row)
+        return inc.values()
+
+    def predict_from_image(self, image_path):
+        if not isinstance(image_path, Frame) and not os.path.exists(image_path):
+            raise FileNotFoundError(image_path)
+        with span("decode"):
+            frame = as_frame(image_path)
+        return self.predict(frame)
+
+# параметры, от которых зависит результат predict_from_image (отпечаток для кэша)
+CACHE_PARAMS = ('AUTO_LAYOUT', 'RIGHT_REGION_RATIO', 'NUM_CANDLES', 'SAMPLE_X_MARGIN', 'MIN_BODY_HEIGHT',
+                'SLOPE_WEIGHT', 'LAST_CHANGE_WEIGHT', 'COUNT_WEIGHT', 'FEATURE_INDICATORS')
+
+# predict_from_image через result_cache: неизменившийся файл не декодируется повторно
+predict_from_image_cached = cached_by_file("candle", sys.modules[__name__], CACHE_PARAMS,
+                                           extra=layout_fingerprint)(predict_from_image)
+
 if __name__ == "__main__":
     # быстрый тест на последнем скриншоте в папке screenshots
     import glob
@@ -0,0 +1,189 @@
+# candle_history.py
+# Непрерывная история свечей из потока кадров.
+# На скрине видно ~20 последних свечей; соседние кадры перекрываются почти целиком.
+# CandleHistory совмещает свечи нового кадра с хвостом истории (по перекрытию) и дописывает
+# только новые — так из кадров по 20 свечей копится ряд на сотни свечей без лишнего извлечения.
+#
+#   hist = CandleHistory()
+#   hist.update(candles, frame_time)          # свечи candle_analyzer (px), время кадра (сек)
+#   hist.ohlc()                               # (N, 4) M1: open, high, low, close (цена растёт вверх)
+#   hist.tail_ohlc(k)                         # последние k свечей — без копии всей истории
+#   hist.view("M5")                           # агрегированные свечи, тот же dtype
+#
+# Совмещение. График сам перемасштабируется по вертикали, когда цена выходит за диапазон,
+# поэтому одна и та же свеча в соседних кадрах может иметь другие px. Для каждого сдвига
+# перекрытие подгоняется аффинно (frame = a*hist + b) и берётся сдвиг с наименьшей ошибкой в пределах
+# MATCH_TOL. Ошибка меряется относительно разброса цен самого перекрытия: у случайного блуждания
+# соседние сдвиги тоже неплохо подгоняются аффинно, если делить на разброс всего кадра. Новые свечи
+# переводятся в координаты истории. Последняя свеча истории ещё формировалась —
+# при совмещении её не сравниваем, а заменяем версией из нового кадра.
+
+import numpy as np
+
+CANDLE_DTYPE = np.dtype([
+    ('t', np.int64),        # минута (unix time // 60) закрытия свечи M1
+    ('open', np.float32),
+    ('high', np.float32),
+    ('low', np.float32),
+    ('close', np.float32),
+    ('color', np.int8),     # 1 up, -1 down, 0 neutral
+])
+HISTORY_SIZE = 2000       # свечей M1 в кольцевом буфере
+MIN_OVERLAP = 4           # минимум общих свечей для совмещения
+MATCH_TOL = 0.02          # допустимая ошибка совмещения: RMS остатка / разброс цен перекрытия
+MATCH_TRIM = 0.8          # доля лучших остатков в ошибке — отдельные криво извлечённые свечи не мешают
+TIMEFRAMES = {"M1": 1, "M5": 5, "M15": 15}
+_COLORS = {'up': 1, 'down': -1}
+
+
+def frame_to_array(candles):
+    """Свечи кадра (dict, px) -> (ohlc (N, 4) с ценой вверх, colors (N,) int8)."""
+    ohlc = -np.array([[c['open'], c['high'], c['low'], c['close']] for c in candles], dtype=float).reshape(-1, 4)
+    colors = np.array([_COLORS.get(c.get('color'), 0) for c in candles], dtype=np.int8)
+    return ohlc, colors
+
+
+def match_shift(tail, frame, min_overlap=MIN_OVERLAP, tol=MATCH_TOL):
+    """
+    Сколько свечей кадра новые относительно хвоста истории.
+    tail, frame — (T, 4), (N, 4). Возвращает (new_count, a, b) или None, если совместить не удалось;
+    a, b — масштаб кадра к истории: frame ≈ a*hist + b.
+    """
+    n, t = len(frame), len(tail)
+    best = None
+    for new in range(0, n - min_overlap + 1):
+        m = n - new                      # общих свечей
+        if m > t:
+            continue
+        # последняя общая свеча в истории была незакрытой — в сравнение не берём
+        h = tail[t - m:t - 1].ravel()
+        f = frame[:m - 1].ravel()
+        hc = h - h.mean()
+        var = np.dot(hc, hc)
+        if var == 0:
+            continue
+        a = np.dot(hc, f - f.mean()) / var      # МНК в замкнутом виде
+        b = f.mean() - a * h.mean()
+        if a <= 0:
+            continue
+        resid = np.sort(np.abs(a * h + b - f))[:max(int(len(h) * MATCH_TRIM), 1)]
+        err = np.sqrt(np.mean(resid ** 2)) / (np.ptp(f) or 1.0)
+        if err <= tol and (best is None or err < best[0]):
+            best = (err, new, a, b)
+    return best and best[1:]
+
+
+class CandleHistory:
+    """Кольцевой буфер свечей M1 (структурный numpy-массив CANDLE_DTYPE)."""
+
+    def __init__(self, capacity=HISTORY_SIZE, min_overlap=MIN_OVERLAP, tol=MATCH_TOL):
+        self.capacity = capacity
+        self.min_overlap = min_overlap
+        self.tol = tol
+        self._buf = np.zeros(capacity, dtype=CANDLE_DTYPE)
+        self._start = 0
+        self.count = 0
+        self.resets = 0
+
+    # ----- кольцевой буфер -----
+    def _index(self, i):
+        """Индекс в буфере i-й по порядку свечи (отрицательные — с конца)."""
+        if i < 0:
+            i += self.count
+        return (self._start + i) % self.capacity
+
+    def _append(self, rows):
+        for row in rows[-self.capacity:]:
+            if self.count < self.capacity:
+                self._buf[(self._start + self.count) % self.capacity] = row
+                self.count += 1
+            else:
+                self._buf[self._start] = row
+                self._start = (self._start + 1) % self.capacity
+
+    def tail(self, k):
+        """Последние k свечей по порядку (CANDLE_DTYPE), не трогая остальную историю."""
+        k = max(min(k, self.count), 0)
+        return self._buf[(self._start + np.arange(self.count - k, self.count)) % self.capacity]
+
+    def series(self):
+        """Вся история по порядку (копия, CANDLE_DTYPE)."""
+        end = self._start + self.count
+        if end <= self.capacity:
+            return self._buf[self._start:end].copy()
+        return np.concatenate([self._buf[self._start:], self._buf[:end - self.capacity]])
+
+    def clear(self):
+        self._start = 0
+        self.count = 0
+
+    # ----- обновление -----
+    def _rows(self, ohlc, colors, t0):
+        rows = np.zeros(len(ohlc), dtype=CANDLE_DTYPE)
+        rows['t'] = t0 + np.arange(len(ohlc))
+        rows['open'], rows['high'], rows['low'], rows['close'] = ohlc.T
+        rows['color'] = colors
+        return rows
+
+    def update(self, candles, frame_time):
+        """
+        Совмещает кадр с историей и дописывает новые свечи. Возвращает число добавленных
+        (-1 — кадр не совместился, история начата заново с этого кадра).
+        """
+        ohlc, colors = frame_to_array(candles)
+        n = len(ohlc)
+        if n == 0:
+            return 0
+        minute = int(frame_time // 60)
+        if self.count == 0:
+            self._append(self._rows(ohlc, colors, minute - n + 1))
+            return n
+
+        found = match_shift(self.tail_ohlc(n), ohlc, self.min_overlap, self.tol)
+        if found is None:
+            # другой график / пропуск дольше кадра — начинаем заново
+            self.resets += 1
+            self.clear()
+            self._append(self._rows(ohlc, colors, minute - n + 1))
+            return -1
+
+        new, a, b = found
+        m = n - new
+        ohlc = (ohlc - b) / a            # в координаты истории
+        last_t = int(self._buf[self._index(-1)]['t'])
+        # бывшая незакрытая свеча — версией из нового кадра
+        self._buf[self._index(-1)] = self._rows(ohlc[m - 1:m], colors[m - 1:m], last_t)[0]
+        if new:
+            self._append(self._rows(ohlc[m:], colors[m:], last_t + 1))
+        return new
+
+    # ----- чтение -----
+    def ohlc(self, timeframe="M1"):
+        """(N, 4) float: open, high, low, close по порядку."""
+        return _to_ohlc(self.view(timeframe))
+
+    def tail_ohlc(self, k):
+        """(k, 4) float последних k свечей M1 — для инкрементальных индикаторов."""
+        return _to_ohlc(self.tail(k))
+
+    def view(self, timeframe="M1"):
+        """Свечи таймфрейма (M1/M5/M15): агрегирование M1 по минутам t // k."""
+        k = TIMEFRAMES[timeframe] if isinstance(timeframe, str) else int(timeframe)
+        s = self.series()
+        if k == 1 or len(s) == 0:
+            return s
+        groups = s['t'] // k
+        starts = np.flatnonzero(np.concatenate([[True], groups[1:] != groups[:-1]]))
+        ends = np.concatenate([starts[1:], [len(s)]]) - 1
+        out = np.zeros(len(starts), dtype=CANDLE_DTYPE)
+        out['t'] = groups[starts] * k + k - 1
+        out['open'] = s['open'][starts]
+        out['close'] = s['close'][ends]
+        out['high'] = np.maximum.reduceat(s['high'], starts)
+        out['low'] = np.minimum.reduceat(s['low'], starts)
+        out['color'] = np.sign(out['close'] - out['open']).astype(np.int8)
+        return out
+
+
+def _to_ohlc(rows):
+    return np.column_stack([rows['open'], rows['high'], rows['low'], rows['close']]).astype(float).reshape(-1, 4)
@@ -0,0 +1,329 @@
+# capture.py
+# Канал «захват -> анализ» без круга PNG: кадр попадает в анализ сырыми пикселями,
+# а PNG (архив, пакеты для сервера) пишется в фоне — анализ диска не ждёт.
+#
+#   frame = grab_raw()                                   # screencap без -p: сырые RGBA, без сжатия
+#   publish_frame(frame, "screenshots/shot_1.png")       # -> разделяемый буфер + PNG в фоне
+#   default_archiver().flush()                           # PNG на диске (перед отправкой пакета)
+#
+#   for frame in SharedFrameSource(): ...                # сервис (TA_CAPTURE=memory): готовые frame.Frame
+#
+# Разделяемый буфер — mmap файла CAPTURE_FILE (в /dev/shm, если есть): заголовок + RGBX-пиксели
+# последнего кадра. Писатель один (захват), читателей сколько угодно. Запись защищена
+# счётчиком seq (seqlock): нечётный — кадр сейчас пишется, читатель перечитывает. Хранится только
+# последний кадр — в конвейере всё равно важен самый свежий. multiprocessing.shared_memory
+# не подходит: на Android нет shm_open (как и sem_open для пула процессов).
+
+import io
+import os
+import mmap
+import time
+import queue
+import struct
+import atexit
+import threading
+import subprocess
+
+import numpy as np
+
+from frame import Frame, as_frame, as_pil
+from instrumentation import span
+from state_dir import state_path
+
+CAPTURE_FILE = "/dev/shm/tradeanalyzer.frame" if os.path.isdir("/dev/shm") else state_path(".cache", "frame.buf")
+SCREENCAP_CMD = ("screencap",)   # без -p — сырые пиксели на stdout (нужны права shell/root)
+SCREENCAP_TIMEOUT = 10.0  # сек
+ARCHIVE = True            # писать PNG кадров, прошедших через publish_frame
+ARCHIVE_QUEUE = 16        # кадров в очереди архива; полная — submit() ждёт диск (архив кадры не теряет)
+ARCHIVE_TIMEOUT = 30.0    # сек — дольше диск не принимает кадры: кадр не архивируется, об этом пишется в лог
+ARCHIVE_COMPRESS = 1      # zlib-уровень PNG: в разы быстрее уровня 6, файл крупнее примерно на треть
+POLL_INTERVAL = 0.02      # сек — опрос seq читателем (8 байт из памяти)
+READ_RETRIES = 5          # попыток прочитать кадр, который как раз перезаписывается
+NAME_SIZE = 128           # байт под имя кадра (путь архивного PNG)
+_SEQ = struct.Struct("<Q")
+_META = struct.Struct(f"<IId{NAME_SIZE}s")   # width, height, time, name
+DATA_OFFSET = 256
+RAW_FORMATS = (1, 2)      # PIXEL_FORMAT_RGBA_8888, PIXEL_FORMAT_RGBX_8888
+
+
+# ----- захват -----
+def parse_raw_screencap(data, frame_time=None):
+    """Вывод `screencap` без -p -> Frame без копии: заголовок width, height, format
+       (+ colorspace на Android 9+), дальше 4 байта на пиксель."""
+    if len(data) < 12:
+        raise ValueError("screencap: пустой вывод")
+    w, h, fmt = struct.unpack_from("<III", data)
+    n = w * h * 4
+    header = len(data) - n
+    if not n or header not in (12, 16):
+        raise ValueError(f"screencap: неожиданный размер {len(data)} для {w}x{h}")
+    if fmt not in RAW_FORMATS:
+        raise ValueError(f"screencap: формат пикселей {fmt} не RGBA_8888")
+    buf = np.frombuffer(data, np.uint8, n, header).reshape(h, w, 4)
+    return Frame(buf, None, frame_time)
+
+
+def grab_raw(cmd=SCREENCAP_CMD):
+    """Снимок экрана сырыми пикселями. OSError — screencap нет или нет прав (тогда — PNG-путь)."""
+    t = time.time()
+    with span("screencap"):
+        try:
+            out = subprocess.run(cmd, capture_output=True, check=True, timeout=SCREENCAP_TIMEOUT).stdout
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            raise OSError(f"screencap: {e}") from e
+    return parse_raw_screencap(out, t)
+
+
+# ----- архив PNG в фоне -----
+def encode_png(image, compress_level=ARCHIVE_COMPRESS):
+    img = as_pil(image)
+    if img.mode not in ("RGB", "RGBA", "L"):
+        img = img.convert("RGB")           # RGBX кадра PNG не умеет
+    out = io.BytesIO()
+    img.save(out, format="PNG", compress_level=compress_level)
+    return out.getvalue()
+
+
+def _write_atomic(path, data):
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    # скрытое .tmp-имя: ScreenshotWatcher его не видит, файл появляется целиком (IN_MOVED_TO)
+    tmp = os.path.join(folder, f".{os.path.basename(path)}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class Archiver:
+    """
+    Фоновая запись кадров на диск: submit() не ждёт ни сжатия, ни диска, пока в очереди есть место.
+    Кадр (Frame / PIL / массив) сжимается в PNG в фоновом потоке; готовые байты
+    (PNG/JPEG из приложения) пишутся как есть. Архив — данные для обучения и пакеты на сервер,
+    поэтому кадры не вытесняются (это годится только для анализа, см. pipeline.LatestQueue):
+    очередь полна — submit() ждёт до timeout и только потом сдаётся с сообщением в лог.
+    Файл появляется после возврата из submit(); кому он нужен на диске — сначала flush().
+    """
+
+    def __init__(self, maxsize=ARCHIVE_QUEUE, compress_level=ARCHIVE_COMPRESS, timeout=ARCHIVE_TIMEOUT):
+        self.compress_level = compress_level
+        self.timeout = timeout
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self._q = queue.Queue(maxsize)
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._closed = False
+        self._thread = None
+
+    def submit(self, image, *paths):
+        """Кадр или байты -> файлы paths (одно сжатие на все копии).
+           True — кадр в очереди; False — диск не освободил очередь за timeout, кадр не будет записан."""
+        if not paths:
+            return True
+        with self._cond:
+            self._pending += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="archiver", daemon=True)
+                self._thread.start()
+        try:
+            self._q.put((image, paths), timeout=self.timeout)
+            return True
+        except queue.Full:
+            with self._cond:
+                self.dropped += 1
+                self._pending -= 1
+                self._cond.notify_all()
+            print(f"Архив: диск не успевает ({self.timeout:.0f} с), кадр не записан:", paths[0])
+            return False
+
+    def _run(self):
+        while True:
+            try:
+                image, paths = self._q.get(timeout=1.0)
+            except queue.Empty:
+                if self._closed:
+                    return
+                continue
+            try:
+                with span("archive"):
+                    data = image if isinstance(image, (bytes, bytearray)) else encode_png(image, self.compress_level)
+                    for path in paths:
+                        _write_atomic(path, data)
+                self.written += 1
+            except Exception as e:
+                self.errors += 1
+                print("Архив: не записан", paths[0], e)
+            finally:
+                with self._cond:
+                    self._pending -= 1
+                    self._cond.notify_all()
+
+    def flush(self, timeout=None):
+        """Ждёт, пока очередь запишется (перед отправкой пакета, при выходе). False — не успели."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending <= 0, timeout)
+
+    def close(self, timeout=10.0):
+        self.flush(timeout)
+        self._closed = True
+
+    def stats(self):
+        return {'written': self.written, 'dropped': self.dropped, 'errors': self.errors, 'queue': self._q.qsize()}
+
+
+# ----- разделяемый буфер последнего кадра -----
+class SharedFrame:
+    """Последний кадр в mmap-файле: write() — в процессе захвата, read() — в процессе анализа."""
+
+    def __init__(self, path=CAPTURE_FILE):
+        self.path = path
+        self._mm = None
+        self._writable = False
+
+    def _map(self, size=0, write=False):
+        """Отображение файла не меньше size байт; файл только растёт — старые отображения читателей не ломаются."""
+        if self._mm is not None and len(self._mm) >= size and self._writable >= write:
+            return self._mm
+        self.close()
+        if write:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        else:
+            try:
+                fd = os.open(self.path, os.O_RDONLY)
+            except FileNotFoundError:
+                return None
+        try:
+            current = os.fstat(fd).st_size
+            if write and current < size:
+                os.ftruncate(fd, size)
+                current = size
+            if current < DATA_OFFSET:
+                return None
+            self._mm = mmap.mmap(fd, current, access=mmap.ACCESS_WRITE if write else mmap.ACCESS_READ)
+            self._writable = write
+        finally:
+            os.close(fd)
+        return self._mm
+
+    def seq(self):
+        """Номер последнего записанного кадра (0 — кадров ещё не было)."""
+        mm = self._map()
+        return _SEQ.unpack_from(mm, 0)[0] if mm is not None else 0
+
+    def write(self, frame, name=None):
+        """Кладёт кадр (frame.Frame) в буфер; возвращает его seq."""
+        buf = np.ascontiguousarray(frame.buf)
+        h, w = buf.shape[:2]
+        n = h * w * 4
+        mm = self._map(DATA_OFFSET + n, write=True)
+        seq = _SEQ.unpack_from(mm, 0)[0]
+        start = seq + 1 if seq % 2 == 0 else seq + 2     # нечётный seq остался от упавшего писателя
+        _SEQ.pack_into(mm, 0, start)
+        _META.pack_into(mm, _SEQ.size, w, h, frame.time, (name or frame.path or "").encode()[:NAME_SIZE])
+        np.frombuffer(mm, np.uint8, n, DATA_OFFSET)[:] = buf.reshape(-1)
+        _SEQ.pack_into(mm, 0, start + 1)
+        return start + 1
+
+    def read(self, after=0):
+        """Кадр с seq, отличным от after -> (seq, Frame); None — нового кадра нет."""
+        for _ in range(READ_RETRIES):
+            mm = self._map()
+            if mm is None:
+                return None
+            seq = _SEQ.unpack_from(mm, 0)[0]
+            if seq == after or seq == 0:
+                return None
+            if seq % 2:
+                time.sleep(0.001)              # писатель посреди кадра
+                continue
+            w, h, t, raw = _META.unpack_from(mm, _SEQ.size)
+            n = w * h * 4
+            if DATA_OFFSET + n > len(mm):
+                self._map(DATA_OFFSET + n)     # писатель увеличил файл — отображаем заново
+                continue
+            buf = np.frombuffer(mm, np.uint8, n, DATA_OFFSET).copy()
+            if _SEQ.unpack_from(mm, 0)[0] != seq:
+                continue                       # кадр перезаписали, пока копировали
+            name = raw.rstrip(b"\0").decode("utf-8", "replace") or None
+            return seq, Frame(buf.reshape(h, w, 4), name, t)
+        return None
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+
+class SharedFrameSource:
+    """
+    Источник для pipeline.Pipeline: новые кадры из разделяемого буфера (уже декодированные Frame).
+    include_existing=True — сначала отдать кадр, лежащий в буфере на момент старта.
+    """
+    mode = "memory"
+
+    def __init__(self, path=CAPTURE_FILE, poll_interval=POLL_INTERVAL, include_existing=False):
+        self.shared = SharedFrame(path)
+        self.poll_interval = poll_interval
+        self.include_existing = include_existing
+        self._last = None
+        self._stop = threading.Event()
+
+    def __iter__(self):
+        if self._last is None:
+            self._last = 0 if self.include_existing else self.shared.seq()
+        while not self._stop.is_set():
+            got = self.shared.read(self._last)
+            if got is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self._last, frame = got
+            yield frame
+
+    def close(self):
+        self._stop.set()
+
+
+_archiver = None
+_shared = None
+
+
+def default_archiver():
+    global _archiver
+    if _archiver is None:
+        _archiver = Archiver()
+        atexit.register(_archiver.close)    # очередь дописывается при выходе
+    return _archiver
+
+
+def default_shared():
+    global _shared
+    if _shared is None:
+        _shared = SharedFrame()
+    return _shared
+
+
+def publish_frame(image, *paths, archive=ARCHIVE):
+    """
+    Кадр -> разделяемый буфер (анализ видит его сразу) + PNG в paths в фоне.
+    image — frame.Frame / PIL / массив или закодированные байты PNG/JPEG (архив пишет их как есть,
+    для анализа они декодируются здесь один раз). Возвращает Frame (path — первый из paths).
+    Возврат — до того, как PNG записан: кому нужен файл (отправка пакета, чтение с диска),
+    сначала вызывает default_archiver().flush().
+    """
+    encoded = image if isinstance(image, (bytes, bytearray)) else None
+    with span("capture_publish"):
+        frame = Frame.from_bytes(encoded) if encoded is not None else as_frame(image)
+        if paths:
+            frame.path = paths[0]
+        try:
+            default_shared().write(frame)
+        except (OSError, ValueError) as e:
+            print("Разделяемый буфер кадра недоступен:", e)
+    if archive and paths:
+        default_archiver().submit(encoded if encoded is not None else frame, *paths)
+    return frame
@@ -0,0 +1,294 @@
+# chart_layout.py
+# Автоопределение раскладки графика: где область свечей и где центры колонок.
+# Вместо ручных CROP / RIGHT_REGION_RATIO / NUM_CANDLES — проекции цветных пикселей:
+#   0) одиночные цветные пиксели (шум, сжатие) отбрасываются: у свечи цветной пиксель
+#      всегда продолжается по вертикали, поэтому в маске остаются только вертикальные пары;
+#   1) строки с цветными пикселями -> полосы по вертикали, график — самая высокая полоса
+#      (кнопки BUY/SELL и прочие цветные элементы — отдельные, низкие полосы);
+#   2) внутри полосы — профиль по колонкам (не меньше MIN_COLUMN_PIXELS пикселей) -> отрезки
+#      цветных колонок (тела и фитили свечей), слишком узкие отрезки отбрасываются;
+#   3) шаг свечи — медиана расстояний между центрами отрезков, затем сетка x0 + k*шаг
+#      подгоняется МНК по всем центрам (пропущенная свеча/доджи сетку не ломают);
+#      отрезки далеко от узлов сетки выкидываются, и сетка подгоняется ещё раз.
+#
+# Раскладка зависит от устройства, а не от кадра, поэтому кэшируется по разрешению и
+# ориентации (layout.json в state_dir.STATE_DIR) — детектор работает один раз на устройство.
+# На каждом кадре только дешёвая проверка: на колонках сетки есть цветные пиксели;
+# если нет (график сдвинули, сменили масштаб) — раскладка ищется заново.
+#
+#   layout = default_layouts().get(img)     # Layout или None (свечей не нашли)
+#   layout.box                              # (left, top, right, bottom) области графика
+#   layout.centers                          # x центров свечей, слева направо
+#   with scratch_layouts(): ...             # прогон на чужом кадре, не трогая кэш и layout.json
+
+import os
+import json
+import contextlib
+import time
+import hashlib
+import threading
+
+import numpy as np
+
+from state_dir import state_path
+
+LAYOUT_FILE = state_path("layout.json")
+COLOR_MIN = 80            # яркость самого сильного канала у цветного пикселя
+COLOR_DELTA = 60          # насколько самый сильный канал ярче самого слабого (фон/текст — серые)
+ROW_GAP = 8               # px — разрывы меньше этого не делят полосу строк
+MIN_CANDLES = 5           # меньше отрезков — свечей не нашли
+MIN_COLUMN_PIXELS = 4     # цветных пикселей в колонке полосы, чтобы колонка считалась частью свечи
+MIN_RUN_RATIO = 0.4       # отрезок уже этой доли медианной ширины — не свеча (остаток шума)
+MAX_GRID_OFFSET = 0.25    # доля шага: центр дальше от узла сетки — отрезок не свеча
+MAX_BODY_RATIO = 0.08     # отрезок шире этой доли ширины экрана — не свеча (кнопка, плашка)
+MIN_HIT = 0.6             # доля колонок сетки с цветными пикселями, при которой раскладка ещё верна
+REDETECT_INTERVAL = 5.0   # сек — не чаще повторяем неудачный поиск для той же раскладки
+
+
+class Layout:
+    """Область графика и сетка колонок свечей (координаты экрана)."""
+    __slots__ = ("box", "pitch", "centers", "body")
+
+    def __init__(self, box, pitch, centers, body=0):
+        self.box = tuple(int(v) for v in box)
+        self.pitch = float(pitch)
+        self.centers = tuple(int(x) for x in centers)
+        self.body = int(body)
+
+    def columns(self):
+        """Центры свечей относительно левого края box."""
+        return [x - self.box[0] for x in self.centers]
+
+    def to_dict(self):
+        return {'box': list(self.box), 'pitch': self.pitch, 'centers': list(self.centers), 'body': self.body}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['box'], d['pitch'], d['centers'], d.get('body', 0))
+
+    def __repr__(self):
+        return f"Layout(box={self.box}, pitch={self.pitch:.2f}, candles={len(self.centers)})"
+
+
+def layout_key(size):
+    """Ключ кэша: разрешение + ориентация."""
+    w, h = size
+    return f"{w}x{h}-{'portrait' if h >= w else 'landscape'}"
+
+
+def colored_mask(arr):
+    """(H, W, 3) uint8 -> bool (H, W): насыщенные (зелёные/красные) пиксели."""
+    a = np.asarray(arr)
+    r, g, b = a[..., 0], a[..., 1], a[..., 2]
+    # поканально, а не a.max(axis=2): редукция по оси длины 3 в numpy в разы медленнее
+    mx = np.maximum(np.maximum(r, g), b)
+    mn = np.minimum(np.minimum(r, g), b)
+    return (mx >= COLOR_MIN) & ((mx - mn) >= COLOR_DELTA)
+
+
+def _denoise(mask):
+    """Оставляет пиксели, у которых цветной и сосед сверху или снизу: шум — одиночные точки."""
+    pair = mask[1:] & mask[:-1]
+    out = np.zeros_like(mask)
+    out[1:] |= pair
+    out[:-1] |= pair
+    return out
+
+
+def _runs(flags):
+    """Отрезки True в bool-векторе: (starts, ends) включительно."""
+    d = np.diff(np.concatenate([[0], flags.view(np.int8), [0]]))
+    return np.flatnonzero(d == 1), np.flatnonzero(d == -1) - 1
+
+
+def _row_band(mask):
+    """Самая высокая полоса строк с цветными пикселями (разрывы < ROW_GAP склеиваются)."""
+    starts, ends = _runs(mask.any(axis=1))
+    if not len(starts):
+        return None
+    keep = np.concatenate([[True], starts[1:] - ends[:-1] - 1 >= ROW_GAP])
+    band_starts = starts[keep]
+    band_ends = ends[np.concatenate([keep[1:], [True]])]
+    i = int(np.argmax(band_ends - band_starts))
+    return int(band_starts[i]), int(band_ends[i])
+
+
+def fit_grid(centers):
+    """Центры отрезков -> (шаг, x0, индексы): сетка x0 + k*шаг по МНК."""
+    c = np.asarray(centers, dtype=float)
+    d = np.diff(c)
+    p0 = np.median(d)
+    k = np.maximum(np.round(d / p0), 1)
+    pitch = d.sum() / k.sum()                      # пропуски в 2-3 шага тоже идут в дело
+    idx = np.round((c - c[0]) / pitch)
+    ic = idx - idx.mean()
+    pitch = np.dot(ic, c - c.mean()) / np.dot(ic, ic)
+    x0 = c.mean() - pitch * idx.mean()
+    return pitch, x0, idx.astype(int)
+
+
+def detect_layout(img):
+    """Ищет область графика и колонки свечей. img — PIL Image или (H, W, 3). None — не нашли."""
+    arr = np.asarray(img)
+    if arr.ndim != 3:
+        return None
+    h, w = arr.shape[:2]
+    mask = _denoise(colored_mask(arr))
+    band = _row_band(mask)
+    if band is None:
+        return None
+    top, bottom = band
+    counts = np.count_nonzero(mask[top:bottom + 1], axis=0)
+    starts, ends = _runs(counts >= min(MIN_COLUMN_PIXELS, bottom - top + 1))
+    widths = ends - starts + 1
+    ok = widths <= max(MAX_BODY_RATIO * w, 2)
+    starts, ends, widths = starts[ok], ends[ok], widths[ok]
+    if len(starts) < MIN_CANDLES:
+        return None
+    ok = widths >= MIN_RUN_RATIO * np.median(widths)
+    starts, ends, widths = starts[ok], ends[ok], widths[ok]
+    if len(starts) < MIN_CANDLES:
+        return None
+
+    c = (starts + ends) / 2.0
+    pitch, x0, idx = fit_grid(c)
+    if pitch < 2:
+        return None
+    on_grid = np.abs(c - (x0 + idx * pitch)) <= MAX_GRID_OFFSET * pitch
+    if not on_grid.all():
+        widths = widths[on_grid]
+        if len(widths) < MIN_CANDLES:
+            return None
+        pitch, x0, idx = fit_grid(c[on_grid])
+        if pitch < 2:
+            return None
+    k = np.arange(idx.min(), idx.max() + 1)
+    centers = np.round(x0 + k * pitch).astype(int)
+    left = max(int(centers[0] - pitch / 2), 0)
+    right = min(int(np.ceil(centers[-1] + pitch / 2)) + 1, w)
+    return Layout((left, top, right, bottom + 1), pitch, centers, np.median(widths))
+
+
+def layout_hits(img, layout):
+    """Доля колонок сетки, в которых внутри box есть цветные пиксели."""
+    left, top, right, bottom = layout.box
+    if hasattr(img, "crop"):
+        w = img.size[0]
+        if layout.centers[-1] >= w:
+            return 0.0
+        # PIL: только нужные колонки по 1 px, без копии всей области
+        arr = np.concatenate([np.asarray(img.crop((x, top, x + 1, bottom))) for x in layout.centers], axis=1)
+    else:
+        arr = np.asarray(img)
+        if layout.centers[-1] >= arr.shape[1]:
+            return 0.0
+        arr = arr[top:bottom, list(layout.centers)]
+    if arr.ndim != 3:
+        return 0.0
+    return float(colored_mask(arr).any(axis=0).mean())
+
+
+class LayoutCache:
+    """Раскладки по разрешению/ориентации; поиск заново, только если кадр перестал совпадать."""
+
+    def __init__(self, path=LAYOUT_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._failed = {}      # ключ -> время последнего неудачного поиска
+        self._fingerprint = None
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._cache = {k: Layout.from_dict(v) for k, v in json.load(f).items()}
+            except (OSError, ValueError, KeyError, TypeError):
+                self._cache = {}
+        self.detections = 0
+
+    def get(self, img):
+        """img — PIL Image, (H, W, 3|4) или frame.Frame (берётся его буфер, без копии)."""
+        if hasattr(img, "buf"):
+            img = img.buf
+        arr = img if isinstance(img, np.ndarray) else None
+        size = (arr.shape[1], arr.shape[0]) if arr is not None else img.size
+        key = layout_key(size)
+        with self._lock:
+            layout = self._cache.get(key)
+            failed = self._failed.get(key)
+        if layout is not None and layout_hits(img, layout) >= MIN_HIT:
+            return layout
+        if failed is not None and time.monotonic() - failed < REDETECT_INTERVAL:
+            return layout
+        found = detect_layout(img)
+        with self._lock:
+            self.detections += 1
+            if found is None:
+                # старая раскладка лучше, чем ничего: график мог на время опустеть
+                self._failed[key] = time.monotonic()
+                return layout
+            self._failed.pop(key, None)
+            self._cache[key] = found
+            self._fingerprint = None
+            self._save()
+        return found
+
+    def fingerprint(self):
+        """Короткий хэш всех раскладок (box + центры колонок) — для ключей result_cache:
+           раскладку нашли заново или поправили layout.json — старые результаты недоступны."""
+        with self._lock:
+            if self._fingerprint is None:
+                state = repr(sorted((k, v.box, v.centers) for k, v in self._cache.items()))
+                self._fingerprint = hashlib.blake2b(state.encode(), digest_size=8).hexdigest()
+            return self._fingerprint
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._failed.clear()
+            self._fingerprint = None
+            self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        # pid в имени: бэктест пишет из нескольких процессов
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump({k: v.to_dict() for k, v in self._cache.items()}, f, indent=2)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass
+
+
+_default = None
+_local = threading.local()
+
+
+def default_layouts():
+    scratch = getattr(_local, "scratch", None)
+    if scratch is not None:
+        return scratch
+    global _default
+    if _default is None:
+        _default = LayoutCache()
+    return _default
+
+
+@contextlib.contextmanager
+def scratch_layouts():
+    """В этом потоке default_layouts() — временный кэш без файла: прогрев на синтетическом кадре
+       не пишет layout.json и не меняет fingerprint() рабочего кэша (ключи result_cache)."""
+    prev = getattr(_local, "scratch", None)
+    _local.scratch = LayoutCache(path=None)
+    try:
+        yield _local.scratch
+    finally:
+        _local.scratch = prev
+
+
+if __name__ == "__main__":
+    import sys
+    from PIL import Image
+    for path in sys.argv[1:]:
+        print(path, detect_layout(Image.open(path).convert("RGB")))
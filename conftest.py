@@ -0,0 +1,10 @@
+# conftest.py
+# Модули репозитория лежат в корне — делаем их импортируемыми и при запуске `pytest`
+# (python -m pytest добавляет текущий каталог сам).
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# не тесты: виджет Kivy и ручной прогон на последнем скриншоте
+collect_ignore = ["overlay_test.py", "test_run.py"]
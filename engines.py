@@ -0,0 +1,287 @@
+# engines.py
+# Реестр анализаторов («движков»): у каждого цена, возможности и один формат результата.
+#
+#   run = select("auto")                  # лучший доступный движок: candle -> levels -> contours
+#   run = select("levels")                # конкретный
+#   run = select("candle,levels")         # несколько — ансамбль
+#   run = select("ensemble")              # все доступные с ценой <= ENSEMBLE_MAX_COST
+#   res = run(frame)                      # frame.Frame (декодирован один раз) или PIL Image -> AnalysisResult
+#
+# Движки возвращают разное (signal/confidence, signal/probability, BUY/SELL); здесь всё
+# приводится к AnalysisResult: signal UP/DOWN/NEUTRAL, confidence — вероятность названного
+# направления в % (50..100), исходный ответ движка — в meta.
+# Ансамбль запускает движки параллельно (потоки — numpy/PIL/cv2 отпускают GIL) на одном и том же
+# frame.Frame — каждый берёт нужное представление (PIL, RGB, буфер для cv2) без декодирования —
+# и складывает голоса: направление * (confidence - 50) / 50, среднее по движкам.
+#
+# Новый движок: @register("имя", cost=..., capabilities=(...), requires=("модуль", ...))
+# над фабрикой, которая принимает **options и возвращает функцию frame -> AnalysisResult.
+
+import importlib.util
+
+AUTO_ORDER = ("candle", "levels", "contours")
+ENSEMBLE_MAX_COST = 3      # «дешёвые» движки для select("ensemble")
+NEUTRAL_MARGIN = 0.05      # |средний голос| меньше — ансамбль отвечает NEUTRAL
+_SIGNALS = {'UP': 'UP', 'BUY': 'UP', 'CALL': 'UP', 'DOWN': 'DOWN', 'SELL': 'DOWN', 'PUT': 'DOWN'}
+
+
+def normalize_signal(signal):
+    """'buy' / 'UP' / 'up' -> 'UP', 'SELL' -> 'DOWN', остальное (FLAT, None) -> 'NEUTRAL'."""
+    return _SIGNALS.get(str(signal).upper(), 'NEUTRAL') if signal else 'NEUTRAL'
+
+
+def expiry_for(confidence):
+    """Экспирация (мин) по уверенности: слабая -> 1, средняя -> 2, сильная -> 3."""
+    if confidence < 55:
+        return 1
+    if confidence < 75:
+        return 2
+    return 3
+
+
+class AnalysisResult:
+    """Единый ответ любого движка."""
+    __slots__ = ('signal', 'confidence', 'expiry_min', 'engine', 'support_px', 'resistance_px', 'candles',
+                 'pair', 'otc', 'meta')
+
+    def __init__(self, signal, confidence=50.0, expiry_min=None, engine=None,
+                 support_px=None, resistance_px=None, candles=None, meta=None, pair=None, otc=None):
+        self.signal = normalize_signal(signal)
+        self.confidence = 50.0 if self.signal == 'NEUTRAL' else round(float(confidence), 2)
+        self.expiry_min = int(expiry_min) if expiry_min is not None else expiry_for(self.confidence)
+        self.engine = engine
+        self.support_px = support_px
+        self.resistance_px = resistance_px
+        self.candles = candles
+        self.pair = pair          # заполняет вызывающий (pair_ocr по тому же кадру), движки — нет
+        self.otc = otc
+        self.meta = meta
+
+    def vote(self):
+        """Голос для ансамбля: -1..1 (знак — направление, модуль — уверенность)."""
+        if self.signal == 'NEUTRAL':
+            return 0.0
+        strength = (self.confidence - 50.0) / 50.0
+        return strength if self.signal == 'UP' else -strength
+
+    def to_dict(self):
+        return {k: getattr(self, k) for k in self.__slots__}
+
+    def __repr__(self):
+        return f"AnalysisResult({self.engine}: {self.signal} {self.confidence}% {self.expiry_min}m)"
+
+
+class Engine:
+    __slots__ = ('name', 'cost', 'capabilities', 'requires', 'factory', 'description')
+
+    def __init__(self, name, cost, capabilities, requires, factory, description):
+        self.name = name
+        self.cost = cost
+        self.capabilities = frozenset(capabilities)
+        self.requires = tuple(requires)
+        self.factory = factory
+        self.description = description
+
+    def available(self):
+        """Есть ли нужные пакеты (без импорта — только поиск модулей)."""
+        return all(importlib.util.find_spec(m) is not None for m in self.requires)
+
+    def create(self, **options):
+        return self.factory(**options)
+
+
+ENGINES = {}
+
+
+def register(name, cost, capabilities=(), requires=(), description=None):
+    """Декоратор фабрики движка. cost — условная цена кадра (1 — самый дешёвый)."""
+    def deco(factory):
+        doc = description or (factory.__doc__ or "").strip()
+        ENGINES[name] = Engine(name, cost, capabilities, requires, factory, doc)
+        return factory
+    return deco
+
+
+def describe():
+    """Список движков: имя, цена, возможности, доступность — для логов и --help."""
+    return [{'name': e.name, 'cost': e.cost, 'capabilities': sorted(e.capabilities),
+             'available': e.available(), 'description': e.description}
+            for e in sorted(ENGINES.values(), key=lambda e: e.cost)]
+
+
+def create(name, **options):
+    try:
+        engine = ENGINES[name]
+    except KeyError:
+        raise ValueError(f"неизвестный движок {name!r}, есть: {', '.join(ENGINES)}") from None
+    return engine.create(**options)
+
+
+class Ensemble:
+    """Несколько движков на одном кадре параллельно + голосование."""
+
+    def __init__(self, runners):
+        self.runners = dict(runners)     # имя -> img -> AnalysisResult
+        self._pool = None
+
+    def _map(self, img):
+        if len(self.runners) == 1:
+            name, run = next(iter(self.runners.items()))
+            return {name: _call(run, img)}
+        if self._pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._pool = ThreadPoolExecutor(max_workers=len(self.runners), thread_name_prefix="engine")
+        futures = {name: self._pool.submit(_call, run, img) for name, run in self.runners.items()}
+        return {name: f.result() for name, f in futures.items()}
+
+    def __call__(self, img):
+        from frame import as_frame
+        img = as_frame(img)          # одно декодирование/представление на все движки
+        results, errors = {}, {}
+        for name, res in self._map(img).items():
+            if isinstance(res, Exception):
+                errors[name] = f"{type(res).__name__}: {res}"
+            else:
+                results[name] = res
+        if not results:
+            raise RuntimeError("ни один движок не ответил: " + "; ".join(f"{k}: {v}" for k, v in errors.items()))
+        return merge(results, errors)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+def _call(run, img):
+    try:
+        return run(img)
+    except Exception as e:
+        return e
+
+
+def merge(results, errors=None):
+    """Результаты движков -> один AnalysisResult (среднее голосов); уровни/свечи — от самого дешёвого, у кого есть."""
+    score = sum(r.vote() for r in results.values()) / len(results)
+    signal = 'NEUTRAL' if abs(score) < NEUTRAL_MARGIN else ('UP' if score > 0 else 'DOWN')
+    by_cost = sorted(results, key=lambda n: ENGINES[n].cost if n in ENGINES else 0)
+
+    def first(attr):
+        return next((getattr(results[n], attr) for n in by_cost if getattr(results[n], attr) is not None), None)
+
+    meta = {'votes': {n: {'signal': r.signal, 'confidence': r.confidence} for n, r in results.items()}}
+    if errors:
+        meta['errors'] = errors
+    return AnalysisResult(signal, 50.0 + 50.0 * abs(score), engine="ensemble",
+                          support_px=first('support_px'), resistance_px=first('resistance_px'),
+                          candles=first('candles'), meta=meta)
+
+
+def select(spec="auto", **options):
+    """
+    Движок по настройке: 'auto', имя, 'a,b' (ансамбль перечисленных) или 'ensemble'.
+    options уходят фабрикам (price_calibration, candle_history, ...). Возвращает img -> AnalysisResult.
+    """
+    spec = (spec or "auto").strip()
+    if spec == "auto":
+        errors = []
+        for name in AUTO_ORDER:
+            try:
+                return create(name, **options)
+            except (ImportError, OSError) as e:
+                errors.append(f"{name}: {e}")
+        raise RuntimeError("нет доступных движков анализа: " + "; ".join(errors))
+    if spec == "ensemble":
+        names = [e.name for e in sorted(ENGINES.values(), key=lambda e: e.cost)
+                 if e.cost <= ENSEMBLE_MAX_COST and e.available()]
+    else:
+        names = [n.strip() for n in spec.split(",") if n.strip()]
+    if len(names) == 1:
+        return create(names[0], **options)
+    runners = {}
+    for name in names:
+        try:
+            runners[name] = create(name, **options)
+        except (ImportError, OSError) as e:
+            print(f"Движок {name} недоступен:", e)
+    if not runners:
+        raise RuntimeError(f"нет доступных движков анализа для {spec!r}")
+    return Ensemble(runners)
+
+
+# ----- движки -----
+@register("candle", cost=3, capabilities=("ohlc", "incremental", "indicators", "history", "calibration"),
+          requires=("numpy", "PIL"))
+def candle_engine(price_calibration=False, candle_history=False, **_):
+    """candle_analyzer.IncrementalAnalyzer: свечи по колонкам, признаки + индикаторы, правило."""
+    from candle_analyzer import IncrementalAnalyzer
+    calibrator = history = None
+    if price_calibration:
+        from price_calibration import Calibrator
+        calibrator = Calibrator()
+    if candle_history:
+        from candle_history import CandleHistory
+        history = CandleHistory()
+    analyzer = IncrementalAnalyzer(calibrator=calibrator, history=history)
+
+    def run(img):
+        res = analyzer.predict(img)
+        # confidence candle_analyzer — сила сигнала 0..100 (|p - 0.5| * 200) -> вероятность направления
+        meta = {k: v for k, v in res.items() if k != 'candles_px'}
+        return AnalysisResult(res['signal'], 50.0 + res['confidence'] / 2.0, res['expiry_min'], "candle",
+                              candles=res['candles_px'], meta=meta)
+    return run
+
+
+@register("levels", cost=1, capabilities=("levels", "incremental"), requires=("numpy", "PIL"))
+def levels_engine(**_):
+    """real_time_analyzer: цвета колонок + уровни поддержки/сопротивления."""
+    from real_time_analyzer import IncrementalScanner
+    scanner = IncrementalScanner()
+
+    def run(img):
+        res = scanner.analyze_candles(img)
+        if res is None:
+            raise RuntimeError("real_time_analyzer: мало свечей")
+        return AnalysisResult(res['signal'], res['probability'], engine="levels",
+                              support_px=res['support_px'], resistance_px=res['resistance_px'], meta=res)
+    return run
+
+
+@register("contours", cost=2, capabilities=("ohlc", "levels"), requires=("cv2", "numpy"))
+def contours_engine(**_):
+    """analyzer.Analyzer (OpenCV): контуры свечей, OHLC по контуру, тренд."""
+    from analyzer import Analyzer
+    from frame import as_frame
+    analyzer = Analyzer()
+
+    def run(img):
+        res = analyzer.analyze(as_frame(img))
+        candles = res.pop('candles')
+        return AnalysisResult(res['signal'], res['prob'], res['expiry_min'], "contours",
+                              support_px=res['support_px'], resistance_px=res['resistance_px'],
+                              candles=candles, meta=res)
+    return run
+
+
+@register("model", cost=4, capabilities=("ohlc", "model"), requires=("numpy", "PIL"))
+def model_engine(model_path=None, **_):
+    """machine_learning: обученная логистическая регрессия по признакам свечей (нужен direction_model.json)."""
+    import machine_learning
+    from candle_analyzer import IncrementalAnalyzer
+    path = model_path or machine_learning.MODEL_FILE
+    if machine_learning.load_model(path) is None:
+        raise FileNotFoundError(f"нет модели {path} (python3 machine_learning.py train)")
+    analyzer = IncrementalAnalyzer()
+
+    def run(img):
+        candles = analyzer.extract_candles(img)
+        direction, prob = machine_learning.predict_direction(candles, path)
+        return AnalysisResult(direction, prob, engine="model", candles=candles)
+    return run
+
+
+if __name__ == "__main__":
+    for e in describe():
+        print(f"{e['name']:10s} cost={e['cost']} {'+' if e['available'] else '-'} "
+              f"{','.join(e['capabilities']):45s} {e['description']}")
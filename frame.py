@@ -0,0 +1,164 @@
+# frame.py
+# Кадр, декодированный один раз, и дешёвые представления поверх одного буфера.
+#
+#   frame = Frame.from_file("screenshots/1.png")    # единственное декодирование PNG
+#   frame.rgb          # (H, W, 3) view — numpy-анализаторы
+#   frame.bgr          # (H, W, 3) view с обратным порядком каналов — для кода, ждущего BGR
+#   frame.buf          # (H, W, 4) C-contiguous — cv2 (COLOR_RGBA2*), без копий
+#   frame.pil          # PIL Image (RGBX) на том же буфере — OCR, PIL-анализаторы
+#   frame.crop(box, "L")   # кэшированный вырез (PIL), например заголовок для OCR
+#   frame.view(box)    # numpy view выреза, без копии
+#   frame.gray         # (H, W) uint8 в градациях серого, считается один раз
+#
+# Буфер — 4 байта на пиксель (RGBX): так его без копии видят и numpy, и PIL (frombuffer
+# разделяет память только для 4-байтных режимов), и OpenCV (4-канальный Mat).
+# У Frame есть size/crop, как у PIL Image, поэтому код, который режет картинку
+# (pair_ocr, price_calibration, candle_analyzer), принимает кадр без изменений.
+
+import os
+import time
+
+import numpy as np
+from PIL import Image
+
+
+class Frame:
+    __slots__ = ('buf', 'path', 'time', '_pil', '_gray', '_crops')
+
+    def __init__(self, buf, path=None, frame_time=None):
+        """buf — (H, W, 4) uint8 RGBX, C-contiguous."""
+        self.buf = buf
+        self.path = path
+        self.time = frame_time if frame_time is not None else time.time()
+        self._pil = None
+        self._gray = None
+        self._crops = {}
+
+    # ----- создание -----
+    @classmethod
+    def from_pil(cls, img, path=None, frame_time=None):
+        if img.mode == "RGBA":
+            raw = img.tobytes("raw", "RGBA")     # альфа просто занимает четвёртый байт
+        else:
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            raw = img.tobytes("raw", "RGBX")
+        w, h = img.size
+        frame = cls(np.frombuffer(raw, np.uint8).reshape(h, w, 4), path, frame_time)
+        frame._pil = Image.frombuffer("RGBX", (w, h), raw, "raw", "RGBX", 0, 1)
+        return frame
+
+    @classmethod
+    def from_file(cls, path, frame_time=None):
+        """PNG/JPEG -> Frame. Время кадра — mtime файла, если не задано."""
+        with Image.open(path) as img:
+            img.load()
+            if frame_time is None:
+                try:
+                    frame_time = os.path.getmtime(path)
+                except OSError:
+                    frame_time = None
+            return cls.from_pil(img, path, frame_time)
+
+    @classmethod
+    def from_array(cls, arr, path=None, frame_time=None):
+        """(H, W, 3) RGB или (H, W, 4) RGBA/RGBX. 4-канальный contiguous uint8 — без копии."""
+        arr = np.asarray(arr)
+        if arr.ndim == 3 and arr.shape[2] == 4 and arr.dtype == np.uint8 and arr.flags.c_contiguous:
+            return cls(arr, path, frame_time)
+        h, w = arr.shape[:2]
+        buf = np.empty((h, w, 4), np.uint8)
+        if arr.ndim == 2:
+            buf[..., :3] = arr[..., None]
+        else:
+            buf[..., :3] = arr[..., :3]
+        buf[..., 3] = 255
+        return cls(buf, path, frame_time)
+
+    @classmethod
+    def from_bytes(cls, data, path=None, frame_time=None):
+        """Закодированная картинка (PNG/JPEG) из памяти."""
+        import io
+        with Image.open(io.BytesIO(data)) as img:
+            img.load()
+            return cls.from_pil(img, path, frame_time)
+
+    # ----- представления -----
+    @property
+    def size(self):
+        """(width, height) — как у PIL Image."""
+        return self.buf.shape[1], self.buf.shape[0]
+
+    @property
+    def shape(self):
+        return self.buf.shape[:2] + (3,)
+
+    @property
+    def rgb(self):
+        return self.buf[..., :3]
+
+    @property
+    def bgr(self):
+        return self.buf[..., 2::-1]
+
+    @property
+    def pil(self):
+        if self._pil is None:
+            h, w = self.buf.shape[:2]
+            buf = self.buf if self.buf.flags.c_contiguous else np.ascontiguousarray(self.buf)
+            self._pil = Image.frombuffer("RGBX", (w, h), buf, "raw", "RGBX", 0, 1)
+        return self._pil
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            self._gray = np.asarray(self.pil.convert("L"))
+        return self._gray
+
+    def __array__(self, dtype=None, copy=None):
+        return self.rgb if dtype is None else self.rgb.astype(dtype)
+
+    def view(self, box):
+        """(left, top, right, bottom) -> numpy view (h, w, 3) без копии."""
+        left, top, right, bottom = box
+        return self.buf[top:bottom, left:right, :3]
+
+    def crop(self, box, mode=None):
+        """Вырез как PIL Image (mode — например "L"); повторный вызов с тем же box — из кэша."""
+        key = (tuple(int(v) for v in box), mode)
+        img = self._crops.get(key)
+        if img is None:
+            img = self.pil.crop(key[0])
+            if mode and mode != img.mode:
+                img = img.convert(mode)
+            self._crops[key] = img
+        return img
+
+    # ----- передача в другой процесс (пул анализа) -----
+    def __getstate__(self):
+        return {'buf': np.ascontiguousarray(self.buf), 'path': self.path, 'time': self.time}
+
+    def __setstate__(self, state):
+        self.__init__(state['buf'], state['path'], state['time'])
+
+    def __repr__(self):
+        w, h = self.size
+        return f"Frame({w}x{h}, {os.path.basename(self.path) if self.path else 'memory'})"
+
+
+def as_frame(image):
+    """Путь / PIL Image / массив / Frame -> Frame (путь декодируется здесь — один раз)."""
+    if isinstance(image, Frame):
+        return image
+    if isinstance(image, (str, os.PathLike)):
+        return Frame.from_file(image)
+    if isinstance(image, Image.Image):
+        return Frame.from_pil(image)
+    return Frame.from_array(image)
+
+
+def as_pil(image):
+    """Frame / путь / массив / PIL -> PIL Image (у Frame — без копии)."""
+    if isinstance(image, Image.Image):
+        return image
+    return as_frame(image).pil
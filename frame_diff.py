@@ -0,0 +1,77 @@
+# frame_diff.py
+# Инкрементальный анализ соседних кадров: у двух M1-скринов одного графика
+# обычно меняются только последние 1-2 свечи, остальные колонки можно не пересчитывать.
+#
+# Результат анализа колонки — чистая функция её пикселей (полосы, которую читает анализатор).
+# Поэтому:
+#   1) колонку сравниваем с той же колонкой предыдущего кадра — совпала, берём прошлый результат;
+#   2) изменившуюся ищем по хэшу содержимого в памяти последних колонок — так после
+#      горизонтального сдвига графика колонка находит свой результат на новом месте;
+#   3) остальные считаем заново одним батчем.
+# Итог тот же, что при полном пересчёте, а стоимость кадра ~ O(изменившихся колонок).
+
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+MEMO_SIZE = 256   # сколько результатов колонок помнить по содержимому
+_MISS = object()
+
+
+class ColumnCache:
+    """Результаты колонок предыдущего кадра + память результатов по содержимому колонки."""
+
+    def __init__(self, memo_size=MEMO_SIZE):
+        self.memo_size = memo_size
+        self.reset()
+
+    def reset(self):
+        self._prev_strips = None
+        self._prev_results = None
+        self._memo = OrderedDict()
+        self.reused = 0      # колонок взято с того же места прошлого кадра
+        self.realigned = 0   # колонок найдено по содержимому (сдвиг/повтор)
+        self.computed = 0    # колонок посчитано заново
+
+    def update(self, strips, compute):
+        """
+        strips — массив (C, ...) с пикселями каждой из C колонок текущего кадра.
+        compute(indices) -> список результатов для колонок с этими индексами.
+        Возвращает список из C результатов (копии dict'ов — их можно менять).
+        """
+        n = len(strips)
+        flat = strips.reshape(n, -1)
+        results = [None] * n
+        if self._prev_strips is not None and self._prev_strips.shape == flat.shape:
+            same = ~(flat != self._prev_strips).any(axis=1)
+        else:
+            same = np.zeros(n, dtype=bool)
+
+        todo, digests = [], {}
+        for i in range(n):
+            if same[i]:
+                results[i] = self._prev_results[i]
+                self.reused += 1
+                continue
+            d = hashlib.blake2b(flat[i].tobytes(), digest_size=16).digest()
+            hit = self._memo.get(d, _MISS)
+            if hit is not _MISS:
+                self._memo.move_to_end(d)
+                results[i] = hit
+                self.realigned += 1
+            else:
+                digests[i] = d
+                todo.append(i)
+
+        if todo:
+            for i, res in zip(todo, compute(todo)):
+                results[i] = res
+                self._memo[digests[i]] = res
+            self.computed += len(todo)
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+
+        self._prev_strips = flat.copy()
+        self._prev_results = results
+        return [dict(r) if r is not None else None for r in results]
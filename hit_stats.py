@@ -0,0 +1,204 @@
+# hit_stats.py
+# Живая статистика попаданий: результат сделки (feedback) склеивается с сигналом по его id,
+# и счётчики побед обновляются инкрементально — O(1) на каждый результат, без пересчёта лога.
+#
+#   stats = HitStats()
+#   stats.observe_signal(signal)              # сигнал с полем 'id' (из signal_store)
+#   stats.record_outcome(signal_id, True)     # SUCCESS / FAIL
+#   stats.snapshot()                          # -> dict для /stats
+#
+# Разрезы: пара, направление, корзина уверенности (CONFIDENCE_BUCKET п.п.), expiry_min.
+# По каждой группе — винрейт за всё время и скользящий за последние WINDOW сделок.
+# Повторный результат для того же id сигнала не считается второй сделкой: действует последний
+# (победа меняется на поражение и наоборот прямо в счётчиках и в окне).
+
+import threading
+from collections import OrderedDict, deque
+
+WINDOW = 50               # сделок в скользящем окне группы
+CONFIDENCE_BUCKET = 10    # ширина корзины уверенности, п.п.
+MAX_PENDING = 1000        # сколько последних сигналов держим в памяти для склейки
+MAX_OUTCOMES = 10000      # сколько последних результатов помним по id для защиты от повторов
+DIMENSIONS = ('pair', 'direction', 'confidence', 'expiry_min')
+
+
+def confidence_bucket(confidence, width=CONFIDENCE_BUCKET):
+    """71.5 -> '70-80'."""
+    try:
+        lo = int(float(confidence) // width * width)
+    except (TypeError, ValueError):
+        return "?"
+    return f"{lo}-{lo + width}"
+
+
+def signal_keys(signal):
+    """Сигнал (dict из real_time_service / строка signal_store) -> ключи групп по DIMENSIONS."""
+    details = signal.get('details') or {}
+    expiry = signal.get('expiry_min', details.get('expiry_min'))
+    return {
+        'pair': signal.get('pair') or "UNKNOWN",
+        'direction': signal.get('signal') or "NONE",
+        'confidence': confidence_bucket(signal.get('confidence')),
+        'expiry_min': str(expiry) if expiry not in (None, "", 0) else "?",
+    }
+
+
+class WinCounter:
+    """Победы/всего за всё время + скользящее окно с бегущей суммой (O(1) на обновление).
+       В окне хранятся пары (id сигнала, победа) — чтобы повторный результат заменил прежний."""
+    __slots__ = ('wins', 'total', 'window', 'window_wins')
+
+    def __init__(self, window=WINDOW):
+        self.wins = 0
+        self.total = 0
+        self.window = deque(maxlen=window)
+        self.window_wins = 0
+
+    def add(self, win, sid=None):
+        win = int(bool(win))
+        self.wins += win
+        self.total += 1
+        if len(self.window) == self.window.maxlen:
+            self.window_wins -= self.window[0][1]
+        self.window.append((sid, win))
+        self.window_wins += win
+
+    def replace(self, sid, win):
+        """Результат сделки sid изменился (уже учтённый прежний — противоположный)."""
+        win = int(bool(win))
+        self.wins += win - (1 - win)
+        for i in range(len(self.window) - 1, -1, -1):
+            if self.window[i][0] == sid:
+                self.window_wins += win - self.window[i][1]
+                self.window[i] = (sid, win)
+                break
+
+    def to_dict(self):
+        n = len(self.window)
+        return {
+            'trades': self.total,
+            'wins': self.wins,
+            'win_rate': round(self.wins / self.total * 100, 1) if self.total else None,
+            'rolling_trades': n,
+            'rolling_win_rate': round(self.window_wins / n * 100, 1) if n else None,
+        }
+
+
+class HitStats:
+    """
+    Склейка feedback <-> сигнал и счётчики по группам.
+    lookup(signal_id) -> dict сигнала или None — запасной путь для сигналов, которых нет
+    в памяти (например, после перезапуска сервера): обычно SignalStore.get.
+    """
+
+    def __init__(self, lookup=None, window=WINDOW, max_pending=MAX_PENDING):
+        self.lookup = lookup
+        self.window = window
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._signals = OrderedDict()      # id -> ключи групп, последние max_pending
+        self._groups = {dim: {} for dim in DIMENSIONS}
+        self._overall = WinCounter(window)
+        self._outcomes = OrderedDict()     # id -> (победа, ключи групп) уже учтённых результатов
+        self.unmatched = 0
+        self.duplicates = 0
+
+    def observe_signal(self, signal):
+        sid = signal.get('id')
+        if sid is None:
+            return
+        with self._lock:
+            self._signals[int(sid)] = signal_keys(signal)
+            self._signals.move_to_end(int(sid))
+            while len(self._signals) > self.max_pending:
+                self._signals.popitem(last=False)
+
+    def _keys_for(self, signal_id):
+        with self._lock:
+            keys = self._signals.get(signal_id)
+        if keys is None and self.lookup is not None:
+            try:
+                row = self.lookup(signal_id)
+            except Exception:
+                row = None
+            if row is not None:
+                keys = signal_keys(row)
+        return keys
+
+    def record_outcome(self, signal_id, win):
+        """Учитывает результат сделки; False — сигнал с таким id не найден.
+           Повтор для того же id заменяет прежний результат, а не добавляет сделку."""
+        sid = int(signal_id) if signal_id is not None else None
+        win = bool(win)
+        with self._lock:
+            prev = self._outcomes.get(sid) if sid is not None else None
+            if prev is not None:
+                return self._replace_outcome(sid, win, *prev)
+        # поиск сигнала (возможно, с диска) — без блокировки; проверка повтора и учёт — ниже,
+        # под одной блокировкой: два одновременных /feedback с одним id не посчитаются дважды
+        keys = self._keys_for(sid) if sid is not None else None
+        with self._lock:
+            prev = self._outcomes.get(sid) if sid is not None else None
+            if prev is not None:
+                return self._replace_outcome(sid, win, *prev)
+            self._overall.add(win, sid)
+            if sid is not None:
+                self._outcomes[sid] = (win, keys)
+                while len(self._outcomes) > MAX_OUTCOMES:
+                    self._outcomes.popitem(last=False)
+            if keys is None:
+                self.unmatched += 1
+                return False
+            for dim in DIMENSIONS:
+                counter = self._groups[dim].get(keys[dim])
+                if counter is None:
+                    counter = self._groups[dim][keys[dim]] = WinCounter(self.window)
+                counter.add(win, sid)
+            return True
+
+    def _replace_outcome(self, sid, win, old_win, keys):
+        """Под self._lock: повторный результат для уже учтённого sid."""
+        self.duplicates += 1
+        if win != old_win:
+            self._outcomes[sid] = (win, keys)
+            self._overall.replace(sid, win)
+            if keys is not None:
+                for dim in DIMENSIONS:
+                    self._groups[dim][keys[dim]].replace(sid, win)
+        return keys is not None
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'overall': self._overall.to_dict(),
+                'unmatched': self.unmatched,
+                'duplicates': self.duplicates,
+                'window': self.window,
+                'groups': {dim: {k: c.to_dict() for k, c in sorted(groups.items())}
+                           for dim, groups in self._groups.items()},
+            }
+
+
+def parse_feedback_line(line):
+    """
+    Строка feedback.log -> (signal_id | None, win) или None.
+    Формат: '2025-11-21 15:57:28 - SUCCESS - 1763729848123456'; в старых строках id нет.
+    """
+    parts = [p.strip() for p in line.strip().split(" - ")]
+    if len(parts) < 2 or parts[1] not in ("SUCCESS", "FAIL"):
+        return None
+    sid = int(parts[2]) if len(parts) > 2 and parts[2].isdigit() else None
+    return sid, parts[1] == "SUCCESS"
+
+
+def replay_feedback(stats, path):
+    """Однократное восстановление счётчиков из feedback.log при старте."""
+    try:
+        with open(path) as f:
+            for line in f:
+                parsed = parse_feedback_line(line)
+                if parsed:
+                    stats.record_outcome(*parsed)
+    except OSError:
+        pass
+    return stats
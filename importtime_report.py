@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# importtime_report.py
+# Сколько стоит импорт точек входа: запускает python -X importtime и сводит вывод в таблицу.
+# Запуск:
+#   python3 importtime_report.py                                  # точки входа по умолчанию
+#   python3 importtime_report.py real_time_service overlay_server -n 25
+#   python3 -X importtime -c "import real_time_service" 2> it.log; python3 importtime_report.py --log it.log
+#
+# В таблице: модуль, собственное время, суммарное (с вложенными импортами) — в мс.
+# Отдельно — прямые импорты точки входа: сразу видно, кто тянет numpy/PIL/cv2 на старте.
+
+import re
+import sys
+import argparse
+import subprocess
+
+ENTRY_POINTS = ("real_time_service", "overlay_server", "real_time_analyzer", "run_screenshot_analyzer")
+TOP = 15
+_LINE = re.compile(r"^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)")
+
+
+def parse_importtime(text):
+    """Вывод -X importtime -> список (module, self_us, cumulative_us, depth) в порядке вывода."""
+    rows = []
+    for line in text.splitlines():
+        m = _LINE.match(line)
+        if m:
+            depth = (len(m.group(3)) - 1) // 2
+            rows.append((m.group(4), int(m.group(1)), int(m.group(2)), depth))
+    return rows
+
+
+def measure(module, python=sys.executable):
+    """Импорт module в чистом интерпретаторе; вывод importtime из stderr."""
+    out = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                         stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if out.returncode != 0:
+        tail = [l for l in out.stderr.splitlines() if not l.startswith("import time:")]
+        raise RuntimeError(f"import {module} failed: {' '.join(tail[-1:])}")
+    return out.stderr
+
+
+def subtree(rows, module):
+    """Строки самого module и всего, что он импортировал. Вывод -X importtime идёт снизу вверх:
+       вложенные модули печатаются перед родителем. Импорты site/usercustomize сюда не попадают."""
+    idx = next((i for i in range(len(rows) - 1, -1, -1) if rows[i][0] == module), None)
+    if idx is None:
+        return rows
+    depth = rows[idx][3]
+    start = idx
+    while start > 0 and rows[start - 1][3] > depth:
+        start -= 1
+    return rows[start:idx + 1]
+
+
+def entry_children(rows, module):
+    """Прямые импорты точки входа (depth на 1 больше)."""
+    tree = subtree(rows, module)
+    depth = tree[-1][3] if tree else 0
+    return [r for r in tree if r[3] == depth + 1]
+
+
+def format_table(rows, top=TOP):
+    lines = [f"{'module':45s} {'self ms':>9s} {'total ms':>9s}"]
+    for name, self_us, cum_us, depth in rows[:top]:
+        lines.append(f"{'  ' * depth + name:45s} {self_us / 1000:9.1f} {cum_us / 1000:9.1f}")
+    return "\n".join(lines)
+
+
+def report(module, text, top=TOP):
+    rows = subtree(parse_importtime(text), module)
+    entry = next((r for r in reversed(rows) if r[0] == module), None)
+    total = entry[2] / 1000 if entry else sum(r[1] for r in rows) / 1000
+    print(f"\n=== {module}: {total:.1f} ms ===")
+    children = sorted(entry_children(rows, module), key=lambda r: -r[2])
+    if children:
+        print("Прямые импорты:")
+        print(format_table([(n, s, c, 0) for n, s, c, _ in children], top))
+    print("Самые дорогие модули (по собственному времени):")
+    print(format_table([(n, s, c, 0) for n, s, c, _ in sorted(rows, key=lambda r: -r[1])], top))
+    return total
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Профиль времени импорта точек входа (-X importtime)")
+    ap.add_argument("modules", nargs="*", default=list(ENTRY_POINTS))
+    ap.add_argument("-n", "--top", type=int, default=TOP)
+    ap.add_argument("--log", help="готовый вывод -X importtime вместо запуска")
+    args = ap.parse_args(argv)
+
+    if args.log:
+        with open(args.log) as f:
+            text = f.read()
+        report(args.modules[0] if len(args.modules) == 1 else "", text, args.top)
+        return 0
+    for module in args.modules:
+        try:
+            report(module, measure(module), args.top)
+        except RuntimeError as e:
+            print(f"\n=== {module}: {e}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
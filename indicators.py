@@ -0,0 +1,301 @@
+# indicators.py
+# Технические индикаторы по массиву свечей (N x 4: open, high, low, close).
+#
+#   ohlc = candles_to_ohlc(candles)            # свечи candle_analyzer (px) -> условные цены
+#   series = compute(ohlc)                     # все индикаторы целиком, векторно: имя -> (N,)
+#   feats = latest(ohlc)                       # значения на последней свече: имя -> float | None
+#
+#   inc = IncrementalIndicators()              # поток: O(1) на свечу, окно не пересчитывается
+#   inc.extend(ohlc); inc.push(o, h, l, c); inc.replace_last(o, h, l, c); inc.values()
+#
+# Набор задаётся INDICATORS — кортеж (вид, период): sma/ema — отклонение close от средней,
+# rsi — RSI Уайлдера, atr — ATR Уайлдера, bb_width — ширина полос Боллинджера (2*k*std),
+# patterns — флаги doji / engulfing (+1 бычье, -1 медвежье) / hammer.
+# Рекурсивные индикаторы (ema, rsi, atr) стартуют с первого значения — пакетный и
+# инкрементальный режимы дают одно и то же (с точностью до округления).
+
+import math
+from collections import deque
+
+import numpy as np
+
+INDICATORS = (('sma', 5), ('sma', 10), ('ema', 9), ('rsi', 14), ('atr', 14), ('bb_width', 20), ('patterns', 0))
+BB_K = 2.0
+DOJI_BODY = 0.1          # тело не больше этой доли диапазона свечи
+HAMMER_WICK = 2.0        # нижний фитиль не меньше HAMMER_WICK тел
+EMA_BLOCK = 64           # длина блока для векторной EMA
+
+
+def candles_to_ohlc(candles):
+    """Свечи в px (dict open/high/low/close, y вниз) -> (N, 4) с ценой, растущей вверх."""
+    if not candles:
+        return np.empty((0, 4))
+    return -np.array([[c['open'], c['high'], c['low'], c['close']] for c in candles], dtype=float)
+
+
+def feature_names(config=INDICATORS):
+    names = []
+    for kind, n in config:
+        if kind == 'patterns':
+            names += ['doji', 'engulfing', 'hammer']
+        else:
+            names.append(f"{kind}_{n}")
+    return names
+
+
+# ----- векторный режим -----
+def _sma(x, n):
+    out = np.full(len(x), np.nan)
+    if len(x) >= n:
+        c = np.cumsum(np.concatenate([[0.0], x]))
+        out[n - 1:] = (c[n:] - c[:-n]) / n
+    return out
+
+
+def _ema(x, alpha, block=EMA_BLOCK):
+    """y[0] = x[0], y[t] = y[t-1] + alpha*(x[t] - y[t-1]) — блоками через свёртку, без цикла по свечам."""
+    out = np.empty(len(x))
+    if not len(x):
+        return out
+    decay = (1.0 - alpha) ** np.arange(1, block + 1)
+    kernel = alpha * np.concatenate([[1.0], decay[:-1]])
+    carry = x[0]
+    for s in range(0, len(x), block):
+        xb = x[s:s + block]
+        m = len(xb)
+        out[s:s + m] = np.convolve(xb, kernel[:m])[:m] + carry * decay[:m]
+        carry = out[s + m - 1]
+    return out
+
+
+def _true_range(h, l, c):
+    prev_c = np.concatenate([[c[0]], c[:-1]])
+    tr = np.maximum(h - l, np.maximum(np.abs(h - prev_c), np.abs(l - prev_c)))
+    tr[0] = h[0] - l[0]
+    return tr
+
+
+def _rsi(c, n):
+    d = np.diff(c, prepend=c[0])
+    gain = _ema(np.maximum(d, 0.0), 1.0 / n)
+    loss = _ema(np.maximum(-d, 0.0), 1.0 / n)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100.0 - 100.0 / (1.0 + gain / loss)
+    rsi[loss == 0] = np.where(gain[loss == 0] > 0, 100.0, 50.0)
+    return rsi
+
+
+def _rolling_std(x, n):
+    out = np.full(len(x), np.nan)
+    if len(x) >= n:
+        w = np.lib.stride_tricks.sliding_window_view(x, n)
+        out[n - 1:] = w.std(axis=1)
+    return out
+
+
+def _patterns(o, h, l, c):
+    body = np.abs(c - o)
+    rng = h - l
+    doji = body <= DOJI_BODY * np.maximum(rng, 1e-12)
+    po, pc = np.concatenate([[np.nan], o[:-1]]), np.concatenate([[np.nan], c[:-1]])
+    bull = (c > o) & (pc < po) & (c >= po) & (o <= pc)
+    bear = (c < o) & (pc > po) & (c <= po) & (o >= pc)
+    lower = np.minimum(o, c) - l
+    upper = h - np.maximum(o, c)
+    hammer = (body > 0) & (lower >= HAMMER_WICK * body) & (upper <= body)
+    return doji.astype(float), bull.astype(float) - bear.astype(float), hammer.astype(float)
+
+
+def compute(ohlc, config=INDICATORS):
+    """Все индикаторы по всему ряду: dict имя -> np.ndarray (N,), NaN — окно ещё не набралось."""
+    ohlc = np.asarray(ohlc, dtype=float).reshape(-1, 4)
+    o, h, l, c = ohlc.T
+    out = {}
+    for kind, n in config:
+        if kind == 'patterns':
+            out['doji'], out['engulfing'], out['hammer'] = _patterns(o, h, l, c)
+        elif kind == 'sma':
+            out[f"sma_{n}"] = c - _sma(c, n)
+        elif kind == 'ema':
+            out[f"ema_{n}"] = c - _ema(c, 2.0 / (n + 1))
+        elif kind == 'rsi':
+            out[f"rsi_{n}"] = _rsi(c, n) if len(c) else c.copy()
+        elif kind == 'atr':
+            out[f"atr_{n}"] = _ema(_true_range(h, l, c), 1.0 / n) if len(c) else c.copy()
+        elif kind == 'bb_width':
+            out[f"bb_width_{n}"] = 2.0 * BB_K * _rolling_std(c, n)
+        else:
+            raise ValueError(f"unknown indicator {kind}")
+    return out
+
+
+def _clean(v):
+    v = float(v)
+    return None if math.isnan(v) else v
+
+
+def latest(ohlc, config=INDICATORS):
+    """Значения индикаторов на последней свече (None — не хватило свечей)."""
+    if len(ohlc) == 0:
+        return {name: None for name in feature_names(config)}
+    return {k: _clean(v[-1]) for k, v in compute(ohlc, config).items()}
+
+
+# ----- инкрементальный режим -----
+def _pattern_flags(candle, prev):
+    """_patterns() для одной свечи без numpy."""
+    o, h, l, c = candle
+    body = abs(c - o)
+    doji = body <= DOJI_BODY * max(h - l, 1e-12)
+    engulfing = 0.0
+    if prev is not None:
+        po, pc = prev[0], prev[3]
+        if c > o and pc < po and c >= po and o <= pc:
+            engulfing = 1.0
+        elif c < o and pc > po and c <= po and o >= pc:
+            engulfing = -1.0
+    hammer = body > 0 and min(o, c) - l >= HAMMER_WICK * body and h - max(o, c) <= body
+    return float(doji), engulfing, float(hammer)
+
+
+class _Ema:
+    """EMA с возможностью заменить последнее значение (текущая свеча ещё формируется)."""
+    __slots__ = ('alpha', 'value', 'prev')
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.value = None
+        self.prev = None
+
+    def push(self, x):
+        self.prev = self.value
+        self.value = x if self.value is None else self.value + self.alpha * (x - self.value)
+
+    def replace(self, x):
+        self.value = x if self.prev is None else self.prev + self.alpha * (x - self.prev)
+
+
+class _Window:
+    """Скользящее окно с бегущими суммой и суммой квадратов.
+       Значения хранятся со сдвигом на первое — иначе на ценах вида 1.0850 дисперсия тонет в округлении."""
+    __slots__ = ('n', 'items', 'sum', 'sumsq', 'offset')
+
+    def __init__(self, n):
+        self.n = n
+        self.items = deque(maxlen=n)
+        self.sum = 0.0
+        self.sumsq = 0.0
+        self.offset = None
+
+    def push(self, x):
+        if self.offset is None:
+            self.offset = x
+        x -= self.offset
+        if len(self.items) == self.n:
+            old = self.items[0]
+            self.sum -= old
+            self.sumsq -= old * old
+        self.items.append(x)
+        self.sum += x
+        self.sumsq += x * x
+
+    def replace(self, x):
+        x -= self.offset
+        old = self.items[-1]
+        self.items[-1] = x
+        self.sum += x - old
+        self.sumsq += x * x - old * old
+
+    def mean(self):
+        return self.sum / self.n + self.offset if len(self.items) == self.n else None
+
+    def std(self):
+        if len(self.items) < self.n:
+            return None
+        m = self.sum / self.n
+        return math.sqrt(max(self.sumsq / self.n - m * m, 0.0))
+
+
+class IncrementalIndicators:
+    """
+    Те же индикаторы, что compute(), но обновляются на каждую свечу за O(1):
+    push() — новая свеча, replace_last() — последняя (незакрытая) свеча изменилась.
+    """
+
+    def __init__(self, config=INDICATORS):
+        self.config = tuple(config)
+        self.count = 0
+        self._last = None      # последняя свеча (o, h, l, c)
+        self._prev = None      # предпоследняя — для true range и паттернов
+        self._state = {}
+        for kind, n in self.config:
+            if kind == 'sma':
+                self._state[(kind, n)] = _Window(n)
+            elif kind == 'ema':
+                self._state[(kind, n)] = _Ema(2.0 / (n + 1))
+            elif kind == 'rsi':
+                self._state[(kind, n)] = (_Ema(1.0 / n), _Ema(1.0 / n))
+            elif kind == 'atr':
+                self._state[(kind, n)] = _Ema(1.0 / n)
+            elif kind == 'bb_width':
+                self._state[(kind, n)] = _Window(n)
+            elif kind != 'patterns':
+                raise ValueError(f"unknown indicator {kind}")
+
+    def _apply(self, candle, replace):
+        o, h, l, c = candle
+        prev = self._prev
+        pc = prev[3] if prev is not None else c
+        for (kind, n), st in self._state.items():
+            if kind == 'rsi':
+                d = c - pc
+                for ema, x in zip(st, (max(d, 0.0), max(-d, 0.0))):
+                    ema.replace(x) if replace else ema.push(x)
+            elif kind == 'atr':
+                tr = h - l if prev is None else max(h - l, abs(h - pc), abs(l - pc))
+                st.replace(tr) if replace else st.push(tr)
+            else:
+                st.replace(c) if replace else st.push(c)
+
+    def push(self, o, h, l, c):
+        self._prev = self._last
+        self._last = (float(o), float(h), float(l), float(c))
+        self._apply(self._last, replace=False)
+        self.count += 1
+
+    def replace_last(self, o, h, l, c):
+        if self._last is None:
+            return self.push(o, h, l, c)
+        self._last = (float(o), float(h), float(l), float(c))
+        self._apply(self._last, replace=True)
+
+    def extend(self, ohlc):
+        for row in np.asarray(ohlc, dtype=float).reshape(-1, 4):
+            self.push(*row)
+
+    def values(self):
+        """Значения на последней свече — те же ключи, что latest()."""
+        if self._last is None:
+            return {name: None for name in feature_names(self.config)}
+        o, h, l, c = self._last
+        out = {}
+        for kind, n in self.config:
+            if kind == 'patterns':
+                out['doji'], out['engulfing'], out['hammer'] = _pattern_flags(self._last, self._prev)
+                continue
+            st = self._state[(kind, n)]
+            name = f"{kind}_{n}"
+            if kind == 'sma':
+                m = st.mean()
+                out[name] = c - m if m is not None else None
+            elif kind == 'ema':
+                out[name] = c - st.value
+            elif kind == 'rsi':
+                gain, loss = st[0].value, st[1].value
+                out[name] = (100.0 if gain > 0 else 50.0) if loss == 0 else 100.0 - 100.0 / (1.0 + gain / loss)
+            elif kind == 'atr':
+                out[name] = st.value
+            elif kind == 'bb_width':
+                s = st.std()
+                out[name] = 2.0 * BB_K * s if s is not None else None
+        return out
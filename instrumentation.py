@@ -0,0 +1,293 @@
+# instrumentation.py
+# Лёгкие замеры горячего пути: спаны (декоратор / with) -> гистограммы в памяти.
+#
+#   @timed("features_from_candles")
+#   def features_from_candles(...): ...
+#
+#   with span("decode"):
+#       img = Image.open(path).convert("RGB")
+#
+#   print(summary_line())        # "decode p50=12.1ms p90=20.3ms n=42 | ..." (все процессы)
+#
+# Выключение: переменная окружения TA_METRICS=0 — декораторы тогда возвращают функцию
+# как есть, span() — общий пустой контекст, накладных расходов практически нет.
+#
+# Анализ идёт в отдельных процессах (пул анализа, overlay_server — свой процесс), поэтому
+# каждый процесс раз в DUMP_INTERVAL сек сбрасывает снимок гистограмм в METRICS_DIR/<роль>-<pid>.json —
+# фоновым потоком, замеряемый код диска не касается. overlay_server собирает снимки всех
+# процессов и отдаёт их в формате Prometheus на /metrics; снимки завершившихся процессов удаляются.
+# set_role() начинает замеры процесса с нуля: форкнутый воркер не повторяет счётчики родителя.
+
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import nullcontext
+from functools import wraps
+
+from state_dir import state_path
+
+ENABLED = os.environ.get("TA_METRICS", "1") != "0"
+METRICS_DIR = state_path(".cache", "metrics")
+DUMP_INTERVAL = 10.0      # сек между снимками процесса на диск
+STALE_AFTER = 300.0       # сек — снимки умерших процессов дольше этого не показываем
+# границы корзин, мс
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+METRIC_NAME = "tradeanalyzer_span_seconds"
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count', 'lock')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)   # последняя — +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, ms):
+        i = bisect.bisect_left(BUCKETS_MS, ms)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += ms
+            self.count += 1
+
+    def to_dict(self):
+        with self.lock:
+            return {'counts': list(self.counts), 'sum_ms': self.sum, 'count': self.count}
+
+
+def quantile(h, q):
+    """Квантиль по корзинам (линейно внутри корзины), мс. h — Histogram.to_dict()."""
+    total = h['count']
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for i, c in enumerate(h['counts']):
+        if c and seen + c >= rank:
+            lo = BUCKETS_MS[i - 1] if i > 0 else 0.0
+            hi = BUCKETS_MS[i] if i < len(BUCKETS_MS) else lo * 2
+            return lo + (hi - lo) * (rank - seen) / c
+        seen += c
+    return BUCKETS_MS[-1]
+
+
+class Registry:
+    def __init__(self, role=None):
+        self.role = role or "proc"
+        self._hists = {}
+        self._lock = threading.Lock()
+        self._dumper = None        # метка живого потока снимков (None — потока нет, например после fork)
+        self._observed = 0
+        self._dumped = 0
+
+    def histogram(self, name):
+        h = self._hists.get(name)
+        if h is None:
+            with self._lock:
+                h = self._hists.setdefault(name, Histogram())
+        return h
+
+    def observe(self, name, ms):
+        self.histogram(name).observe(ms)
+        self._observed += 1
+        if self._dumper is None:
+            self._start_dumper()
+
+    def _start_dumper(self):
+        with self._lock:
+            if self._dumper is not None:
+                return
+            token = self._dumper = object()
+        threading.Thread(target=self._dump_loop, args=(token,), name="metrics-dump", daemon=True).start()
+
+    def _dump_loop(self, token):
+        while True:
+            time.sleep(DUMP_INTERVAL)
+            if self._dumper is not token:
+                return
+            if self._observed == self._dumped:
+                continue
+            self._dumped = self._observed
+            try:
+                self.dump()
+            except OSError:
+                pass
+
+    def reset(self, role=None, directory=METRICS_DIR):
+        """Пустые гистограммы (и новая роль); поток снимков перезапустится при следующем замере."""
+        with self._lock:
+            old = self._path(directory)
+            self._hists = {}
+            self._observed = self._dumped = 0
+            self._dumper = None
+            if role:
+                self.role = role
+        try:
+            os.remove(old)     # снимок со старой ролью — иначе pid посчитается дважды
+        except OSError:
+            pass
+
+    def _path(self, directory=METRICS_DIR):
+        return os.path.join(directory, f"{self.role}-{os.getpid()}.json")
+
+    def snapshot(self):
+        return {name: h.to_dict() for name, h in list(self._hists.items())}
+
+    def dump(self, directory=METRICS_DIR):
+        """Атомарно пишет снимок процесса в directory/<роль>-<pid>.json."""
+        os.makedirs(directory, exist_ok=True)
+        path = self._path(directory)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.live(), f)
+        os.replace(tmp, path)
+
+    def live(self):
+        """Снимок в том же виде, что и файлы dump()."""
+        return {'role': self.role, 'pid': os.getpid(), 'time': time.time(), 'spans': self.snapshot()}
+
+
+registry = Registry()
+
+
+def set_role(role):
+    """Имя процесса в снимках и на /metrics: service, analyzer, overlay...
+       Замеры процесса начинаются заново — воркер, форкнутый из сервиса, не наследует его счётчики."""
+    registry.reset(role)
+
+
+def _after_fork():
+    # поток снимков в дочерний процесс не переходит, блокировка могла остаться захваченной
+    registry._dumper = None
+    registry._lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+class _Span:
+    __slots__ = ('name', 't0')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        registry.observe(self.name, (time.perf_counter() - self.t0) * 1000.0)
+        return False
+
+
+_NULL = nullcontext()
+
+
+def span(name):
+    """with span("decode"): ... — замер блока (при TA_METRICS=0 — пустой контекст)."""
+    return _Span(name) if ENABLED else _NULL
+
+
+def timed(name=None):
+    """Декоратор: замер каждого вызова функции. При TA_METRICS=0 функция не оборачивается."""
+    def deco(fn):
+        if not ENABLED:
+            return fn
+        label = name or fn.__name__
+        hist_observe = registry.observe
+        perf = time.perf_counter
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = perf()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                hist_observe(label, (perf() - t0) * 1000.0)
+        return wrapper
+    return deco
+
+
+# ----- Prometheus -----
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (OSError, ValueError, TypeError):
+        return True        # PermissionError — процесс есть, но чужой
+    return True
+
+
+def load_snapshots(directory=METRICS_DIR, stale_after=STALE_AFTER):
+    """Снимки всех живых процессов из directory; файлы завершившихся процессов удаляются."""
+    out = []
+    if not os.path.isdir(directory):
+        return out
+    now = time.time()
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            with open(path) as f:
+                snap = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if not _pid_alive(snap.get('pid')):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        if now - snap.get('time', 0) <= stale_after:
+            out.append(snap)
+    return out
+
+
+def collect(directory=METRICS_DIR):
+    """Живой снимок своего процесса + свежие снимки остальных (пул анализа и т.п.)."""
+    me = os.getpid()
+    return [registry.live()] + [s for s in load_snapshots(directory) if s.get('pid') != me]
+
+
+def merge(snapshots):
+    """Гистограммы одноимённых спанов из разных процессов -> одна (счётчики складываются)."""
+    out = {}
+    for snap in snapshots:
+        for name, h in snap['spans'].items():
+            m = out.setdefault(name, {'counts': [0] * len(h['counts']), 'sum_ms': 0.0, 'count': 0})
+            m['counts'] = [a + b for a, b in zip(m['counts'], h['counts'])]
+            m['sum_ms'] += h['sum_ms']
+            m['count'] += h['count']
+    return out
+
+
+def summary_line(snapshots=None):
+    """Одна строка для лога: p50/p90/количество по каждому спану всех процессов."""
+    merged = merge(collect() if snapshots is None else snapshots)
+    parts = [f"{name} p50={quantile(h, 0.5):.1f}ms p90={quantile(h, 0.9):.1f}ms n={h['count']}"
+             for name, h in sorted(merged.items()) if h['count']]
+    return " | ".join(parts) if parts else "нет замеров"
+
+
+def to_prometheus(snapshots):
+    """Снимки процессов -> текстовый формат Prometheus (гистограммы в секундах)."""
+    lines = [f"# HELP {METRIC_NAME} Duration of instrumented hot-path spans.",
+             f"# TYPE {METRIC_NAME} histogram"]
+    for snap in snapshots:
+        base = f'process="{snap["role"]}",pid="{snap["pid"]}"'
+        for span_name, h in sorted(snap['spans'].items()):
+            labels = f'{base},span="{span_name}"'
+            cumulative = 0
+            for le, c in zip(BUCKETS_MS + (None,), h['counts']):
+                cumulative += c
+                le_s = "+Inf" if le is None else repr(le / 1000.0)
+                lines.append(f'{METRIC_NAME}_bucket{{{labels},le="{le_s}"}} {cumulative}')
+            lines.append(f"{METRIC_NAME}_sum{{{labels}}} {h['sum_ms'] / 1000.0:.6f}")
+            lines.append(f"{METRIC_NAME}_count{{{labels}}} {h['count']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,51 @@
+# lazy_import.py
+# Отложенный импорт тяжёлых модулей (numpy, PIL, cv2, requests, kivy) для быстрого старта.
+#
+#   np = lazy_module("numpy")        # сам модуль грузится при первом обращении к атрибуту
+#   preload(["numpy", "PIL.Image"])  # прогрев в фоне, пока сервис ждёт первый скрин
+#
+# Если модуля нет вовсе, lazy_module бросает ImportError сразу, как обычный import, —
+# проверки вида try: import cv2 except ImportError продолжают работать.
+
+import sys
+import threading
+import importlib
+import importlib.util
+
+
+def lazy_module(name):
+    """Модуль-заглушка, которая выполнит настоящий импорт при первом обращении."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def preload(names, background=True, on_error=None):
+    """
+    Импортирует модули заранее (в фоне — поток-демон). Ошибки импорта не роняют вызывающего:
+    on_error(name, exc) или молча — модуль просто загрузится позже, там, где нужен.
+    """
+    def run():
+        for name in names:
+            try:
+                # dir() — обращение к атрибутам: заглушка lazy_module тоже загрузится по-настоящему
+                dir(importlib.import_module(name))
+            except Exception as e:
+                if on_error:
+                    on_error(name, e)
+
+    if not background:
+        run()
+        return None
+    t = threading.Thread(target=run, name="preload", daemon=True)
+    t.start()
+    return t
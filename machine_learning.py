@@ -1,17 +1,247 @@
 # machine_learning.py
-# Простейшая логика предсказания направления (вверх/вниз)
-# Позже заменим на real ML-модель
+# Предсказание направления (вверх/вниз) обученной моделью.
+#
+# Модель — логистическая регрессия по признакам candle_analyzer.features_from_candles
+# (стандартизация + веса), хранится в маленьком JSON (MODEL_FILE). Инференс одного
+# примера — чистый Python без numpy (микросекунды), пачка — одним матричным умножением.
+# На импорте ничего тяжёлого не грузится: numpy/candle_analyzer — только когда нужны.
+#
+# Обучение: результаты сделок из feedback.log (с id сигнала, см. overlay_server) склеиваются
+# с сигналами из signal_store, по source_file находится скрин, из него — признаки.
+#   python3 machine_learning.py train --screens screenshots -o direction_model.json
+#   python3 machine_learning.py train --screens screenshots --backtest backtest_out   # признаки из сегментов backtest
 
-import random
+import os
+import sys
+import json
+import math
+import time
+import argparse
 
-def predict_direction(candle_data=None):
+from state_dir import state_path
+
+MODEL_FILE = state_path("direction_model.json")
+FEATURE_KEYS = ('last_change', 'avg_change', 'up_count', 'down_count', 'volatility', 'range_ratio', 'slope')
+L2 = 1.0            # регуляризация весов (на стандартизованных признаках)
+MAX_ITER = 50       # итераций Ньютона
+TOL = 1e-8
+
+_model = None
+_model_path = None
+_model_stamp = None     # (mtime_ns, size) файла модели; None — файла нет
+_indicators = None      # индикаторы, которые нужны модели (см. _model_indicators)
+
+
+# ----- модель -----
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def load_model(path=MODEL_FILE):
+    """Модель из JSON (кэшируется на процесс); None — если файла нет.
+       На вызов — один stat: отсутствие файла тоже кэшируется, переобученная модель подхватывается."""
+    global _model, _model_path, _model_stamp, _indicators
+    stamp = _stamp(path)
+    if _model_path == path and stamp == _model_stamp:
+        return _model
+    _model = None
+    if stamp is not None:
+        try:
+            with open(path) as f:
+                _model = json.load(f)
+        except (OSError, ValueError):
+            pass
+    _model_path, _model_stamp, _indicators = path, stamp, None
+    return _model
+
+
+def _model_indicators(model):
+    """Из FEATURE_INDICATORS — только индикаторы, признаки которых есть в модели:
+       остальные (SMA/EMA/RSI/... без веса) на каждом предсказании не считаются."""
+    global _indicators
+    if _indicators is None or _indicators[0] is not model:
+        from candle_analyzer import FEATURE_INDICATORS
+        from indicators import feature_names
+        wanted = set(model['features'])
+        _indicators = (model, tuple(e for e in FEATURE_INDICATORS if wanted.intersection(feature_names((e,)))))
+    return _indicators[1]
+
+
+def _as_features(candle_data, model):
+    """dict признаков / список свечей (dict с close/color) -> dict признаков, нужных модели."""
+    if isinstance(candle_data, dict):
+        return candle_data
+    from candle_analyzer import features_from_candles
+    return features_from_candles(candle_data, indicators=_model_indicators(model))
+
+
+def _to_result(p_up):
+    """Вероятность роста -> (направление, вероятность этого направления в %)."""
+    if p_up >= 0.5:
+        return "up", round(p_up * 100.0, 2)
+    return "down", round((1.0 - p_up) * 100.0, 2)
+
+
+def prob_up(features, model):
+    """P(рост) для одного примера — без numpy."""
+    z = model['bias']
+    for k, m, s, w in zip(model['features'], model['mean'], model['scale'], model['coef']):
+        z += (float(features.get(k, m)) - m) / s * w
+    # устойчивая сигмоида
+    if z >= 0:
+        return 1.0 / (1.0 + math.exp(-z))
+    e = math.exp(z)
+    return e / (1.0 + e)
+
+
+def predict_direction(candle_data=None, model_path=MODEL_FILE):
+    """
+    candle_data — признаки (dict из features_from_candles) или список свечей.
+    Возвращает (direction, probability): "up"/"down" и вероятность этого направления в % (50..100).
+    Без данных — априорная вероятность модели; без модели — ("neutral", 50.0): направления нет,
+    в engines.AnalysisResult это NEUTRAL, а не голос за рост.
     """
-    candle_data — сюда потом будем передавать данные со скриншота или индикаторов.
-    Пока что используется простая имитация.
-    Возвращает: "up" или "down"
+    model = load_model(model_path)
+    if model is None:
+        return "neutral", 50.0
+    if candle_data is None:
+        return _to_result(prob_up({}, model))
+    return _to_result(prob_up(_as_features(candle_data, model), model))
+
+
+def predict_batch(samples, model_path=MODEL_FILE):
+    """
+    Пачка -> список (direction, probability); одна матричная операция.
+    samples — список признаков/свечей или готовая матрица (N, len(FEATURE_KEYS)).
     """
+    model = load_model(model_path)
+    if model is None:
+        return [("neutral", 50.0)] * len(samples)
+    import numpy as np
+    if isinstance(samples, np.ndarray):
+        X = samples.astype(float, copy=False)
+    else:
+        X = np.array([[float(f.get(k, m)) for k, m in zip(model['features'], model['mean'])]
+                      for f in (_as_features(s, model) for s in samples)], dtype=float).reshape(len(samples), len(model['features']))
+    z = ((X - model['mean']) / model['scale']) @ np.asarray(model['coef']) + model['bias']
+    p = 1.0 / (1.0 + np.exp(-z))
+    return [_to_result(float(v)) for v in p]
+
+
+# ----- обучение -----
+def fit_logistic(X, y, l2=L2, max_iter=MAX_ITER, tol=TOL):
+    """Логистическая регрессия методом Ньютона (IRLS) с L2; X стандартизуется внутри."""
+    import numpy as np
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1.0
+    Z = np.column_stack([(X - mean) / scale, np.ones(len(X))])
+    w = np.zeros(Z.shape[1])
+    reg = np.full(Z.shape[1], l2)
+    reg[-1] = 0.0  # свободный член не штрафуем
+    for _ in range(max_iter):
+        p = 1.0 / (1.0 + np.exp(-Z @ w))
+        grad = Z.T @ (p - y) + reg * w
+        hess = (Z * (p * (1 - p))[:, None]).T @ Z + np.diag(reg)
+        step = np.linalg.solve(hess, grad)
+        w -= step
+        if np.abs(step).max() < tol:
+            break
+    p = 1.0 / (1.0 + np.exp(-Z @ w))
+    return {
+        'features': list(FEATURE_KEYS),
+        'mean': mean.tolist(),
+        'scale': scale.tolist(),
+        'coef': w[:-1].tolist(),
+        'bias': float(w[-1]),
+        'samples': int(len(y)),
+        'train_accuracy': round(float(((p >= 0.5) == (y == 1)).mean()), 4),
+        'trained': time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def save_model(model, path=MODEL_FILE):
+    global _model, _model_path, _model_stamp, _indicators
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(model, f, indent=2)
+    os.replace(tmp, path)
+    _model, _model_path, _model_stamp, _indicators = model, path, _stamp(path), None
+
+
+def _backtest_features(out_dir):
+    """Признаки из сегментов backtest: имя файла -> dict признаков."""
+    from backtest import load_results
+    cols = load_results(out_dir, ('path',) + FEATURE_KEYS)
+    out = {}
+    for i, path in enumerate(cols.get('path', [])):
+        out[os.path.basename(str(path))] = {k: float(cols[k][i]) for k in FEATURE_KEYS}
+    return out
+
+
+def build_dataset(feedback_log, screens_dir, store=None, backtest_dir=None):
+    """
+    Строки feedback.log с id -> сигнал из signal_store -> скрин -> признаки.
+    Метка — фактическое направление: 1 (рост), если UP выиграл или DOWN проиграл.
+    Возвращает (X, y, пропущено).
+    """
+    from hit_stats import parse_feedback_line
+    from signal_store import SignalStore
+    from candle_analyzer import extract_candles_from_image, features_from_candles
+    store = store or SignalStore()
+    cached = _backtest_features(backtest_dir) if backtest_dir else {}
+    X, y, skipped = [], [], 0
+    with open(feedback_log) as f:
+        for line in f:
+            parsed = parse_feedback_line(line)
+            if not parsed or parsed[0] is None:
+                skipped += parsed is not None
+                continue
+            sid, win = parsed
+            row = store.get(sid)
+            if row is None or row['signal'] not in ("UP", "DOWN") or not row['source_file']:
+                skipped += 1
+                continue
+            feats = cached.get(row['source_file'])
+            if feats is None:
+                path = os.path.join(screens_dir, row['source_file'])
+                try:
+                    feats = features_from_candles(extract_candles_from_image(path), indicators=())
+                except Exception:
+                    skipped += 1
+                    continue
+            X.append([feats[k] for k in FEATURE_KEYS])
+            y.append(int((row['signal'] == "UP") == win))
+    return X, y, skipped
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Модель направления: обучение")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    tr = sub.add_parser("train", help="обучить по feedback.log + signal_store")
+    tr.add_argument("--feedback", default="feedback.log")
+    tr.add_argument("--screens", default="screenshots")
+    tr.add_argument("--backtest", help="каталог backtest с готовыми признаками")
+    tr.add_argument("--l2", type=float, default=L2)
+    tr.add_argument("-o", "--out", default=MODEL_FILE)
+    args = ap.parse_args(argv)
+
+    X, y, skipped = build_dataset(args.feedback, args.screens, backtest_dir=args.backtest)
+    print(f"Примеров: {len(y)}, пропущено: {skipped}")
+    if len(set(y)) < 2:
+        print("Нужны сделки с обоими исходами — модель не обучена")
+        return 1
+    model = fit_logistic(X, y, l2=args.l2)
+    save_model(model, args.out)
+    print(f"Сохранено: {args.out} (точность на обучении {model['train_accuracy']:.2%})")
+    return 0
+
 
-    # Здесь позже будет анализ данных
-    # Пока модель просто имитирует поведение
-    direction = random.choice(["up", "down"])
-    return direction
\ No newline at end of file
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+# ocr_pool.py
+# OCR-бэкенд без запуска tesseract на каждый вызов.
+# pytesseract.image_to_string на каждом вызове пишет временный файл, стартует новый
+# процесс tesseract и заново грузит языковые данные — на Termux это основная часть времени.
+#
+# Пул долгоживущих экземпляров TessBaseAPI с уже загруженными языками: картинка передаётся
+# из памяти, распознавание отпускает GIL, так что пул обслуживает параллельные запросы из циклов.
+# Бэкенды по порядку:
+#   tesserocr — PyTessBaseAPI, если пакет установлен;
+#   capi      — libtesseract.so напрямую через ctypes (TessBaseAPICreate/Init3/SetImage/GetUTF8Text).
+#               На Termux tesserocr не собирается, а libtesseract ставится вместе с пакетом tesseract;
+#   cli       — последний вариант: процесс tesseract на вызов, PNG в stdin, текст из stdout,
+#               число одновременных процессов ограничено POOL_SIZE.
+
+import io
+import os
+import queue
+import ctypes
+import ctypes.util
+import threading
+import subprocess
+
+POOL_SIZE = 2           # экземпляров API на одну конфигурацию (язык, psm, whitelist)
+DEFAULT_LANG = "eng"
+PSM_AUTO = 3
+LIBTESSERACT = ("libtesseract.so", "libtesseract.so.5", "libtesseract.so.4")
+
+
+def _tesseract_cmd():
+    """Путь к tesseract — тот же, что настроен для pytesseract (см. pair_recognizer.TESSERACT_CMD)."""
+    try:
+        import pytesseract
+        return pytesseract.pytesseract.tesseract_cmd
+    except ImportError:
+        return "tesseract"
+
+
+def _load_libtesseract():
+    """libtesseract через ctypes с объявленными сигнатурами C API или None."""
+    names = [ctypes.util.find_library("tesseract")] + list(LIBTESSERACT)
+    prefix = os.environ.get("PREFIX")      # Termux: $PREFIX/lib
+    if prefix:
+        names += [os.path.join(prefix, "lib", n) for n in LIBTESSERACT]
+    for name in filter(None, names):
+        try:
+            lib = ctypes.CDLL(name)
+        except OSError:
+            continue
+        p, s, i = ctypes.c_void_p, ctypes.c_char_p, ctypes.c_int
+        for fn, args, res in (
+                ("TessBaseAPICreate", [], p),
+                ("TessBaseAPIInit3", [p, s, s], i),
+                ("TessBaseAPISetPageSegMode", [p, i], None),
+                ("TessBaseAPISetVariable", [p, s, s], i),
+                ("TessBaseAPISetImage", [p, s, i, i, i, i], None),
+                ("TessBaseAPIGetUTF8Text", [p], p),
+                ("TessBaseAPIGetTsvText", [p, i], p),
+                ("TessDeleteText", [p], None),
+                ("TessBaseAPIClear", [p], None),
+                ("TessBaseAPIEnd", [p], None),
+                ("TessBaseAPIDelete", [p], None)):
+            f = getattr(lib, fn)
+            f.argtypes, f.restype = args, res
+        return lib
+    return None
+
+
+class _CApi:
+    """Один инициализированный TessBaseAPI из libtesseract (интерфейс как у PyTessBaseAPI)."""
+
+    def __init__(self, lib, lang, psm, whitelist):
+        self._lib = lib
+        self._image = None
+        self._handle = lib.TessBaseAPICreate()
+        if lib.TessBaseAPIInit3(self._handle, None, lang.encode()) != 0:
+            lib.TessBaseAPIDelete(self._handle)
+            raise RuntimeError(f"libtesseract: не загрузился язык {lang!r} (TESSDATA_PREFIX?)")
+        lib.TessBaseAPISetPageSegMode(self._handle, psm if psm is not None else PSM_AUTO)
+        if whitelist:
+            lib.TessBaseAPISetVariable(self._handle, b"tessedit_char_whitelist", whitelist.encode())
+
+    def _text(self, ptr):
+        if not ptr:
+            return ""
+        try:
+            return ctypes.string_at(ptr).decode("utf-8", errors="replace")
+        finally:
+            self._lib.TessDeleteText(ptr)
+
+    def SetImage(self, img):
+        if img.mode not in ("L", "RGB"):
+            img = img.convert("RGB")
+        bpp = 1 if img.mode == "L" else 3
+        self._image = img.tobytes()          # буфер живёт, пока картинка установлена
+        self._lib.TessBaseAPISetImage(self._handle, self._image, img.width, img.height, bpp, img.width * bpp)
+
+    def GetUTF8Text(self):
+        return self._text(self._lib.TessBaseAPIGetUTF8Text(self._handle))
+
+    def GetTsvText(self, page=0):
+        return self._text(self._lib.TessBaseAPIGetTsvText(self._handle, page))
+
+    def Clear(self):
+        self._lib.TessBaseAPIClear(self._handle)
+        self._image = None
+
+    def End(self):
+        self._lib.TessBaseAPIEnd(self._handle)
+        self._lib.TessBaseAPIDelete(self._handle)
+        self._handle = None
+
+
+def _words_from_tsv(text):
+    """TSV tesseract -> список (text, left, top, width, height)."""
+    words = []
+    for line in text.splitlines()[1:]:
+        parts = line.split("\t")
+        # level page_num block_num par_num line_num word_num left top width height conf text
+        if len(parts) < 12 or parts[0] != "5" or not parts[11].strip():
+            continue
+        words.append((parts[11].strip(), int(parts[6]), int(parts[7]), int(parts[8]), int(parts[9])))
+    return words
+
+
+class TesseractPool:
+
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self._pools = {}
+        self._lock = threading.Lock()
+        self._cli_slots = threading.Semaphore(size)
+        self._cli_logged = False
+        self._tesserocr = self._lib = None
+        try:
+            import tesserocr
+            self._tesserocr = tesserocr
+        except ImportError:
+            self._lib = _load_libtesseract()
+        self.backend = "tesserocr" if self._tesserocr else ("capi" if self._lib else "cli")
+
+    # ----- долгоживущие API (tesserocr / libtesseract) -----
+    def _new_api(self, lang, psm, whitelist):
+        t = self._tesserocr
+        if t is None:
+            return _CApi(self._lib, lang, psm, whitelist)
+        api = t.PyTessBaseAPI(lang=lang, psm=psm if psm is not None else t.PSM.AUTO)
+        if whitelist:
+            api.SetVariable("tessedit_char_whitelist", whitelist)
+        return api
+
+    def _acquire(self, key):
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = {'free': queue.LifoQueue(), 'created': 0}
+            if pool['free'].empty() and pool['created'] < self.size:
+                api = self._new_api(*key)    # RuntimeError (нет языка) — слот не занимаем
+                pool['created'] += 1
+                return api
+        return pool['free'].get()
+
+    def _release(self, key, api):
+        self._pools[key]['free'].put(api)
+
+    def _with_api(self, img, lang, psm, whitelist, fn):
+        key = (lang, psm, whitelist)
+        api = self._acquire(key)
+        try:
+            api.SetImage(img)
+            return fn(api)
+        finally:
+            api.Clear()
+            self._release(key, api)
+
+    # ----- CLI -----
+    def _run_cli(self, img, lang, psm, whitelist, tsv=False):
+        buf = io.BytesIO()
+        img.save(buf, format="PNG")
+        cmd = [_tesseract_cmd(), "stdin", "stdout", "-l", lang]
+        if not self._cli_logged:
+            self._cli_logged = True
+            print("OCR: нет ни tesserocr, ни libtesseract — tesseract запускается процессом на каждый вызов")
+        if psm is not None:
+            cmd += ["--psm", str(psm)]
+        if whitelist:
+            cmd += ["-c", f"tessedit_char_whitelist={whitelist}"]
+        if tsv:
+            cmd.append("tsv")
+        with self._cli_slots:
+            out = subprocess.run(cmd, input=buf.getvalue(), stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE, check=True)
+        return out.stdout.decode("utf-8", errors="replace")
+
+    # ----- публичный интерфейс -----
+    def image_to_string(self, img, lang=DEFAULT_LANG, psm=None, whitelist=None):
+        """Текст с картинки (PIL Image)."""
+        if self.backend != "cli":
+            return self._with_api(img, lang, psm, whitelist, lambda api: api.GetUTF8Text())
+        return self._run_cli(img, lang, psm, whitelist)
+
+    def image_words(self, img, lang=DEFAULT_LANG, psm=None, whitelist=None):
+        """Слова с рамками: список (text, left, top, width, height) в px картинки."""
+        if self._tesserocr:
+            return self._with_api(img, lang, psm, whitelist, self._words_from_api)
+        if self._lib:
+            return self._with_api(img, lang, psm, whitelist, lambda api: _words_from_tsv(api.GetTsvText()))
+        return _words_from_tsv(self._run_cli(img, lang, psm, whitelist, tsv=True))
+
+    def _words_from_api(self, api):
+        t = self._tesserocr
+        api.Recognize()
+        words = []
+        for r in t.iterate_level(api.GetIterator(), t.RIL.WORD):
+            text = r.GetUTF8Text(t.RIL.WORD)
+            box = r.BoundingBox(t.RIL.WORD)
+            if text and box:
+                x1, y1, x2, y2 = box
+                words.append((text.strip(), x1, y1, x2 - x1, y2 - y1))
+        return words
+
+    def close(self):
+        with self._lock:
+            for pool in self._pools.values():
+                while not pool['free'].empty():
+                    pool['free'].get().End()
+            self._pools.clear()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_pool():
+    """Общий пул на процесс."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = TesseractPool()
+        return _default
+
+
+def image_to_string(img, lang=DEFAULT_LANG, psm=None, whitelist=None):
+    return default_pool().image_to_string(img, lang, psm, whitelist)
+
+
+def image_words(img, lang=DEFAULT_LANG, psm=None, whitelist=None):
+    return default_pool().image_words(img, lang, psm, whitelist)
@@ -0,0 +1,153 @@
+# overlay_publisher.py
+# Фоновая доставка сигналов на overlay-сервер.
+#   - одно keep-alive соединение (requests.Session), без нового TCP на каждый сигнал;
+#   - publish() не блокирует: сигнал кладётся в слот, отправляет фоновый поток;
+#   - коалесинг: пока идёт отправка, в слоте остаётся только самый свежий сигнал;
+#   - ограниченные повторы с экспоненциальной паузой (повтор отменяется, если пришёл сигнал новее);
+#   - circuit breaker: после BREAKER_THRESHOLD неудач подряд overlay считается лежащим
+#     на BREAKER_COOLDOWN сек, затем одна пробная отправка (half-open).
+# Счётчики и задержки — в stats().
+
+import time
+import threading
+from instrumentation import span
+
+SEND_PATH = "/signal/start"
+TIMEOUT = 1.0             # сек на один запрос
+MAX_RETRIES = 3           # повторов после первой неудачи
+BACKOFF_BASE = 0.1        # сек, пауза перед первым повтором (дальше x2)
+BACKOFF_MAX = 2.0         # сек, потолок паузы
+BREAKER_THRESHOLD = 5     # неудачных отправок подряд до размыкания
+BREAKER_COOLDOWN = 10.0   # сек, сколько не трогать лежащий overlay
+
+
+class OverlayPublisher:
+
+    def __init__(self, server, path=SEND_PATH, timeout=TIMEOUT, max_retries=MAX_RETRIES,
+                 breaker_threshold=BREAKER_THRESHOLD, breaker_cooldown=BREAKER_COOLDOWN, log=print):
+        self.url = server.rstrip("/") + path
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.log = log
+        self._session = None
+        self._pending = None
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+        self._fail_streak = 0
+        self._open_until = 0.0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.breaker_trips = 0
+        self.last_ms = 0.0
+        self.avg_ms = 0.0
+
+    # ----- публичный интерфейс -----
+    def publish(self, data):
+        """Поставить сигнал на отправку и сразу вернуться."""
+        with self._cond:
+            if self._pending is not None:
+                self.coalesced += 1
+            self._pending = data
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def stats(self):
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'retries': self.retries,
+            'coalesced': self.coalesced,
+            'breaker_open': time.monotonic() < self._open_until,
+            'breaker_trips': self.breaker_trips,
+            'last_ms': round(self.last_ms, 2),
+            'avg_ms': round(self.avg_ms, 2),
+        }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._session is not None:
+            self._session.close()
+
+    # ----- фоновый поток -----
+    def _session_obj(self):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            s = requests.Session()
+            # одно долгоживущее соединение, повторы делаем сами
+            s.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+            s.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0))
+            self._session = s
+        return self._session
+
+    def _take(self):
+        """Ждём сигнал; пока breaker разомкнут — ждём окончания паузы (свежий сигнал остаётся в слоте)."""
+        with self._cond:
+            while not self._closed:
+                wait_breaker = self._open_until - time.monotonic()
+                if self._pending is not None and wait_breaker <= 0:
+                    data, self._pending = self._pending, None
+                    return data
+                self._cond.wait(wait_breaker if self._pending is not None else None)
+            return None
+
+    def _run(self):
+        while True:
+            data = self._take()
+            if data is None:
+                return
+            self._send(data)
+
+    def _newer_pending(self):
+        with self._cond:
+            return self._pending is not None or self._closed
+
+    def _send(self, data):
+        delay = BACKOFF_BASE
+        for attempt in range(self.max_retries + 1):
+            t0 = time.perf_counter()
+            try:
+                with span("overlay_post"):
+                    r = self._session_obj().post(self.url, json=data, timeout=self.timeout)
+                ok = r.status_code < 500
+            except Exception as e:
+                ok = False
+                r = e
+            if ok:
+                self._record(time.perf_counter() - t0)
+                return True
+            # повтор бессмысленен, если уже есть сигнал новее — отправим его
+            if attempt == self.max_retries or self._newer_pending():
+                break
+            self.retries += 1
+            time.sleep(delay)
+            delay = min(delay * 2, BACKOFF_MAX)
+        self._failure(r)
+        return False
+
+    def _record(self, seconds):
+        ms = seconds * 1000.0
+        self.sent += 1
+        self.last_ms = ms
+        self.avg_ms = ms if self.sent == 1 else self.avg_ms * 0.9 + ms * 0.1
+        if self._fail_streak >= self.breaker_threshold:
+            self.log("Overlay снова доступен")
+        self._fail_streak = 0
+
+    def _failure(self, reason):
+        self.failed += 1
+        self._fail_streak += 1
+        if self._fail_streak >= self.breaker_threshold:
+            if self._fail_streak == self.breaker_threshold:
+                self.breaker_trips += 1
+                self.log("Overlay недоступен, пауза", self.breaker_cooldown, "с:", reason)
+            self._open_until = time.monotonic() + self.breaker_cooldown
@@ -1,9 +1,66 @@
-from flask import Flask, send_from_directory, jsonify, request
+from flask import Flask, send_from_directory, jsonify, request, Response
 import os
+import json
 import datetime
+import threading
+
+from hit_stats import HitStats, replay_feedback
+from signal_store import SignalStore
+from instrumentation import span, set_role, collect, to_prometheus
 
 app = Flask(__name__, static_folder="overlay_app/static")
 
+SSE_KEEPALIVE = 15.0   # сек — комментарий-пинг в потоке, чтобы соединение не рвали прокси/ОС
+FEEDBACK_LOG = "feedback.log"
+
+# -----------------------------
+#   Последний сигнал в памяти + раздача всем зрителям
+# -----------------------------
+class SignalHub:
+    """Хранит последний сигнал и будит всех ожидающих клиентов при новом (fan-out).
+       Медленный клиент просто получит самый свежий сигнал — очередей на клиента нет."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._latest = None
+        self._version = 0
+
+    def publish(self, data):
+        with self._cond:
+            self._latest = data
+            self._version += 1
+            self._cond.notify_all()
+
+    def latest(self):
+        with self._cond:
+            return self._version, self._latest
+
+    def wait(self, since, timeout):
+        """Ждём сигнал новее версии since; по таймауту вернём ту же версию."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._version != since, timeout)
+            return self._version, self._latest
+
+hub = SignalHub()
+
+# -----------------------------
+#   Статистика попаданий: feedback склеивается с сигналом по id
+# -----------------------------
+_store = None
+
+def lookup_signal(signal_id):
+    """Сигнал по id из signal_store (его пишет real_time_service — перечитываем, если не нашли)."""
+    global _store
+    if _store is None:
+        _store = SignalStore()
+    row = _store.get(signal_id)
+    if row is None:
+        _store.refresh()
+        row = _store.get(signal_id)
+    return row
+
+stats = HitStats(lookup=lookup_signal)
+
 # -----------------------------
 #   Главная HTML страница
 # -----------------------------
@@ -19,44 +76,107 @@ def static_files(path):
     return send_from_directory("overlay_app/static", path)
 
 # -----------------------------
-#   Данные для оверлея
+#   Данные для оверлея (разовый запрос — последний сигнал)
 # -----------------------------
 @app.route("/data")
 def data():
-    return jsonify({
-        "status": "ok",
-        "message": "Overlay работает!",
-        "value": 123
-    })
+    version, latest = hub.latest()
+    if latest is None:
+        return jsonify({"status": "waiting", "message": "Сигналов пока нет"})
+    return jsonify({"status": "ok", "version": version, "signal": latest})
+
+# -----------------------------
+#   Поток сигналов (Server-Sent Events)
+# -----------------------------
+@app.route("/stream")
+def stream():
+    def events():
+        # переподключившийся клиент сразу получает последнее значение
+        version, latest = hub.latest()
+        if latest is not None:
+            yield f"id: {version}\ndata: {json.dumps(latest, ensure_ascii=False)}\n\n"
+        while True:
+            new_version, latest = hub.wait(version, SSE_KEEPALIVE)
+            if new_version == version:
+                yield ": keepalive\n\n"
+                continue
+            version = new_version
+            yield f"id: {version}\ndata: {json.dumps(latest, ensure_ascii=False)}\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(events(), mimetype="text/event-stream", headers=headers)
 
 # -----------------------------
 #   Запуск сигнала
 # -----------------------------
 @app.route("/signal/start", methods=["POST"])
 def start_signal():
-    # позже тут будет вызов анализа
+    # real_time_service присылает сигнал JSON-ом; кнопка на странице — без тела
+    signal = request.get_json(silent=True)
+    if signal:
+        with span("overlay_publish"):
+            hub.publish(signal)
+            stats.observe_signal(signal)
+        return jsonify({"status": "ok", "message": "signal received"})
     return jsonify({"status": "ok", "message": "signal started"})
 
 # -----------------------------
 #   Запись результата сделки
 # -----------------------------
-def save_feedback(result: str):
+def save_feedback(result: str, signal_id=None):
     t = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open("feedback.log", "a") as f:
-        f.write(f"{t} - {result}\n")
+    with open(FEEDBACK_LOG, "a") as f:
+        if signal_id is None:
+            f.write(f"{t} - {result}\n")
+        else:
+            f.write(f"{t} - {result} - {signal_id}\n")
+    stats.record_outcome(signal_id, result == "SUCCESS")
+
+def feedback_signal_id():
+    """id сигнала из тела ({"id": ...}) или ?id=; без него — последний показанный сигнал."""
+    body = request.get_json(silent=True) or {}
+    sid = body.get("id", request.args.get("id"))
+    if sid is None:
+        _, latest = hub.latest()
+        sid = (latest or {}).get("id")
+    try:
+        return int(sid) if sid is not None else None
+    except (TypeError, ValueError):
+        return None
 
 @app.route("/feedback/success", methods=["POST"])
 def feedback_success():
-    save_feedback("SUCCESS")
+    save_feedback("SUCCESS", feedback_signal_id())
     return jsonify({"status": "ok", "message": "успешная сделка сохранена"})
 
 @app.route("/feedback/fail", methods=["POST"])
 def feedback_fail():
-    save_feedback("FAIL")
+    save_feedback("FAIL", feedback_signal_id())
     return jsonify({"status": "ok", "message": "неуспешная сделка сохранена"})
 
+# -----------------------------
+#   Винрейт по паре / направлению / уверенности / экспирации
+# -----------------------------
+@app.route("/stats")
+def stats_view():
+    # счётчики уже посчитаны при записи feedback — здесь только отдаём
+    return jsonify(stats.snapshot())
+
+# -----------------------------
+#   Замеры горячего пути (instrumentation) всех процессов — для Prometheus
+# -----------------------------
+@app.route("/metrics")
+def metrics():
+    return Response(to_prometheus(collect()), mimetype="text/plain; version=0.0.4")
+
 # -----------------------------
 #   Запуск сервера
 # -----------------------------
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
+    # HTTP/1.1 — keep-alive для real_time_service (по умолчанию dev-сервер закрывает соединение после ответа)
+    from werkzeug.serving import WSGIRequestHandler
+    WSGIRequestHandler.protocol_version = "HTTP/1.1"
+    # один раз при старте восстанавливаем счётчики из лога
+    replay_feedback(stats, FEEDBACK_LOG)
+    set_role("overlay")
+    app.run(host="0.0.0.0", port=5000, threaded=True)
\ No newline at end of file
@@ -12,13 +12,23 @@ from kivy.uix.button import Button
 from kivy.properties import StringProperty, NumericProperty
 from kivy.uix.behaviors import DragBehavior
 import os, glob, json
+from lazy_import import preload
 
 # Подключаем твой анализатор: используем функцию predict_from_image
-# (если файл candle_analyzer.py есть — будет использоваться)
-try:
-    from candle_analyzer import predict_from_image
-except Exception as e:
-    predict_from_image = None
+# (если файл candle_analyzer.py есть — будет использоваться).
+# Версия с кэшем: тот же последний скрин каждую секунду не анализируется заново.
+# Импорт (numpy + PIL) — не на старте: окно показывается сразу, анализатор грузится в фоне.
+_predict = None
+
+def predict_from_image(path):
+    global _predict
+    if _predict is None:
+        try:
+            from candle_analyzer import predict_from_image_cached
+            _predict = predict_from_image_cached
+        except Exception:
+            _predict = False
+    return _predict(path) if _predict else None
 
 class DraggableBox(DragBehavior, BoxLayout):
     pass
@@ -38,16 +48,17 @@ class Overlay(BoxLayout):
                 self.expiry = 1
                 return
             last = files[-1]
-            if predict_from_image:
-                try:
-                    res = predict_from_image(last)
-                    self.signal = res.get("signal", "NEUTRAL")
-                    self.confidence = res.get("confidence", 50.0)
-                    self.expiry = res.get("expiry_min", 1)
-                except Exception as e:
-                    self.signal = "ERR"
-                    self.confidence = 0.0
-                    self.expiry = 1
+            try:
+                res = predict_from_image(last)
+            except Exception as e:
+                self.signal = "ERR"
+                self.confidence = 0.0
+                self.expiry = 1
+                return
+            if res is not None:
+                self.signal = res.get("signal", "NEUTRAL")
+                self.confidence = res.get("confidence", 50.0)
+                self.expiry = res.get("expiry_min", 1)
             else:
                 # Заглушка — если нет модуля анализа
                 self.signal = "NEUTRAL"
@@ -107,8 +118,9 @@ class OverlayApp(App):
         Clock.schedule_interval(overlay.update_from_latest, 1.0)
         # привязать overlay к box для отображения
         # (обновлять локальные лейблы через бинды)
-        # сразу сделать первую итерацию
-        overlay.update_from_latest()
+        # первая итерация — сразу после показа окна; анализатор тем временем грузится в фоне
+        preload(["candle_analyzer"])
+        Clock.schedule_once(overlay.update_from_latest, 0)
 
         # также показываем стрелку/цвет по сигналу - менять цвет фона при обновлении
         def color_update(dt):
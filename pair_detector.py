@@ -1,7 +1,5 @@
-import re
-from PIL import Image
-import pytesseract
 import os
+from pair_ocr import recognize
 
 # Папка со скриншотами
 SCREEN_PATH = "/storage/emulated/0/TradeAnalyzer/screenshots/"
@@ -10,19 +8,11 @@ SCREEN_PATH = "/storage/emulated/0/TradeAnalyzer/screenshots/"
 def extract_pair_from_image(image_path):
     """
     Извлекает название валютной пары со скриншота.
+    image_path — путь или уже декодированный frame.Frame (тогда файл не читается повторно).
+    OCR только по заголовку, результат кэшируется (pair_ocr).
     """
     try:
-        img = Image.open(image_path)
-
-        # OCR извлечение текста
-        text = pytesseract.image_to_string(img, lang="eng")
-
-        # Ищем пары вида XXX/YYY
-        match = re.search(r"[A-Z]{3}/[A-Z]{3}", text)
-        if match:
-            return match.group(0)
-
-        return "UNKNOWN"
+        return recognize(image_path)["pair"]
 
     except Exception as e:
         return f"ERROR: {e}"
@@ -30,16 +20,10 @@ def extract_pair_from_image(image_path):
 
 def detect_otc(image_path):
     """
-    Определяет OTC ли это по тексту.
+    Определяет OTC ли это по тексту (путь или frame.Frame).
     """
     try:
-        img = Image.open(image_path)
-        text = pytesseract.image_to_string(img, lang="eng")
-
-        if "OTC" in text.upper():
-            return True
-
-        return False
+        return recognize(image_path)["otc"]
 
     except Exception:
         return False
@@ -50,6 +34,7 @@ def analyze_latest_screenshot():
     Анализ последнего скрина:
     - валютная пара
     - OTC или не OTC
+    Пара и OTC — из одного прохода OCR.
     """
 
     files = sorted(os.listdir(SCREEN_PATH))
@@ -58,8 +43,11 @@ def analyze_latest_screenshot():
 
     last_file = SCREEN_PATH + files[-1]
 
-    pair = extract_pair_from_image(last_file)
-    otc = detect_otc(last_file)
+    try:
+        res = recognize(last_file)
+        pair, otc = res["pair"], res["otc"]
+    except Exception as e:
+        pair, otc = f"ERROR: {e}", False
 
     return {
         "pair": pair,
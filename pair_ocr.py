@@ -0,0 +1,107 @@
+# pair_ocr.py
+# Единое распознавание валютной пары и OTC за один проход OCR.
+# Раньше каждый скрин стоил два полноэкранных вызова tesseract в pair_detector
+# (пара + OTC) и ещё один в pair_recognizer. Теперь:
+#   - OCR только по небольшой полосе заголовка, где написан актив (HEADER_REGION);
+#   - пара и OTC разбираются из одного и того же текста;
+#   - результат кэшируется по хэшу пикселей заголовка — пара между кадрами почти не меняется,
+#     так что в установившемся режиме OCR не запускается вовсе;
+#   - сам OCR — через пул долгоживущих tesseract (ocr_pool), без процесса на вызов.
+
+import re
+import hashlib
+import threading
+from collections import OrderedDict
+
+import ocr_pool
+
+HEADER_REGION = (0.0, 0.0, 1.0, 0.12)   # left, top, right, bottom — доли экрана
+OCR_LANG = "eng"
+CACHE_SIZE = 64
+
+# Популярные пары — ищем и в слитном написании (EURUSD)
+KNOWN_PAIRS = [
+    "EURUSD", "GBPUSD", "USDJPY", "AUDUSD",
+    "USDCAD", "USDCHF", "EURJPY", "GBPJPY",
+    "NZDUSD", "EURGBP"
+]
+_PAIR_RE = re.compile(r"[A-Z]{3}/[A-Z]{3}")
+# кириллица, похожая на латиницу (ОТС, ЕUR ...) — tesseract путает их на мелком шрифте
+_LOOKALIKES = str.maketrans("АВЕКМНОРСТУХ", "ABEKMHOPCTYX")
+
+
+def header_box(size, region=HEADER_REGION):
+    w, h = size
+    return int(w * region[0]), int(h * region[1]), int(w * region[2]), int(h * region[3])
+
+
+def header_crop(img, region=HEADER_REGION):
+    return img.crop(header_box(img.size, region))
+
+
+def parse_header_text(text):
+    """Текст OCR -> {'pair': 'EUR/USD' | 'UNKNOWN', 'otc': bool, 'raw_text': ...}."""
+    upper = text.upper().translate(_LOOKALIKES)
+    compact = upper.replace(" ", "").strip()
+    pair = "UNKNOWN"
+    match = _PAIR_RE.search(compact)
+    if match:
+        pair = match.group(0)
+    else:
+        for known in KNOWN_PAIRS:
+            if known in compact:
+                pair = known[:3] + "/" + known[3:]
+                break
+    return {"pair": pair, "otc": "OTC" in compact, "raw_text": compact}
+
+
+class PairRecognizer:
+    """OCR заголовка с LRU-кэшем по хэшу его пикселей."""
+
+    def __init__(self, region=HEADER_REGION, lang=OCR_LANG, cache_size=CACHE_SIZE):
+        self.region = region
+        self.lang = lang
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.ocr_runs = 0
+
+    def recognize(self, image):
+        """image — путь, PIL Image или frame.Frame. Один OCR на новый заголовок, дальше из кэша."""
+        from PIL import Image
+        if isinstance(image, str):
+            with Image.open(image) as img:
+                header = header_crop(img, self.region).convert("L")
+        elif hasattr(image, "buf"):
+            # Frame: серый вырез кэшируется в кадре — повторный recognize не режет заново
+            header = image.crop(header_box(image.size, self.region), "L")
+        else:
+            header = header_crop(image, self.region).convert("L")
+        key = hashlib.blake2b(header.tobytes(), digest_size=16).digest() + repr(header.size).encode()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return dict(cached)
+
+        text = ocr_pool.image_to_string(header, lang=self.lang)
+        res = parse_header_text(text)
+        with self._lock:
+            self.ocr_runs += 1
+            self._cache[key] = res
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return dict(res)
+
+
+_default = None
+
+
+def recognize(image):
+    """Общий распознаватель на процесс (кэш заголовков делится между вызывающими)."""
+    global _default
+    if _default is None:
+        _default = PairRecognizer()
+    return _default.recognize(image)
@@ -1,5 +1,5 @@
 import pytesseract
-from PIL import Image
+from pair_ocr import recognize
 
 # Путь к tesseract в Termux
 TESSERACT_CMD = "/data/data/com.termux/files/usr/bin/tesseract"
@@ -8,35 +8,17 @@ pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
 def recognize_pair(image_path):
     """
     Распознаёт валютную пару и тип рынка (OTC/обычный).
-    image_path — путь к скриншоту с названием валюты.
+    image_path — путь к скриншоту с названием валюты или frame.Frame.
+    Один проход OCR по заголовку с кэшем (pair_ocr); пара — в слитном виде (EURUSD).
     """
     try:
-        img = Image.open(image_path)
-
-        # Распознаём текст
-        text = pytesseract.image_to_string(img, lang="eng+rus")
-        text = text.upper().replace(" ", "").strip()
-
-        # Список популярных валютных пар
-        pairs = [
-            "EURUSD", "GBPUSD", "USDJPY", "AUDUSD",
-            "USDCAD", "USDCHF", "EURJPY", "GBPJPY",
-            "NZDUSD", "EURGBP"
-        ]
-
-        recognized_pair = "UNKNOWN"
-        for pair in pairs:
-            if pair in text:
-                recognized_pair = pair
-                break
-
-        # Определяем OTC
-        is_otc = "OTC" in text
+        res = recognize(image_path)
+        pair = res["pair"]
 
         return {
-            "pair": recognized_pair,
-            "otc": is_otc,
-            "raw_text": text
+            "pair": pair.replace("/", "") if pair != "UNKNOWN" else pair,
+            "otc": res["otc"],
+            "raw_text": res["raw_text"]
         }
 
     except Exception as e:
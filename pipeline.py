@@ -0,0 +1,234 @@
+# pipeline.py
+# Потоковый конвейер анализа: обнаружение файла -> декодирование -> анализ -> публикация.
+# Стадии развязаны ограниченными очередями, поэтому медленный overlay не задерживает
+# анализ, а медленный анализ не копит очередь старых скринов.
+#
+# Политика latest-wins: очередь переполнена — выбрасывается самый старый элемент,
+# а публикация отбрасывает результат, если уже опубликован более свежий кадр.
+# По каждой стадии считаются обработанные/выброшенные/ошибки, глубина очереди и задержки.
+
+import time
+import queue
+import threading
+from collections import deque
+
+QUEUE_SIZE = 2         # элементов между стадиями (больше не нужно — важен только свежий кадр)
+DECODE_WORKERS = 2     # потоков декодирования (PIL отпускает GIL)
+ANALYZE_WORKERS = 1    # параллельных задач анализа
+
+
+class LatestQueue:
+    """Ограниченная очередь; при переполнении вытесняется самый старый элемент."""
+
+    def __init__(self, maxsize=QUEUE_SIZE):
+        self.maxsize = maxsize
+        self._items = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, item):
+        """Кладёт элемент, возвращает вытесненный (или None)."""
+        with self._cond:
+            dropped = None
+            if len(self._items) >= self.maxsize:
+                dropped = self._items.popleft()
+            self._items.append(item)
+            self._cond.notify()
+            return dropped
+
+    def get(self, timeout=None):
+        """Берёт самый старый элемент; queue.Empty по таймауту или после close()."""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait(timeout)
+            if not self._items:
+                raise queue.Empty
+            return self._items.popleft()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def __len__(self):
+        return len(self._items)
+
+
+class StageStats:
+    """Счётчики и задержки одной стадии (мс): последняя, скользящая средняя, максимум."""
+
+    def __init__(self, name):
+        self.name = name
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.last_ms = 0.0
+        self.avg_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        ms = seconds * 1000.0
+        with self._lock:
+            self.processed += 1
+            self.last_ms = ms
+            self.avg_ms = ms if self.processed == 1 else self.avg_ms * 0.9 + ms * 0.1
+            self.max_ms = max(self.max_ms, ms)
+
+    def drop(self, n=1):
+        with self._lock:
+            self.dropped += n
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self, depth=None):
+        snap = {
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'last_ms': round(self.last_ms, 2),
+            'avg_ms': round(self.avg_ms, 2),
+            'max_ms': round(self.max_ms, 2),
+        }
+        if depth is not None:
+            snap['queue'] = depth
+        return snap
+
+
+class Pipeline:
+    """
+    source        — итерируемый источник путей (ScreenshotWatcher) или готовых кадров (capture.SharedFrameSource);
+    decode(path)  -> кадр (выполняется в пуле потоков; готовый кадр decode может вернуть как есть);
+    analyze(frame)-> результат (выполняется в analyze_executor, например ProcessPoolExecutor);
+    publish(path, result) — в отдельном потоке, только для самых свежих кадров.
+    """
+
+    def __init__(self, source, decode, analyze, publish, analyze_executor,
+                 decode_workers=DECODE_WORKERS, analyze_workers=ANALYZE_WORKERS, queue_size=QUEUE_SIZE, log=print):
+        self.source = source
+        self.decode = decode
+        self.analyze = analyze
+        self.publish = publish
+        self.executor = analyze_executor
+        self.decode_workers = decode_workers
+        self.analyze_workers = analyze_workers
+        self.log = log
+        self.decode_q = LatestQueue(queue_size)
+        self.analyze_q = LatestQueue(queue_size)
+        self.publish_q = LatestQueue(1)
+        self.stats_by_stage = {name: StageStats(name) for name in ('discover', 'decode', 'analyze', 'publish', 'total')}
+        self._seq = 0
+        self._last_published = 0
+        self._stop = threading.Event()
+        self._threads = []
+
+    # ----- стадии -----
+    def _put(self, q, stage, item):
+        if q.put(item) is not None:
+            self.stats_by_stage[stage].drop()
+
+    def _discover(self):
+        st = self.stats_by_stage['discover']
+        for path in self.source:
+            if self._stop.is_set():
+                break
+            self._seq += 1
+            st.record(0.0)
+            self._put(self.decode_q, 'decode', (self._seq, path, time.perf_counter()))
+
+    def _decode_loop(self):
+        st = self.stats_by_stage['decode']
+        while not self._stop.is_set():
+            try:
+                seq, path, t_found = self.decode_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            t0 = time.perf_counter()
+            try:
+                frame = self.decode(path)
+            except Exception as e:
+                st.error()
+                self.log("Ошибка декодирования:", path, e)
+                continue
+            st.record(time.perf_counter() - t0)
+            self._put(self.analyze_q, 'analyze', (seq, path, frame, t_found))
+
+    def _analyze_loop(self):
+        st = self.stats_by_stage['analyze']
+        while not self._stop.is_set():
+            try:
+                seq, path, frame, t_found = self.analyze_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if seq < self._last_published:
+                st.drop()
+                continue
+            t0 = time.perf_counter()
+            try:
+                result = self.executor.submit(self.analyze, frame).result()
+            except Exception as e:
+                st.error()
+                self.log("Ошибка анализа изображения:", path, e)
+                continue
+            st.record(time.perf_counter() - t0)
+            self._put(self.publish_q, 'publish', (seq, path, result, t_found))
+
+    def _publish_loop(self):
+        st = self.stats_by_stage['publish']
+        while not self._stop.is_set():
+            try:
+                seq, path, result, t_found = self.publish_q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            # кадры могли обогнать друг друга в пулах — старый сигнал не публикуем
+            if seq < self._last_published:
+                st.drop()
+                continue
+            self._last_published = seq
+            t0 = time.perf_counter()
+            try:
+                self.publish(path, result)
+            except Exception as e:
+                st.error()
+                self.log("Ошибка публикации:", e)
+                continue
+            now = time.perf_counter()
+            st.record(now - t0)
+            self.stats_by_stage['total'].record(now - t_found)
+
+    # ----- управление -----
+    def start(self):
+        targets = [self._discover, self._publish_loop]
+        targets += [self._decode_loop] * self.decode_workers
+        targets += [self._analyze_loop] * self.analyze_workers
+        for target in targets:
+            t = threading.Thread(target=target, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for q in (self.decode_q, self.analyze_q, self.publish_q):
+            q.close()
+        close = getattr(self.source, "close", None)
+        if close:
+            close()
+        for t in self._threads:
+            t.join(timeout=2)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        """Снимок по стадиям: счётчики, глубина входной очереди, задержки (мс)."""
+        depth = {'decode': len(self.decode_q), 'analyze': len(self.analyze_q), 'publish': len(self.publish_q)}
+        return {name: st.snapshot(depth.get(name)) for name, st in self.stats_by_stage.items()}
+
+    def format_stats(self):
+        """Одна строка для лога."""
+        parts = []
+        for name, s in self.stats().items():
+            q = f" q={s['queue']}" if 'queue' in s else ""
+            parts.append(f"{name}: n={s['processed']} drop={s['dropped']} err={s['errors']}{q} avg={s['avg_ms']}ms")
+        return " | ".join(parts)
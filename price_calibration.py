@@ -0,0 +1,205 @@
+# price_calibration.py
+# Привязка пикселей к цене: OCR подписей шкалы цен -> линейная модель price = a*y + b.
+# Все анализаторы отдают координаты в px; с калибровкой свечи превращаются в числовой OHLC.
+#
+# OCR дорогой, поэтому калибровка кэшируется по раскладке (разрешение экрана и полоса шкалы)
+# и переиспользуется между кадрами. Хэш всей полосы для проверки не годится: плашка текущей
+# цены ездит по шкале каждый тик. Вместо этого с моделью хранятся рамки нескольких подписей
+# сетки и хэши их пикселей: пока большинство из них на месте, шкала та же и OCR не запускается.
+# Шкала перестроилась (цена вышла за диапазон) — подписи сдвинулись, проверка не проходит.
+#
+#   cal = Calibrator()
+#   pm = cal.price_map(img)                 # PriceMap или None (нет tesseract / не распознали)
+#   ohlc = candles_to_prices(candles, pm)   # (N, 4): open, high, low, close
+
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+
+import numpy as np
+
+import ocr_pool
+from state_dir import state_path
+
+AXIS_REGION = (0.86, 0.05, 1.0, 0.95)   # полоса с подписями цен: left, top, right, bottom — доли экрана
+CALIBRATION_FILE = state_path("calibration.json")
+OCR_PSM = 11            # разреженный текст: отдельные подписи по вертикали
+OCR_WHITELIST = "0123456789.,"
+MIN_POINTS = 3          # минимум распознанных подписей для подгонки
+MAX_RESIDUAL = 3.0      # выброс, если отклонение больше MAX_RESIDUAL * медианного
+CHECK_LABELS = 4        # подписей сетки, по которым проверяется, что шкала не перестроилась
+CHECK_MATCH = 2         # столько из них должны совпасть (одну может закрыть плашка цены)
+RETRY_INTERVAL = 30.0   # сек — повтор OCR после неудачной калибровки
+FAIL_LOG_INTERVAL = 300.0  # сек — не чаще печатать ошибку OCR
+_NUMBER = re.compile(r"^\d+(?:[.,]\d+)?$")
+
+
+class PriceMap:
+    """Линейное отображение y (px, 0 сверху) <-> цена."""
+    __slots__ = ("a", "b", "points")
+
+    def __init__(self, a, b, points=0):
+        self.a = float(a)
+        self.b = float(b)
+        self.points = int(points)
+
+    def to_price(self, y):
+        return self.a * np.asarray(y, dtype=float) + self.b
+
+    def to_px(self, price):
+        return (np.asarray(price, dtype=float) - self.b) / self.a
+
+    def to_dict(self):
+        return {'a': self.a, 'b': self.b, 'points': self.points}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['a'], d['b'], d.get('points', 0))
+
+    def __repr__(self):
+        return f"PriceMap(a={self.a:.6g}, b={self.b:.6g}, points={self.points})"
+
+
+def axis_box(size, region=AXIS_REGION):
+    w, h = size
+    return (int(w * region[0]), int(h * region[1]), int(w * region[2]), int(h * region[3]))
+
+
+def _axis_words(img, region=AXIS_REGION):
+    """OCR полосы шкалы: список (рамка подписи в px экрана, цена)."""
+    box = axis_box(img.size, region)
+    strip = img.crop(box).convert("L")
+    words = []
+    for text, left, top, width, height in ocr_pool.image_words(strip, psm=OCR_PSM, whitelist=OCR_WHITELIST):
+        if not _NUMBER.match(text):
+            continue
+        x0, y0 = box[0] + left, box[1] + top
+        words.append(((x0, y0, x0 + width, y0 + height), float(text.replace(",", "."))))
+    return words
+
+
+def ocr_axis_labels(img, region=AXIS_REGION):
+    """OCR полосы шкалы: список (y_центра_подписи_в_px_экрана, цена)."""
+    return [((t + b) / 2.0, price) for (_l, t, _r, b), price in _axis_words(img, region)]
+
+
+def _label_hash(gray, box):
+    return hashlib.blake2b(gray.crop(tuple(box)).tobytes(), digest_size=8).hexdigest()
+
+
+def fit_price_map(points):
+    """МНК по точкам (y, цена) с отбрасыванием выбросов (ошибки OCR). None — если не вышло."""
+    if len(points) < MIN_POINTS:
+        return None
+    pts = np.asarray(points, dtype=float)
+    ys, prices = pts[:, 0], pts[:, 1]
+    keep = np.ones(len(pts), dtype=bool)
+    for _ in range(3):
+        if keep.sum() < MIN_POINTS or np.ptp(ys[keep]) == 0:
+            return None
+        a, b = np.polyfit(ys[keep], prices[keep], 1)
+        resid = np.abs(prices - (a * ys + b))
+        scale = np.median(resid[keep]) + 1e-12
+        new_keep = resid <= MAX_RESIDUAL * scale
+        if (new_keep == keep).all():
+            break
+        keep = new_keep
+    # цена растёт вверх, y — вниз: наклон обязан быть отрицательным
+    if keep.sum() < MIN_POINTS or a >= 0:
+        return None
+    return PriceMap(a, b, keep.sum())
+
+
+def candles_to_prices(candles, price_map):
+    """Свечи в px (dict open/high/low/close) -> массив (N, 4) цен open, high, low, close."""
+    px = np.array([[c['open'], c['high'], c['low'], c['close']] for c in candles], dtype=float)
+    if px.size == 0:
+        return np.empty((0, 4))
+    return price_map.to_price(px)
+
+
+class Calibrator:
+    """Кэш калибровок по раскладке; OCR только когда подписи сетки сдвинулись."""
+
+    def __init__(self, path=CALIBRATION_FILE, region=AXIS_REGION):
+        self.path = path
+        self.region = region
+        self._lock = threading.Lock()
+        self._cache = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._cache = json.load(f)
+            except (OSError, ValueError):
+                self._cache = {}
+        self.ocr_runs = 0
+        self._failed = {}       # layout -> time.monotonic() неудачной калибровки (только в памяти)
+        self._logged = 0.0
+
+    def _layout(self, img):
+        return "{}x{}:{},{},{},{}".format(*img.size, *axis_box(img.size, self.region))
+
+    def _still_valid(self, img, labels):
+        """Шкала не перестроилась: хотя бы CHECK_MATCH сохранённых подписей на тех же местах."""
+        gray = img.convert("L") if img.mode != "L" else img
+        need = min(CHECK_MATCH, len(labels))
+        return sum(_label_hash(gray, box) == h for *box, h in labels) >= need
+
+    def _check_labels(self, img, words, pm):
+        """Рамки и хэши до CHECK_LABELS подписей, которые легли на модель, — равномерно по высоте."""
+        good = [box for box, price in words
+                if abs(pm.to_price((box[1] + box[3]) / 2.0) - price) <= abs(pm.a) * (box[3] - box[1])]
+        good.sort(key=lambda box: box[1])
+        if len(good) > CHECK_LABELS:
+            good = [good[round(i * (len(good) - 1) / (CHECK_LABELS - 1))] for i in range(CHECK_LABELS)]
+        gray = img.convert("L")
+        return [[*box, _label_hash(gray, box)] for box in good]
+
+    def price_map(self, img):
+        layout = self._layout(img)
+        with self._lock:
+            entry = self._cache.get(layout)
+            if entry and entry.get('map') and entry.get('labels') and self._still_valid(img, entry['labels']):
+                return PriceMap.from_dict(entry['map'])
+            failed = self._failed.get(layout)
+            if failed is not None and time.monotonic() - failed < RETRY_INTERVAL:
+                return None
+        try:
+            words = _axis_words(img, self.region)
+        except Exception as e:
+            # нет tesseract/pytesseract — повтор не раньше RETRY_INTERVAL, сообщение не чаще FAIL_LOG_INTERVAL
+            words = []
+            now = time.monotonic()
+            if now - self._logged >= FAIL_LOG_INTERVAL:
+                self._logged = now
+                print("Калибровка цены недоступна:", e)
+        pm = fit_price_map([((t + b) / 2.0, price) for (_l, t, _r, b), price in words])
+        with self._lock:
+            self.ocr_runs += 1
+            if pm is None:
+                self._failed[layout] = time.monotonic()
+                return None
+            self._failed.pop(layout, None)
+            self._cache[layout] = {
+                'map': pm.to_dict(),
+                'labels': self._check_labels(img, words, pm),
+                'updated': time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            self._save()
+        return pm
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._cache, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def ohlc(self, img, candles):
+        """Свечи кадра в ценах (N, 4) или None, если шкалу не удалось откалибровать."""
+        pm = self.price_map(img)
+        return candles_to_prices(candles, pm) if pm else None
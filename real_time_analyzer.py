@@ -3,74 +3,112 @@
 # Помести файл в папку TradeAnalyzer и запусти: python3 real_time_analyzer.py
 
 import os
+import sys
 import time
-from PIL import Image
+import numpy as np
 from statistics import median
-from datetime import datetime
+from screenshot_watcher import ScreenshotWatcher
+from result_cache import cached_by_file, cached_by_image
+from frame_diff import ColumnCache
+from signal_store import default_store
+from instrumentation import timed, span, summary_line
+from chart_layout import default_layouts
+from frame import as_pil
 
 # ----- Настройки (подстрой под свой экран) -----
 SCREENSHOTS_DIR = "screenshots"   # относительный путь в папке проекта
-CROP = (40, 120, 680, 1000)       # (left, top, right, bottom) — ОБЯЗАТЕЛЬНО настроить под твой экран
+AUTO_LAYOUT = True               # область графика и колонки свечей ищутся сами (chart_layout)
+CROP = (40, 120, 680, 1000)       # (left, top, right, bottom) — запасной вариант, если график не нашли
 CANDLES_TO_ANALYSE = 20          # сколько последних свечей анализируем
-SAMPLE_COLS = 40                 # сколько колонок пробуем распределить по области (чем больше — тем точнее)
+SAMPLE_COLS = 40                 # сколько колонок пробуем распределить по области (чем больше — тем точнее, 0 — все колонки)
 NEAR_LEVEL_PX = 12               # px — порог близости к уровню для повышения вероятности
-POLL_INTERVAL = 2.0              # сек — как часто смотреть папку
-RESULTS_CSV = "results.csv"
+POLL_INTERVAL = 0.5              # сек — опрос папки, если inotify недоступен
+SUMMARY_INTERVAL = 60.0          # сек — как часто печатать сводку замеров (instrumentation)
+COLOR_MIN = 100                  # минимальная яркость канала для «цветного» пикселя
+COLOR_MARGIN = 20                # насколько канал должен превышать два других
 
 # ----- Вспомогательные -----
 def is_red(rgb):
     r,g,b = rgb
-    return (r > 100) and (r > g + 20) and (r > b + 20)
+    return (r > COLOR_MIN) and (r > g + COLOR_MARGIN) and (r > b + COLOR_MARGIN)
 
 def is_green(rgb):
     r,g,b = rgb
-    return (g > 100) and (g > r + 20) and (g > b + 20)
+    return (g > COLOR_MIN) and (g > r + COLOR_MARGIN) and (g > b + COLOR_MARGIN)
 
-def analyze_candles(img):
-    """
-    Сканируем прямоугольник CROP, разбиваем по вертикали на SAMPLE_COLS сэмплов,
-    для каждого сэмпла определяем цвет свечи и её high/low (по окрашенным пикселям).
-    """
-    left, top, right, bottom = CROP
-    crop = img.crop((left, top, right, bottom))
-    w, h = crop.size
+def color_masks(arr):
+    """Векторные is_red/is_green: arr — (H, W, 3) uint8, вернёт две bool-маски (H, W)."""
+    a = arr.astype(np.int16)
+    r, g, b = a[..., 0], a[..., 1], a[..., 2]
+    red = (r > COLOR_MIN) & (r > g + COLOR_MARGIN) & (r > b + COLOR_MARGIN)
+    green = (g > COLOR_MIN) & (g > r + COLOR_MARGIN) & (g > b + COLOR_MARGIN)
+    return red, green
 
-    cols = []
+def sample_columns(w):
+    """x-позиции сэмплов внутри CROP; SAMPLE_COLS <= 0 — каждая пиксельная колонка."""
+    if SAMPLE_COLS <= 0:
+        return list(range(w))
     # равномерно распределим позиции по ширине (последние SAMPLE_COLS)
-    for i in range(SAMPLE_COLS):
-        x = int(w * (i + 0.5) / SAMPLE_COLS)
-        cols.append(x)
+    return [int(w * (i + 0.5) / SAMPLE_COLS) for i in range(SAMPLE_COLS)]
+
+def frame_layout(img):
+    """Раскладка кадра (chart_layout.Layout) или None — тогда CROP и SAMPLE_COLS."""
+    return default_layouts().get(img) if AUTO_LAYOUT else None
+
+def layout_fingerprint():
+    """Часть ключа result_cache: найденные раскладки (при AUTO_LAYOUT результат зависит от них)."""
+    return default_layouts().fingerprint() if AUTO_LAYOUT else ""
+
+def crop_box(img):
+    layout = frame_layout(img)
+    return layout.box if layout is not None else CROP
+
+@timed("crop")
+def _crop_array(img, box=None):
+    """Прямоугольник box (по умолчанию CROP) как массив (H, W, 3) uint8; у frame.Frame — view без копии."""
+    left, top, right, bottom = box or CROP
+    if hasattr(img, "view"):
+        return img.view((left, top, right, bottom))
+    crop = img.crop((left, top, right, bottom))
+    arr = np.asarray(crop)
+    if arr.ndim == 3:
+        arr = arr[:, :, :3]  # RGBA -> RGB
+    return arr
+
+def frame_columns(img):
+    """Область анализа и x колонок в ней: центры свечей из раскладки или сэмплы по CROP."""
+    layout = frame_layout(img)
+    if layout is None:
+        arr = _crop_array(img)
+        return arr, sample_columns(arr.shape[1])
+    return _crop_array(img, layout.box), layout.columns()
+
+@timed()
+def scan_columns(sub, cols):
+    """
+    sub — пиксели сэмплов (H, C, 3), cols — их x. Для каждого сэмпла цвет свечи
+    и её top/bottom по окрашенным пикселям (None — цветных пикселей нет).
+    Маски красного/зелёного строятся сразу для всех сэмплов, top/bottom — через argmax.
+    """
+    h = sub.shape[0]
+    red, green = color_masks(sub)
+    colored = red | green
+    has_color = colored.any(axis=0)
+    # первый/последний окрашенный пиксель по Y в каждой колонке
+    top_ys = colored.argmax(axis=0)
+    bottom_ys = h - 1 - colored[::-1].argmax(axis=0)
 
     candle_infos = []
-    for x in cols:
-        # пробуем найти диапазон цветных пикселей по вертикали в этой колонке
-        colored_pixels = []
-        for y in range(h):
-            px = crop.getpixel((x, y))
-            # px может быть RGB или RGBA
-            if len(px) == 4:
-                px = px[:3]
-            if is_red(px) or is_green(px):
-                colored_pixels.append((y, px))
-        if not colored_pixels:
+    for i, x in enumerate(cols):
+        if not has_color[i]:
             candle_infos.append(None)
             continue
-        ys = [y for y, _ in colored_pixels]
-        top_y = min(ys)
-        bottom_y = max(ys)
-        # определим средний цвет по центру сегмента
+        top_y = int(top_ys[i])
+        bottom_y = int(bottom_ys[i])
+        # определим средний цвет по центру сегмента: несколько пикселей вокруг mid_y
         mid_y = (top_y + bottom_y) // 2
-        # возьмём несколько пикселей вокруг mid_y, если есть
-        sample_colors = []
-        for dy in range(-2, 3):
-            yy = mid_y + dy
-            if 0 <= yy < h:
-                px = crop.getpixel((x, yy))
-                if len(px) == 4:
-                    px = px[:3]
-                sample_colors.append(px)
-        # средний цвет
-        avg = tuple(sum(c[i] for c in sample_colors)//len(sample_colors) for i in range(3))
+        sample_colors = sub[max(mid_y - 2, 0):min(mid_y + 3, h), i].astype(np.int64)
+        avg = tuple(int(v) for v in sample_colors.sum(axis=0) // len(sample_colors))
         color = 'green' if is_green(avg) else ('red' if is_red(avg) else 'none')
         candle_infos.append({
             'x': x,
@@ -79,7 +117,44 @@ def analyze_candles(img):
             'color': color,
             'mid': (top_y + bottom_y) / 2
         })
+    return candle_infos
 
+def analyze_candles(img):
+    """
+    Сканируем область графика по колонкам свечей (без раскладки — CROP, SAMPLE_COLS сэмплов),
+    для каждой колонки определяем цвет свечи и её high/low (по окрашенным пикселям).
+    """
+    arr, cols = frame_columns(img)
+    return signal_from_columns(scan_columns(arr[:, cols], cols))
+
+class IncrementalScanner:
+    """
+    analyze_candles для потока кадров: колонки, не изменившиеся с прошлого кадра
+    (или найденные по содержимому после сдвига графика), не сканируются повторно.
+    """
+
+    def __init__(self):
+        self.columns = ColumnCache()
+        self._params = None
+
+    def analyze_candles(self, img):
+        arr, cols = frame_columns(img)
+        params = (tuple(globals()[n] for n in CACHE_PARAMS), arr.shape, tuple(cols))
+        if params != self._params:
+            self.columns.reset()
+            self._params = params
+        sub = arr[:, cols]
+        infos = self.columns.update(sub.transpose(1, 0, 2),
+                                    lambda idx: scan_columns(sub[:, idx], [cols[i] for i in idx]))
+        # результат мог прийти из другой позиции — x берём текущий
+        for x, info in zip(cols, infos):
+            if info is not None:
+                info['x'] = x
+        return signal_from_columns(infos)
+
+@timed()
+def signal_from_columns(candle_infos):
+    """Уровни и сигнал по списку колонок от scan_columns."""
     # очистим None и возьмём последние CANDLES_TO_ANALYSE валидных
     valid = [c for c in candle_infos if c is not None]
     if len(valid) < 3:
@@ -143,50 +218,52 @@ def analyze_candles(img):
         'last_color': last_color
     }
 
+def analyze_file(path):
+    """Открыть скрин (или взять готовый frame.Frame) и прогнать analyze_candles."""
+    with span("decode"):
+        img = as_pil(path)
+    return analyze_candles(img)
+
+# параметры, от которых зависит результат analyze_candles (отпечаток для кэша)
+CACHE_PARAMS = ('AUTO_LAYOUT', 'CROP', 'CANDLES_TO_ANALYSE', 'SAMPLE_COLS', 'NEAR_LEVEL_PX', 'COLOR_MIN', 'COLOR_MARGIN')
+_this = sys.modules[__name__]
+# через result_cache: по пикселям области графика / по файлу (без повторного декодирования)
+analyze_candles_cached = cached_by_image("rta", _this, CACHE_PARAMS, region=lambda img: img.crop(crop_box(img)),
+                                         extra=layout_fingerprint)(analyze_candles)
+analyze_file_cached = cached_by_file("rta-file", _this, CACHE_PARAMS, extra=layout_fingerprint)(analyze_file)
+
+@timed()
 def log_result(filename, res):
-    line = "{time},{file},{signal},{prob},{support_px},{resistance_px}\n".format(
-        time=datetime.now().isoformat(),
-        file=filename,
-        signal=res.get('signal'),
-        prob=res.get('probability'),
-        support_px=int(res.get('support_px',0)),
-        resistance_px=int(res.get('resistance_px',0))
-    )
-    # если файла нет — добавим заголовок
-    newfile = not os.path.exists(RESULTS_CSV)
-    with open(RESULTS_CSV, "a") as f:
-        if newfile:
-            f.write("time,file,signal,probability,support_px,resistance_px\n")
-        f.write(line)
+    """Сигнал в хранилище (signal_store): буфер в памяти, на диск — пачками."""
+    return default_store().append({
+        'source_file': filename,
+        'signal': res.get('signal'),
+        'confidence': res.get('probability'),
+        'support_px': res.get('support_px'),
+        'resistance_px': res.get('resistance_px'),
+        'engine': "real_time_analyzer",
+    })
 
 # ----- Основной цикл -----
 def watch_and_analyze():
-    seen = set()
     # убедимся что папка существует
     if not os.path.exists(SCREENSHOTS_DIR):
         print("Папка screenshots не найдена:", SCREENSHOTS_DIR)
         return
 
-    print("Real-time analyzer started, watching", SCREENSHOTS_DIR)
+    watcher = ScreenshotWatcher(SCREENSHOTS_DIR, poll_interval=POLL_INTERVAL)
+    print("Real-time analyzer started, watching", SCREENSHOTS_DIR, f"({watcher.mode})")
+    last_summary = time.monotonic()
     while True:
         try:
-            files = sorted(
-                [f for f in os.listdir(SCREENSHOTS_DIR) if f.lower().endswith(('.png','.jpg','.jpeg'))],
-                key=lambda p: os.path.getmtime(os.path.join(SCREENSHOTS_DIR, p))
-            )
-            for fn in files:
-                full = os.path.join(SCREENSHOTS_DIR, fn)
-                if full in seen:
-                    continue
-                # новый файл
-                seen.add(full)
+            # новые, уже дописанные файлы приходят сразу после записи
+            for full in watcher:
+                fn = os.path.basename(full)
                 print("🔍 Новый скрин:", fn)
                 try:
-                    img = Image.open(full).convert("RGB")
-                    print("Файл", fn, "открыт, размер", img.size)
-                    res = analyze_candles(img)
+                    res = analyze_file_cached(full)
                     if res is None:
-                        print("❌ Не удалось извлечь свечи — проверь CROP и настройки")
+                        print("❌ Не удалось извлечь свечи — проверь AUTO_LAYOUT / CROP и настройки")
                         continue
                     # печать результата
                     print("➡ Сигнал:", res['signal'])
@@ -196,13 +273,18 @@ def watch_and_analyze():
                     log_result(fn, res)
                 except Exception as e:
                     print("Ошибка анализа:", e)
-            time.sleep(POLL_INTERVAL)
+                if time.monotonic() - last_summary >= SUMMARY_INTERVAL:
+                    last_summary = time.monotonic()
+                    print("⏱", summary_line())
+            break
         except KeyboardInterrupt:
             print("Stopped by user")
             break
         except Exception as e:
             print("Ошибка в основном цикле:", e)
             time.sleep(3)
+    watcher.close()
+    default_store().close()
 
 if __name__ == "__main__":
     watch_and_analyze()
\ No newline at end of file
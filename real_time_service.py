@@ -1,108 +1,278 @@
 #!/usr/bin/env python3
 # real_time_service.py
-# Смотрит папку screenshots, анализирует новые скрины через candle_analyzer.predict_from_image
-# Сохраняет last_signal.json и отправляет POST на overlay сервер /signal/start (если он запущен).
+# Смотрит папку screenshots, анализирует новые скрины движком из engines.py (ENGINE)
+# Конвейер (pipeline.py): поиск файла -> декодирование (потоки) -> анализ (процессы) -> публикация.
+# TA_CAPTURE=memory — вместо папки кадры из разделяемого буфера capture.py: уже декодированные,
+# без записи и чтения PNG (захват кладёт их туда сам, PNG архивирует в фоне).
+# Пишет сигналы в signal_store (last_signal.json — указатель на последний сигнал)
+# и отправляет POST на overlay сервер /signal/start (если он запущен).
 
 import os
+import sys
 import time
-import json
-import requests
+import threading
 from datetime import datetime
+from screenshot_watcher import ScreenshotWatcher
+from pipeline import Pipeline
+from overlay_publisher import OverlayPublisher
+from lazy_import import preload
+from instrumentation import timed, span, set_role, summary_line
+from state_dir import state_path
 
 WATCH_FOLDER = "screenshots"
+CAPTURE = os.environ.get("TA_CAPTURE", "folder")   # folder — PNG из WATCH_FOLDER | memory — capture.SharedFrameSource
 LAST_SIGNAL_FILE = "last_signal.json"
-POLL_INTERVAL = 2.0  # сек
+POLL_INTERVAL = 0.5  # сек — опрос папки, если inotify недоступен
 OVERLAY_SERVER = "http://127.0.0.1:5000"  # если overlay сервер запущен на телефоне
 SEND_TO_OVERLAY = True  # выставь False, если не нужен POST
+DECODE_WORKERS = 2      # потоков декодирования PNG
+DETECT_PAIR = False     # True — пара/OTC (pair_ocr, нужен tesseract) по тому же декодированному кадру
+ANALYZE_WORKERS = 1     # процессов анализа (1 — сохраняется инкрементальное состояние между кадрами)
+STATS_INTERVAL = 30.0   # сек — как часто печатать сводку по стадиям конвейера
+# движок анализа (engines.py): auto | candle | levels | contours | model | "candle,levels" | ensemble
+ENGINE = os.environ.get("TA_ENGINE", "auto")
+PRICE_CALIBRATION = False  # True — OCR шкалы цен (нужен tesseract), в сигнале появится candles_ohlc
+CANDLE_HISTORY = True   # сшивать кадры в историю свечей (candle_history) — индикаторы по сотням свечей
+PID_FILE = state_path("real_time_service.pid")
+# тяжёлые модули: грузятся в фоне сразу после старта, пока сервис ждёт первый скрин
+PRELOAD_MODULES = ("numpy", "PIL.Image", "candle_analyzer", "requests")
 
-# Попробуем импортировать анализатор (candle_analyzer.py). Если нет — попробуем real_time_analyzer
-try:
-    from candle_analyzer import predict_from_image
-except Exception:
+# Анализатор создаётся лениво (первый кадр или прогрев), чтобы импорт сервиса был мгновенным.
+# Какой — решает ENGINE (engines.py): auto — candle_analyzer, без него real_time_analyzer / OpenCV.
+# Кадры идут потоком с одного графика — движки candle/levels пересчитывают только изменившиеся свечи.
+_analyze = None
+_analyze_lock = threading.Lock()
+
+def engine_options():
+    return {"price_calibration": PRICE_CALIBRATION, "candle_history": CANDLE_HISTORY}
+
+def load_analyzer():
+    global _analyze
+    with _analyze_lock:
+        if _analyze is None:
+            from engines import select
+            _analyze = select(ENGINE, **engine_options())
+        return _analyze
+
+def analyze_frame(img):
+    return load_analyzer()(img)
+
+def warmup():
+    """Прогрев: импорты, анализатор и первый прогон numpy/PIL на синтетическом кадре.
+       Прогон — отдельным анализатором, чтобы не засорить состояние рабочего (историю свечей),
+       и с временным кэшем раскладок: раскладка синтетического кадра не попадает ни в layout.json,
+       ни в отпечаток ключей result_cache."""
+    t0 = time.perf_counter()
+    import multiprocessing
+    if multiprocessing.current_process().name != "MainProcess":
+        set_role("analyze")       # воркер пула: свои снимки замеров
+    load_analyzer()
+    from synthetic_chart import make_chart
+    from engines import select
+    from frame import Frame
+    from chart_layout import scratch_layouts
+    run = None
+    try:
+        run = select(ENGINE, **engine_options())
+        with scratch_layouts():
+            run(Frame.from_pil(make_chart(width=360, height=800, candles=20)))
+    except Exception:
+        pass
+    finally:
+        if hasattr(run, "close"):
+            run.close()
+    return time.perf_counter() - t0
+
+def decode_frame(path):
+    """Стадия декодирования: PNG -> frame.Frame (в потоке, PIL отпускает GIL). Больше кадр не декодируется.
+       Кадр из разделяемого буфера (TA_CAPTURE=memory) уже декодирован и проходит как есть."""
+    from frame import Frame
+    if isinstance(path, Frame):
+        return path
+    with span("decode"):
+        return Frame.from_file(path)
+
+def analyze_decoded(frame):
+    """Стадия анализа: выполняется в пуле процессов, состояние анализатора живёт в воркере.
+       Движок(и) и распознавание пары работают с одним и тем же кадром."""
+    with span("analyze"):
+        res = analyze_frame(frame)
+    if DETECT_PAIR:
+        from pair_ocr import recognize
+        try:
+            with span("pair_ocr"):
+                info = recognize(frame)
+            res.pair, res.otc = info["pair"], info["otc"]
+        except Exception as e:
+            print("Пара не распознана:", e)
+    return res
+
+def predict_from_image(path):
+    return analyze_decoded(decode_frame(path))
+
+def make_analyze_executor(workers=ANALYZE_WORKERS, wait_warm=False):
+    """Пул процессов для анализа; где он не работает (Android без sem_open) — пул потоков.
+       Воркеры сразу прогреваются (warmup) — в фоне или, при wait_warm, с ожиданием.
+       Вызывать до запуска фоновых потоков (preload): к возврату все воркеры уже форкнуты."""
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
     try:
-        from real_time_analyzer import analyze_candles as _analyze
-        def predict_from_image(path):
-            # адаптер: real_time_analyzer возвращает dict с полями signal/probability
-            from PIL import Image
-            img = Image.open(path).convert("RGB")
-            res = _analyze(img)  # если _analyze ожидает Image
-            # если _analyze вернул None
-            if res is None:
-                raise RuntimeError("analyze returned None")
-            # приведение к единому формату
-            return {
-                "signal": res.get("signal"),
-                "confidence": res.get("probability") if res.get("probability") is not None else res.get("prob"),
-                "expiry_min": res.get("expiry_min", 1),
-                "meta": res
-            }
+        ex = ProcessPoolExecutor(max_workers=workers)
+        ex.submit(int).result(timeout=30)
     except Exception as e:
-        print("Не удалось найти candle_analyzer или real_time_analyzer:", e)
-        raise SystemExit(1)
+        print("Пул процессов недоступен, анализ в потоках:", e)
+        ex = ThreadPoolExecutor(max_workers=workers)
+    warm = [ex.submit(warmup) for _ in range(workers)]
+    if wait_warm:
+        for f in warm:
+            f.result()
+    return ex
+
+_store = None
+
+def signal_store():
+    """Хранилище сигналов; указатель на последний сигнал — LAST_SIGNAL_FILE (пишется атомарно)."""
+    global _store
+    if _store is None:
+        from signal_store import SignalStore
+        _store = SignalStore(latest_path=LAST_SIGNAL_FILE)
+    return _store
 
 def save_last_signal(data: dict):
-    with open(LAST_SIGNAL_FILE, "w") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    """Строка в хранилище + last_signal.json; возвращает id сигнала."""
+    details = data.get("details") or {}
+    return signal_store().append({
+        "source_file": data.get("source_file"),
+        "pair": data.get("pair"),
+        "otc": data.get("otc"),
+        "signal": data.get("signal"),
+        "confidence": data.get("confidence"),
+        "expiry_min": details.get("expiry_min"),
+        "engine": data.get("engine"),
+    }, latest=data)
+
+_publisher = None
+
+def overlay_publisher():
+    """Общий фоновый отправитель на overlay (keep-alive, коалесинг, повторы, breaker)."""
+    global _publisher
+    if _publisher is None:
+        _publisher = OverlayPublisher(OVERLAY_SERVER)
+    return _publisher
 
+@timed()
 def send_to_overlay(data: dict):
+    # не блокирует: отправка идёт в фоне, лежащий overlay не тормозит анализ
     if not SEND_TO_OVERLAY:
         return
+    overlay_publisher().publish(data)
+
+@timed()
+def publish_signal(path, res):
+    """Стадия публикации: last_signal.json + overlay (только для самого свежего кадра).
+       path — путь скрина или frame.Frame из разделяемого буфера (имя — его архивный PNG)."""
+    if not isinstance(path, str):
+        path = path.path or "memory"
+    fn = os.path.basename(path)
+    # res — engines.AnalysisResult, формат один для всех движков
+    signal = res.signal
+    confidence = res.confidence
+    out = {
+        "signal": signal,
+        "confidence": confidence,
+        "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "source_file": fn,
+        "engine": res.engine,
+        "pair": res.pair,
+        "otc": res.otc,
+        "details": res.to_dict()
+    }
+    out["id"] = save_last_signal(out)
+    print("🔍 Скрин:", fn)
+    print("➡ Сигнал:", signal)
+    print("📊 Вероятность:", confidence)
+    # отправляем на overlay (если включено)
     try:
-        url = OVERLAY_SERVER.rstrip("/") + "/signal/start"
-        r = requests.post(url, json=data, timeout=3)
-        # не критично — просто логируем
-        print("POST to overlay:", r.status_code, r.text[:200])
+        send_to_overlay(out)
     except Exception as e:
-        print("Ошибка отправки на overlay:", e)
+        print("Ошибка отправки:", e)
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except (OSError, ValueError):
+        return False
 
-def watch_loop():
-    seen = set()
-    if not os.path.exists(WATCH_FOLDER):
+def acquire_pid_file(path=PID_FILE):
+    """Демон один: если в PID_FILE живой процесс — вернём его pid, иначе запишем свой (None)."""
+    try:
+        with open(path) as f:
+            pid = int(f.read().strip())
+        if pid != os.getpid() and _pid_alive(pid):
+            return pid
+    except (OSError, ValueError):
+        pass
+    with open(path, "w") as f:
+        f.write(str(os.getpid()))
+    return None
+
+def watch_loop(daemon=False):
+    """
+    Обычный запуск: наблюдение за папкой начинается сразу, тяжёлые модули грузятся в фоне.
+    daemon=True — «прогретый» режим для постоянной работы: до начала наблюдения всё
+    импортировано, анализатор и воркеры прогреты, так что первый сигнал не платит за холодный старт.
+    """
+    if CAPTURE != "memory" and not os.path.exists(WATCH_FOLDER):
         print("Папка screenshots не найдена:", WATCH_FOLDER)
         return
-    print("Real-time service started, watching", WATCH_FOLDER)
-    while True:
-        try:
-            files = sorted(
-                [f for f in os.listdir(WATCH_FOLDER) if f.lower().endswith(('.png','.jpg','.jpeg'))],
-                key=lambda p: os.path.getmtime(os.path.join(WATCH_FOLDER, p))
-            )
-            for fn in files:
-                full = os.path.join(WATCH_FOLDER, fn)
-                if full in seen:
-                    continue
-                seen.add(full)
-                print("🔍 Новый скрин:", fn)
-                try:
-                    res = predict_from_image(full)
-                except Exception as e:
-                    print("Ошибка анализа изображения:", e)
-                    continue
-                # Унифицированный формат
-                signal = res.get("signal", "NEUTRAL")
-                confidence = float(res.get("confidence", 50.0))
-                out = {
-                    "signal": signal,
-                    "confidence": confidence,
-                    "time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "source_file": fn,
-                    "details": res.get("meta", res)
-                }
-                save_last_signal(out)
-                print("➡ Сигнал:", signal)
-                print("📊 Вероятность:", confidence)
-                # отправляем на overlay (если включено)
-                try:
-                    send_to_overlay(out)
-                except Exception as e:
-                    print("Ошибка отправки:", e)
-            time.sleep(POLL_INTERVAL)
-        except KeyboardInterrupt:
-            print("Stopped by user")
-            break
-        except Exception as e:
-            print("Ошибка в основном цикле:", e)
-            time.sleep(3)
+    set_role("service")
+    if daemon:
+        other = acquire_pid_file()
+        if other:
+            print("Сервис уже запущен, pid", other)
+            return
+        t0 = time.perf_counter()
+        preload(PRELOAD_MODULES, background=False)
+        executor = make_analyze_executor(wait_warm=True)
+        signal_store()
+        print(f"Прогрет за {time.perf_counter() - t0:.2f} с")
+    else:
+        # сначала пул: воркеры форкаются, пока в процессе нет других потоков. Форк посреди
+        # фонового импорта унаследовал бы захваченные блокировки импорта — воркер зависает навсегда
+        executor = make_analyze_executor()
+        preload(PRELOAD_MODULES)
+    if CAPTURE == "memory":
+        from capture import SharedFrameSource, CAPTURE_FILE
+        source, watching = SharedFrameSource(), CAPTURE_FILE
+    else:
+        source, watching = ScreenshotWatcher(WATCH_FOLDER, poll_interval=POLL_INTERVAL), WATCH_FOLDER
+    pipe = Pipeline(source, decode_frame, analyze_decoded, publish_signal, executor,
+                    decode_workers=DECODE_WORKERS, analyze_workers=ANALYZE_WORKERS)
+    print("Real-time service started, watching", watching, f"({source.mode})")
+    pipe.start()
+    try:
+        while True:
+            time.sleep(STATS_INTERVAL)
+            if _store is not None:
+                _store.flush()  # чтобы overlay_server видел сигналы для склейки с feedback
+            line = pipe.format_stats()
+            if _publisher is not None:
+                line += " | overlay: " + " ".join(f"{k}={v}" for k, v in _publisher.stats().items())
+            print("📈", line)
+            print("⏱", summary_line())
+    except KeyboardInterrupt:
+        print("Stopped by user")
+    finally:
+        pipe.stop()
+        if _publisher is not None:
+            _publisher.close()
+        if _store is not None:
+            _store.close()
+        if daemon:
+            try:
+                os.remove(PID_FILE)
+            except OSError:
+                pass
 
 if __name__ == "__main__":
-    watch_loop()
+    watch_loop(daemon="--daemon" in sys.argv[1:])
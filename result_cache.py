@@ -0,0 +1,195 @@
+# result_cache.py
+# Кэш результатов анализа: повторный анализ неизменившегося скриншота бесплатен.
+# Ключ = пространство имён + отпечаток параметров анализатора + ключ файла/картинки.
+#   - ключ файла: (dev, inode, mtime_ns, size) — один stat, без чтения файла;
+#     hash_files=True — blake2b содержимого (переживает копирование/переименование);
+#   - ключ картинки: blake2b байтов пикселей (для функций, которые получают PIL Image);
+#   - отпечаток параметров читается из модуля при каждом вызове, поэтому смена
+#     NUM_CANDLES / CROP / порогов (в т.ч. через setattr) сама делает старые записи недоступными;
+#     extra() — состояние вне модуля, от которого зависит результат (раскладка графика из layout.json).
+# Два уровня: LRU в памяти + sqlite-файл на диске с ограничением размера (вытеснение по atime).
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+from state_dir import state_path
+
+CACHE_FILE = state_path(".cache", "results.sqlite")
+MEMORY_ITEMS = 256                 # записей в памяти
+DISK_MAX_BYTES = 64 * 1024 * 1024  # потолок размера записей на диске
+_MISS = object()
+
+
+def file_key(path, hash_files=False):
+    """Ключ файла: по stat (быстро) или по хэшу содержимого."""
+    if hash_files:
+        h = hashlib.blake2b(digest_size=16)
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        return "h:" + h.hexdigest()
+    st = os.stat(path)
+    return f"s:{st.st_dev}:{st.st_ino}:{st.st_mtime_ns}:{st.st_size}"
+
+
+def image_key(img):
+    """Ключ PIL-картинки по её пикселям."""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(f"{img.mode}:{img.size}".encode())
+    h.update(img.tobytes())
+    return "i:" + h.hexdigest()
+
+
+def params_fingerprint(module, names):
+    """Короткий хэш значений параметров модуля (NUM_CANDLES, CROP, пороги ...)."""
+    values = repr(tuple(getattr(module, n) for n in names))
+    return hashlib.blake2b(values.encode(), digest_size=8).hexdigest()
+
+
+class ResultCache:
+    """LRU в памяти поверх sqlite на диске. Значения — JSON-сериализуемые результаты."""
+
+    def __init__(self, path=CACHE_FILE, memory_items=MEMORY_ITEMS, disk_max_bytes=DISK_MAX_BYTES):
+        self.path = path
+        self.memory_items = memory_items
+        self.disk_max_bytes = disk_max_bytes
+        self._mem = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self._disk_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _conn(self):
+        if self._db is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS results ("
+                             "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, atime REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS results_atime ON results(atime)")
+            self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        return self._db
+
+    def _remember(self, key, raw):
+        self._mem[key] = raw
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.memory_items:
+            self._mem.popitem(last=False)
+
+    def get(self, key, default=None):
+        with self._lock:
+            raw = self._mem.get(key)
+            if raw is not None:
+                self._mem.move_to_end(key)
+            else:
+                db = self._conn()
+                row = db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return default
+                raw = row[0]
+                db.execute("UPDATE results SET atime = ? WHERE key = ?", (time.time(), key))
+                db.commit()
+                self._remember(key, raw)
+            self.hits += 1
+        # каждый раз новый объект — вызывающий код может его менять
+        return json.loads(raw)
+
+    def put(self, key, value):
+        raw = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._remember(key, raw)
+            db = self._conn()
+            old = db.execute("SELECT size FROM results WHERE key = ?", (key,)).fetchone()
+            db.execute("INSERT OR REPLACE INTO results (key, value, size, atime) VALUES (?, ?, ?, ?)",
+                       (key, raw, len(raw), time.time()))
+            self._disk_bytes += len(raw) - (old[0] if old else 0)
+            if self._disk_bytes > self.disk_max_bytes:
+                self._evict(db)
+            db.commit()
+
+    def _evict(self, db):
+        """Удаляем самые давно использованные записи, пока не уложимся в 90% лимита."""
+        target = self.disk_max_bytes * 0.9
+        rows = db.execute("SELECT key, size FROM results ORDER BY atime").fetchall()
+        drop = []
+        for key, size in rows:
+            if self._disk_bytes <= target:
+                break
+            drop.append((key,))
+            self._disk_bytes -= size
+        db.executemany("DELETE FROM results WHERE key = ?", drop)
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+            db = self._conn()
+            db.execute("DELETE FROM results")
+            db.commit()
+            self._disk_bytes = 0
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_default = None
+
+
+def default_cache():
+    global _default
+    if _default is None:
+        _default = ResultCache()
+    return _default
+
+
+def _params_key(namespace, module, param_names, extra):
+    key = f"{namespace}:{params_fingerprint(module, param_names)}"
+    return f"{key}:{extra()}" if extra else key
+
+
+def cached_by_file(namespace, module, param_names, cache=None, hash_files=False, extra=None):
+    """Декоратор для fn(path, ...) -> результат; кэширует по ключу файла и параметрам модуля.
+       extra() -> str — дополнительная часть отпечатка; читается и после вызова fn: если fn сам
+       её поменял (например, нашёл раскладку), результат кладётся под новый ключ."""
+    def wrap(fn):
+        def cached(path, *args, **kwargs):
+            c = cache or default_cache()
+            fkey = file_key(path, hash_files)
+            res = c.get(f"{_params_key(namespace, module, param_names, extra)}:{fkey}", _MISS)
+            if res is _MISS:
+                res = fn(path, *args, **kwargs)
+                c.put(f"{_params_key(namespace, module, param_names, extra)}:{fkey}", res)
+            return res
+        cached.__name__ = fn.__name__ + "_cached"
+        cached.__doc__ = fn.__doc__
+        return cached
+    return wrap
+
+
+def cached_by_image(namespace, module, param_names, cache=None, region=None, extra=None):
+    """Декоратор для fn(img, ...) -> результат; кэширует по пикселям картинки и параметрам модуля.
+       region(img) -> часть картинки, от которой реально зависит результат (хэшировать меньше);
+       extra — как у cached_by_file."""
+    def wrap(fn):
+        def cached(img, *args, **kwargs):
+            c = cache or default_cache()
+            key_img = region(img) if region else img
+            ikey = image_key(key_img)
+            res = c.get(f"{_params_key(namespace, module, param_names, extra)}:{ikey}", _MISS)
+            if res is _MISS:
+                res = fn(img, *args, **kwargs)
+                c.put(f"{_params_key(namespace, module, param_names, extra)}:{ikey}", res)
+            return res
+        cached.__name__ = fn.__name__ + "_cached"
+        cached.__doc__ = fn.__doc__
+        return cached
+    return wrap
@@ -1,6 +1,6 @@
-import time
 import os
 from analyzer import Analyzer
+from screenshot_watcher import ScreenshotWatcher
 
 WATCH_DIR = "screenshots"
 
@@ -8,29 +8,24 @@ def watch_and_analyze():
     print("📡 Real-time analyzer запущен. Ожидание новых скриншотов...")
 
     analyzer = Analyzer()
-    processed = set()
+    watcher = ScreenshotWatcher(WATCH_DIR, exts=(".png",))
 
-    while True:
-        files = sorted(os.listdir(WATCH_DIR))
+    try:
+        for full_path in watcher:
+            f = os.path.basename(full_path)
+            print(f"\n🔍 Найден новый скриншот: {f}")
 
-        for f in files:
-            if f.endswith(".png") and f not in processed:
-                full_path = os.path.join(WATCH_DIR, f)
-                print(f"\n🔍 Найден новый скриншот: {f}")
+            try:
+                signal, prob, exp = analyzer.analyze_image(full_path)
 
-                try:
-                    signal, prob, exp = analyzer.analyze_image(full_path)
+                print(f"➡ Сигнал: {signal}")
+                print(f"📊 Вероятность: {prob}%")
+                print(f"⏱ Экспирация: {exp} мин")
 
-                    print(f"➡ Сигнал: {signal}")
-                    print(f"📊 Вероятность: {prob}%")
-                    print(f"⏱ Экспирация: {exp}")
-
-                except Exception as e:
-                    print(f"❌ Ошибка анализа: {e}")
-
-                processed.add(f)
-
-        time.sleep(3)
+            except Exception as e:
+                print(f"❌ Ошибка анализа: {e}")
+    finally:
+        watcher.close()
 
 if __name__ == "__main__":
     watch_and_analyze()
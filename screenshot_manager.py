@@ -1,5 +1,6 @@
 import os
 from datetime import datetime
+from capture import publish_frame, default_archiver
 
 # Папка куда сохраняем скриншоты
 SCREENSHOT_DIR = "screenshots"
@@ -9,16 +10,22 @@ if not os.path.exists(SCREENSHOT_DIR):
     os.makedirs(SCREENSHOT_DIR)
 
 
-def save_screenshot(image_bytes):
+def save_screenshot(image_bytes, publish=True):
     """
     Сохраняет изображение, переданное из приложения,
     например снимок экрана графика.
+    image_bytes — PNG/JPEG байты или уже готовый кадр (frame.Frame, массив пикселей).
+    publish=True — кадр сразу уходит в анализ через разделяемый буфер (capture.py).
+    Файл пишется в фоне: имя возвращается сразу, до того как PNG появился на диске.
+    Кому нужен сам файл (чтение, отправка пакета) — сначала capture.default_archiver().flush().
     """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     filename = f"{SCREENSHOT_DIR}/shot_{timestamp}.png"
 
-    with open(filename, "wb") as f:
-        f.write(image_bytes)
+    if publish:
+        publish_frame(image_bytes, filename, archive=True)
+    else:
+        default_archiver().submit(image_bytes, filename)
 
     print("Saved:", filename)
     return filename
\ No newline at end of file
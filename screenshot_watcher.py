@@ -0,0 +1,240 @@
+# screenshot_watcher.py
+# Общий наблюдатель за папкой со скриншотами для всех циклов watch_*.
+# На Linux/Android — inotify (через ctypes, без зависимостей): файл приходит сразу
+# после IN_CLOSE_WRITE / IN_MOVED_TO, т.е. уже полностью записанным.
+# Если inotify недоступен (другая ОС, FUSE без событий) — os.scandir: папка пересканируется
+# только когда меняется её mtime. Новым считается файл, которого среди отданных нет по
+# имени + inode + mtime — поэтому приходят и скопированные/перемещённые файлы со старым mtime.
+# Отданные помним только пока они лежат в папке: удалённые забываются по IN_DELETE / IN_MOVED_FROM
+# (или при пересканировании в режиме scandir), так что память ограничена содержимым папки,
+# а не временем работы, и новый файл в режиме inotify стоит O(1) при любом размере архива.
+
+import os
+import time
+import struct
+import select
+from collections import deque
+
+IMAGE_EXTS = ('.png', '.jpg', '.jpeg')
+POLL_INTERVAL = 0.25   # сек — период опроса в режиме fallback (один stat папки, если ничего не менялось)
+SETTLE_TIME = 0.3      # сек — файл моложе считается недописанным, пока mtime/size не совпадут на двух проходах
+
+# константы из <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_inotify():
+    """Возвращает libc с inotify_* или None, если платформа их не даёт."""
+    try:
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError, ImportError):
+        return None
+    return libc
+
+
+class ScreenshotWatcher:
+    """
+    Отдаёт полные пути новых, полностью записанных файлов из folder.
+
+        watcher = ScreenshotWatcher("screenshots")
+        for path in watcher: ...            # блокирующий итератор
+        watcher.run(callback)               # то же через callback
+        async for path in watcher: ...      # асинхронный итератор
+
+    include_existing=True — сначала отдать уже лежащие файлы (по mtime), как делали старые циклы.
+    Состояние (курсор, inotify fd) живёт в объекте, поэтому после исключения
+    можно снова начать итерацию — уже отданные файлы повторно не придут.
+    """
+
+    def __init__(self, folder, exts=IMAGE_EXTS, include_existing=True,
+                 poll_interval=POLL_INTERVAL, settle_time=SETTLE_TIME, use_inotify=True):
+        self.folder = folder
+        self.exts = tuple(e.lower() for e in exts)
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self._closed = False
+        self._known = {}               # name -> (inode, mtime_ns) отданных файлов, которые ещё в папке
+        self._pending = {}             # name -> (mtime_ns, size) — ещё дописываются
+        self._dir_mtime_ns = None
+        self._fd = None
+        if use_inotify:
+            self._fd = self._init_inotify()
+        self.mode = "inotify" if self._fd is not None else "scandir"
+        self._backlog = deque(self._scan())
+        if not include_existing:
+            # стартуем с «сейчас»: всё, что уже лежит, считаем отданным
+            self._backlog.clear()
+
+    # ----- inotify -----
+    def _init_inotify(self):
+        libc = _load_inotify()
+        if libc is None:
+            return None
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+        wd = libc.inotify_add_watch(fd, os.fsencode(self.folder),
+                                    IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM)
+        if wd < 0:
+            os.close(fd)
+            return None
+        return fd
+
+    def _read_events(self, timeout):
+        """Новые файлы из событий inotify за timeout; при переполнении очереди — досканирование."""
+        try:
+            ready, _, _ = select.select([self._fd], [], [], timeout)
+            if not ready:
+                return []
+            data = os.read(self._fd, 64 * 1024)
+        except (BlockingIOError, OSError, ValueError, TypeError):
+            # BlockingIOError — событие уже вычитано; OSError/TypeError — fd закрыли из close()
+            return []
+        events = []
+        off = 0
+        while off + _EVENT_HEADER.size <= len(data):
+            _wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, off)
+            off += _EVENT_HEADER.size
+            name = data[off:off + length].rstrip(b"\0")
+            off += length
+            if mask & IN_Q_OVERFLOW:
+                return self._scan()
+            if name:
+                events.append((mask, os.fsdecode(name)))
+        out = []
+        for mask, name in events:
+            if not name.lower().endswith(self.exts):
+                continue
+            if mask & (IN_DELETE | IN_MOVED_FROM):
+                # файл ушёл из папки — забываем его (вернётся под тем же именем — придёт снова)
+                self._known.pop(name, None)
+                self._pending.pop(name, None)
+                continue
+            try:
+                st = os.stat(os.path.join(self.folder, name))
+            except OSError:
+                continue
+            # событие может прийти для файла, уже отданного досканированием
+            if self._deliver(name, (st.st_ino, st.st_mtime_ns)):
+                out.append(os.path.join(self.folder, name))
+        return out
+
+    # ----- scandir -----
+    def _deliver(self, name, key):
+        """Отметить файл отданным; False — эта версия файла (inode, mtime) уже была отдана."""
+        self._pending.pop(name, None)
+        if self._known.get(name) == key:
+            return False
+        self._known[name] = key
+        return True
+
+    def _prune(self, present):
+        """Забыть отданные файлы, которых в папке больше нет (present — имена из scandir)."""
+        for name in [n for n in self._known if n not in present]:
+            del self._known[name]
+
+    def _scan(self):
+        """Один проход scandir: вернуть новые дописанные файлы (полные пути, по mtime) и сдвинуть курсор."""
+        now_ns = time.time_ns()
+        settle_ns = int(self.settle_time * 1e9)
+        fresh = []
+        present = set()
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                name = entry.name
+                if not name.lower().endswith(self.exts):
+                    continue
+                present.add(name)
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                m = st.st_mtime_ns
+                if self._known.get(name) == (st.st_ino, m):
+                    continue
+                fresh.append((m, name, st.st_size, st.st_ino))
+        self._prune(present)
+
+        ready = []
+        for m, name, size, ino in sorted(fresh):
+            if now_ns - m < settle_ns:
+                # файл ещё может дописываться: отдаём, когда mtime/size совпадут на двух проходах
+                prev = self._pending.get(name)
+                self._pending[name] = (m, size)
+                if prev != (m, size):
+                    continue
+            ready.append((m, name, ino))
+        try:
+            self._dir_mtime_ns = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            pass
+        return [os.path.join(self.folder, name) for m, name, ino in ready if self._deliver(name, (ino, m))]
+
+    def _poll(self):
+        """Fallback: пересканировать папку, только если она изменилась или есть недописанные файлы."""
+        time.sleep(self.poll_interval)
+        try:
+            dir_mtime = os.stat(self.folder).st_mtime_ns
+        except OSError:
+            return []
+        if dir_mtime == self._dir_mtime_ns and not self._pending:
+            return []
+        return self._scan()
+
+    # ----- публичный интерфейс -----
+    def __iter__(self):
+        while not self._closed:
+            if self._backlog:
+                yield self._backlog.popleft()
+                continue
+            if self._fd is not None:
+                paths = self._read_events(self.poll_interval)
+                if not paths and self._pending:
+                    # файлы, застигнутые при старте недописанными
+                    paths = self._scan()
+                for path in paths:
+                    yield path
+            else:
+                for path in self._poll():
+                    yield path
+
+    def run(self, callback):
+        """Вызывать callback(path) для каждого нового файла, пока не вызван close()."""
+        for path in self:
+            callback(path)
+
+    async def __aiter__(self):
+        import asyncio  # только для async for — не тянем asyncio в синхронные сервисы
+        loop = asyncio.get_running_loop()
+        it = iter(self)
+        while True:
+            path = await loop.run_in_executor(None, next, it, None)
+            if path is None:
+                return
+            yield path
+
+    def close(self):
+        self._closed = True
+        if self._fd is not None:
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
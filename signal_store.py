@@ -0,0 +1,433 @@
+# signal_store.py
+# Хранилище сигналов с одной фиксированной схемой вместо results.csv и перезаписи last_signal.json.
+#
+#   store = SignalStore()                       # каталог signals/
+#   sid = store.append({'signal': 'UP', 'confidence': 71.5, 'source_file': 'x.png'})
+#   cols = store.query(since=time.time() - 3600, pair='EUR/USD', signal='UP')   # dict колонка -> ndarray
+#
+# Как устроено:
+#   - append() кладёт строку в буфер памяти; на диск буфер уходит пачкой (FLUSH_ROWS строк
+#     или раз в FLUSH_INTERVAL сек) одной дозаписью в журнал journal.jsonl. Срок проверяет
+#     фоновый таймер, а не следующий append(): одиночный сигнал на тихом рынке тоже не ждёт;
+#   - указатель на последний сигнал (latest.json) пишется атомарно: tmp + rename;
+#   - журнал периодически (SEGMENT_ROWS строк или SEGMENT_SECONDS сек) сворачивается в сжатый
+#     колоночный сегмент seg_<first_id>_<last_id>.npz — по массиву на колонку, как в backtest;
+#   - id сигнала — микросекунды с эпохи (уникальный, монотонный), поэтому диапазон id
+#     в имени сегмента — это и диапазон времени: запрос по времени открывает только нужные
+#     сегменты и читает только нужные колонки, текст не сканируется.
+#
+# Старый results.csv (строки по 5 и по 6 полей вперемешку) переносится: python3 signal_store.py import results.csv
+# — через store.extend(rows, keep_time=True): id строк — их исходное время, даже если в хранилище
+# уже есть более поздние сигналы (такие строки ложатся отдельным сегментом), повторный импорт
+# ничего не дублирует.
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+from lazy_import import lazy_module
+from state_dir import state_path
+
+np = lazy_module("numpy")   # сервис стартует без numpy; он нужен только сегментам и запросам
+
+STORE_DIR = state_path("signals")
+JOURNAL_FILE = "journal.jsonl"
+LATEST_FILE = "latest.json"
+SEGMENT_PREFIX = "seg_"
+FLUSH_ROWS = 32            # строк в буфере до дозаписи в журнал
+FLUSH_INTERVAL = 5.0       # сек — максимум, сколько строка живёт только в памяти
+SEGMENT_ROWS = 4096        # строк журнала до сворачивания в сегмент
+SEGMENT_SECONDS = 3600.0   # сек — или раз в час, даже если строк мало
+
+# схема: колонка -> (dtype numpy, значение по умолчанию)
+SCHEMA = {
+    'id': ('i8', 0),
+    'source_file': ('U', ""),
+    'pair': ('U', ""),
+    'otc': ('?', False),
+    'signal': ('U', ""),
+    'confidence': ('f4', float('nan')),
+    'expiry_min': ('i2', 0),
+    'support_px': ('f4', float('nan')),
+    'resistance_px': ('f4', float('nan')),
+    'engine': ('U', ""),
+}
+
+
+def normalize(record):
+    """dict сигнала -> строка схемы (лишние поля отбрасываются, недостающие — по умолчанию)."""
+    row = {}
+    for name, (dtype, default) in SCHEMA.items():
+        value = record.get(name)
+        if value is None or value == "":
+            row[name] = default
+        elif dtype == 'U':
+            row[name] = str(value)
+        elif dtype == '?':
+            row[name] = bool(value)
+        elif dtype[0] == 'i':
+            row[name] = int(value)
+        else:
+            row[name] = float(value)
+    return row
+
+
+def rows_to_columns(rows):
+    """Список строк схемы -> dict колонка -> np.ndarray."""
+    return {name: np.array([r[name] for r in rows], dtype=dtype) for name, (dtype, _) in SCHEMA.items()}
+
+
+def _empty_columns(columns):
+    return {name: np.array([], dtype=SCHEMA[name][0]) for name in columns}
+
+
+def _atomic_write(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class SignalStore:
+    """Буферизованная дозапись сигналов + колоночные сегменты + атомарный указатель на последний."""
+
+    def __init__(self, root=STORE_DIR, latest_path=None, flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL,
+                 segment_rows=SEGMENT_ROWS, segment_seconds=SEGMENT_SECONDS):
+        self.root = root
+        self.latest_path = latest_path or os.path.join(root, LATEST_FILE)
+        self.journal_path = os.path.join(root, JOURNAL_FILE)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.segment_rows = segment_rows
+        self.segment_seconds = segment_seconds
+        self._lock = threading.RLock()
+        self._buffer = []          # ещё не записано в журнал
+        self._journal = []         # уже в журнале, ещё не в сегменте
+        self._buffer_since = None
+        self._timer = None         # дозапись буфера по сроку flush_interval
+        os.makedirs(root, exist_ok=True)
+        self._segments = self._scan_segments()
+        self._last_id = self._rolled_id()
+        self._load_journal()
+
+    # ----- открытие -----
+    def _scan_segments(self):
+        """[(first_id, last_id, имя файла)] по возрастанию id — диапазон прямо из имени."""
+        segs = []
+        for name in os.listdir(self.root):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(".npz"):
+                first, _, last = name[len(SEGMENT_PREFIX):-4].partition("_")
+                segs.append((int(first), int(last), name))
+        return sorted(segs)
+
+    def _rolled_id(self):
+        """Наибольший id в сегментах (сегменты импорта могут лежать внутри чужих диапазонов)."""
+        return max((last for _, last, _ in self._segments), default=0)
+
+    def _load_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        rolled = self._rolled_id()
+        with open(self.journal_path) as f:
+            for line in f:
+                try:
+                    row = normalize(json.loads(line))
+                except ValueError:
+                    continue  # недописанная последняя строка после падения
+                # строки, уже свёрнутые в сегмент (упали между записью сегмента и удалением журнала)
+                if row['id'] > rolled:
+                    self._journal.append(row)
+        if self._journal:
+            self._last_id = max(self._last_id, self._journal[-1]['id'])
+
+    def refresh(self):
+        """Перечитать сегменты и журнал с диска — для читателя, когда пишет другой процесс."""
+        with self._lock:
+            self._segments = self._scan_segments()
+            self._journal = []
+            self._load_journal()
+            self._last_id = max(self._last_id, self._rolled_id())
+
+    # ----- запись -----
+    def _next_id(self):
+        self._last_id = max(int(time.time() * 1e6), self._last_id + 1)
+        return self._last_id
+
+    def append(self, record, latest=None):
+        """
+        Добавляет сигнал, возвращает его id. latest — что положить в указатель на последний
+        сигнал (по умолчанию сам record); id добавляется в него полем 'id'.
+        """
+        with self._lock:
+            row = normalize(record)
+            row['id'] = self._next_id()
+            self._buffer.append(row)
+            if self._buffer_since is None:
+                self._buffer_since = time.monotonic()
+                self._schedule_flush(self.flush_interval)
+            pointer = dict(latest if latest is not None else record)
+            pointer['id'] = row['id']
+            _atomic_write(self.latest_path, json.dumps(pointer, ensure_ascii=False, default=str))
+            if (len(self._buffer) >= self.flush_rows
+                    or time.monotonic() - self._buffer_since >= self.flush_interval):
+                self.flush()
+            return row['id']
+
+    def extend(self, records, keep_time=True):
+        """
+        Пакетное добавление сигналов, возвращает число добавленных строк.
+        keep_time=True — id строки берётся из её поля 'time' (сек с эпохи): исходные время и порядок
+        сохраняются, даже если в хранилище уже есть более поздние сигналы. Такие строки пишутся
+        отдельным сегментом; строки, чей id уже есть в хранилище (повторный импорт), пропускаются.
+        keep_time=False — как append() подряд: id по текущему времени, указатель latest не трогается.
+        """
+        if not keep_time:
+            with self._lock:
+                rows = []
+                for record in records:
+                    row = normalize(record)
+                    row['id'] = self._next_id()
+                    rows.append(row)
+                self._buffer.extend(rows)
+                self.flush()
+                return len(rows)
+
+        timed = sorted(((float(r['time']), normalize(r)) for r in records), key=lambda tr: tr[0])
+        rows = []
+        for t, row in timed:
+            # одна и та же секунда у нескольких строк — соседние микросекунды, порядок строк сохраняется
+            row['id'] = max(int(t * 1e6), rows[-1]['id'] + 1) if rows else int(t * 1e6)
+            rows.append(row)
+        if not rows:
+            return 0
+        with self._lock:
+            existing = set(self.query(since=rows[0]['id'] / 1e6, until=rows[-1]['id'] / 1e6, columns=['id'])['id'].tolist())
+            rows = [r for r in rows if r['id'] not in existing]
+            if not rows:
+                return 0
+            # журнал — в сегмент: строки журнала должны оставаться новее всех сегментов (см. _load_journal)
+            self.roll()
+            self._write_segment(rows)
+            self._last_id = max(self._last_id, rows[-1]['id'])
+        return len(rows)
+
+    def _schedule_flush(self, delay):
+        # после fork таймер родителя в потомке не жив — заводится заново
+        if self._timer is None or not self._timer.is_alive():
+            self._timer = threading.Timer(delay, self._flush_due)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_due(self):
+        """Таймер: буфер, пролежавший flush_interval, — в журнал; моложе — ждём остаток срока."""
+        with self._lock:
+            self._timer = None
+            if self._buffer_since is None:
+                return
+            left = self.flush_interval - (time.monotonic() - self._buffer_since)
+            if left > 0:
+                self._schedule_flush(left)
+                return
+            try:
+                self.flush()
+            except OSError as e:
+                print("Хранилище сигналов: журнал не записан:", e)
+                self._schedule_flush(self.flush_interval)
+
+    def flush(self):
+        """Буфер -> журнал (одна дозапись); при необходимости журнал -> сегмент."""
+        with self._lock:
+            if self._buffer:
+                with open(self.journal_path, "a") as f:
+                    f.write("".join(json.dumps(r, default=_json_default) + "\n" for r in self._buffer))
+                self._journal.extend(self._buffer)
+                self._buffer = []
+                self._buffer_since = None
+            if self._journal and (len(self._journal) >= self.segment_rows
+                                  or time.time() - self._journal[0]['id'] / 1e6 >= self.segment_seconds):
+                self.roll()
+
+    def roll(self):
+        """Сворачивает журнал в сжатый колоночный сегмент и очищает журнал."""
+        with self._lock:
+            if self._buffer:
+                self.flush()
+            if not self._journal:
+                return
+            self._write_segment(self._journal)
+            os.remove(self.journal_path)
+            self._journal = []
+
+    def _write_segment(self, rows):
+        """Строки (по возрастанию id) -> сжатый колоночный сегмент seg_<first>_<last>.npz."""
+        first, last = rows[0]['id'], rows[-1]['id']
+        name = f"{SEGMENT_PREFIX}{first}_{last}.npz"
+        final = os.path.join(self.root, name)
+        tmp = final + ".tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, **rows_to_columns(rows))
+        os.replace(tmp, final)
+        self._segments.append((first, last, name))
+        self._segments.sort()
+
+    def close(self):
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self.flush()
+
+    # ----- чтение -----
+    def latest(self):
+        """Последний сигнал (как был передан в append) или None."""
+        try:
+            with open(self.latest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def query(self, since=None, until=None, pair=None, signal=None, columns=None):
+        """
+        Сигналы за [since, until] (сек с эпохи) с фильтром по паре/сигналу.
+        Возвращает dict колонка -> np.ndarray, строки по возрастанию id.
+        """
+        columns = list(columns or SCHEMA)
+        lo = int(since * 1e6) if since is not None else None
+        hi = int(until * 1e6) if until is not None else None
+        need = set(columns) | {'id'} | ({'pair'} if pair is not None else set()) | ({'signal'} if signal is not None else set())
+
+        parts = []
+        with self._lock:
+            segments = list(self._segments)
+            tail = self._journal + self._buffer
+        for first, last, name in segments:
+            if (lo is not None and last < lo) or (hi is not None and first > hi):
+                continue
+            with np.load(os.path.join(self.root, name)) as z:
+                parts.append({k: z[k] for k in need})
+        if tail:
+            cols = rows_to_columns(tail)
+            parts.append({k: cols[k] for k in need})
+
+        out = {k: [] for k in columns}
+        masks = []
+        for part in parts:
+            ids = part['id']
+            mask = np.ones(len(ids), dtype=bool)
+            if lo is not None:
+                mask &= ids >= lo
+            if hi is not None:
+                mask &= ids <= hi
+            if pair is not None:
+                mask &= part['pair'] == pair
+            if signal is not None:
+                mask &= part['signal'] == signal
+            masks.append(mask)
+            for k in columns:
+                out[k].append(part[k][mask])
+        if not parts:
+            return _empty_columns(columns)
+        res = {k: np.concatenate(v) for k, v in out.items()}
+        ids = np.concatenate([part['id'][m] for part, m in zip(parts, masks)])
+        if len(ids) > 1 and (np.diff(ids) < 0).any():
+            # диапазоны сегментов перекрываются (импорт истории) — восстанавливаем порядок по id
+            order = np.argsort(ids, kind='stable')
+            res = {k: v[order] for k, v in res.items()}
+        return res
+
+    def get(self, signal_id):
+        """Одна строка по id (dict) или None."""
+        signal_id = int(signal_id)
+        with self._lock:
+            for row in reversed(self._buffer + self._journal):
+                if row['id'] == signal_id:
+                    return dict(row)
+            segments = [s for s in self._segments if s[0] <= signal_id <= s[1]]
+        for _, _, name in segments:
+            with np.load(os.path.join(self.root, name)) as z:
+                idx = np.flatnonzero(z['id'] == signal_id)
+                if len(idx):
+                    return {k: z[k][idx[0]].item() for k in SCHEMA}
+        return None
+
+
+def _json_default(value):
+    # numpy-скаляры из normalize() — в обычные числа
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_store():
+    """Общее хранилище на процесс (signals/)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = SignalStore()
+        return _default
+
+
+# ----- перенос старого results.csv -----
+def import_csv(path, store):
+    """
+    Переносит старый results.csv: заголовок на 5 полей (timestamp,filename,signal,confidence,duration),
+    а строки то по 5 (… duration), то по 6 полей (… support_px,resistance_px от real_time_analyzer).
+    """
+    from datetime import datetime
+    records = []
+    with open(path) as f:
+        next(f, None)  # заголовок
+        for line in f:
+            parts = line.strip().split(",")
+            if len(parts) < 4:
+                continue
+            try:
+                ts = datetime.fromisoformat(parts[0].replace(" ", "T")).timestamp()
+            except ValueError:
+                continue
+            rec = {'time': ts, 'source_file': parts[1], 'signal': parts[2], 'confidence': parts[3]}
+            if len(parts) == 5:
+                rec['expiry_min'] = parts[4]
+                rec['engine'] = "candle_analyzer"
+            elif len(parts) >= 6:
+                rec['support_px'], rec['resistance_px'] = parts[4], parts[5]
+                rec['engine'] = "real_time_analyzer"
+            records.append(rec)
+    # id — по исходному времени строки, чтобы запросы по времени работали и для истории
+    return store.extend(records, keep_time=True)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Хранилище сигналов")
+    ap.add_argument("--dir", default=STORE_DIR)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="перенести старый results.csv")
+    imp.add_argument("csv")
+    q = sub.add_parser("query", help="сигналы за период")
+    q.add_argument("--hours", type=float, help="за последние N часов")
+    q.add_argument("--pair")
+    q.add_argument("--signal")
+    args = ap.parse_args(argv)
+
+    store = SignalStore(args.dir)
+    if args.cmd == "import":
+        print("Перенесено строк:", import_csv(args.csv, store))
+        return 0
+    since = time.time() - args.hours * 3600 if args.hours else None
+    cols = store.query(since=since, pair=args.pair, signal=args.signal)
+    for i in range(len(cols['id'])):
+        t = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(cols['id'][i] / 1e6))
+        print(t, cols['signal'][i], f"{cols['confidence'][i]:.2f}", cols['pair'][i], cols['source_file'][i])
+    print("Всего:", len(cols['id']))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,16 @@
+# state_dir.py
+# Где лежит состояние сервисов (кэши, раскладки, калибровка, модель, хранилище сигналов):
+# не в текущем каталоге, а в STATE_DIR — каталоге проекта (рядом с модулями) или в TA_STATE_DIR.
+# Запуск из другого каталога (launcher.py, ярлыки Termux) видит то же состояние и не оставляет
+# файлов там, откуда его запустили.
+#
+#   LAYOUT_FILE = state_path("layout.json")
+
+import os
+
+STATE_DIR = os.environ.get("TA_STATE_DIR") or os.path.dirname(os.path.abspath(__file__))
+
+
+def state_path(*parts):
+    os.makedirs(STATE_DIR, exist_ok=True)     # TA_STATE_DIR может указывать на ещё не созданный каталог
+    return os.path.join(STATE_DIR, *parts)
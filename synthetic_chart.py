@@ -0,0 +1,70 @@
+# synthetic_chart.py
+# Генератор синтетических скриншотов свечного графика — для бенчмарков и проверок
+# без настоящих захватов экрана. Всё воспроизводимо через seed.
+#
+#   from synthetic_chart import make_chart
+#   img = make_chart(width=1080, height=2400, candles=40, noise=6, seed=1)
+#   img.save("screenshots/synthetic.png")
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+BACKGROUND = (19, 23, 34)
+UP_COLOR = (38, 166, 91)
+DOWN_COLOR = (222, 64, 64)
+PLOT_AREA = (0.05, 0.10, 0.95, 0.60)   # left, top, right, bottom — доли экрана
+
+
+def random_walk(candles, seed=0, volatility=1.0):
+    """Ряд OHLC (candles x 4) случайного блуждания в условных единицах цены."""
+    rng = np.random.default_rng(seed)
+    closes = np.cumsum(rng.normal(0, volatility, candles)) + 100.0
+    opens = np.concatenate([[100.0], closes[:-1]])
+    spread = np.abs(rng.normal(0, volatility * 0.6, (candles, 2)))
+    highs = np.maximum(opens, closes) + spread[:, 0]
+    lows = np.minimum(opens, closes) - spread[:, 1]
+    return np.column_stack([opens, highs, lows, closes])
+
+
+def make_chart(width=1080, height=2400, candles=40, up_color=UP_COLOR, down_color=DOWN_COLOR,
+               background=BACKGROUND, plot_area=PLOT_AREA, body_ratio=0.6, wick_scale=1.0,
+               noise=0.0, seed=0, ohlc=None):
+    """
+    Рисует свечной график и возвращает PIL Image (RGB).
+    body_ratio — ширина тела относительно шага свечи; wick_scale — множитель длины фитилей;
+    noise — sigma гауссова шума по пикселям (0 — без шума); ohlc — готовый ряд вместо случайного.
+    """
+    if ohlc is None:
+        ohlc = random_walk(candles, seed)
+    else:
+        ohlc = np.asarray(ohlc, dtype=float)
+        candles = len(ohlc)
+    o, hi, lo, c = ohlc.T
+    mid = (o + c) / 2
+    hi = mid + (hi - mid) * wick_scale
+    lo = mid - (mid - lo) * wick_scale
+
+    img = Image.new("RGB", (width, height), background)
+    draw = ImageDraw.Draw(img)
+    left, top, right, bottom = (int(plot_area[0] * width), int(plot_area[1] * height),
+                                int(plot_area[2] * width), int(plot_area[3] * height))
+    p_min, p_max = lo.min(), hi.max()
+    scale = (bottom - top) / max(p_max - p_min, 1e-9)
+
+    def y(price):
+        return bottom - (price - p_min) * scale
+
+    step = (right - left) / candles
+    half_body = max(step * body_ratio / 2, 1)
+    for i in range(candles):
+        cx = left + step * (i + 0.5)
+        color = up_color if c[i] >= o[i] else down_color
+        draw.line([(cx, y(hi[i])), (cx, y(lo[i]))], fill=color, width=max(int(step * 0.08), 1))
+        y0, y1 = sorted((y(o[i]), y(c[i])))
+        draw.rectangle([cx - half_body, y0, cx + half_body, max(y1, y0 + 1)], fill=color)
+
+    if noise > 0:
+        rng = np.random.default_rng(seed + 1)
+        arr = np.asarray(img, dtype=np.int16) + rng.normal(0, noise, (height, width, 3)).astype(np.int16)
+        img = Image.fromarray(np.clip(arr, 0, 255).astype(np.uint8))
+    return img
@@ -0,0 +1,54 @@
+# test_backtest.py
+# Возобновление бэктеста: out_dir, посчитанный с другими параметрами, не дописывается.
+
+import os
+
+import pytest
+
+import backtest
+from backtest import MANIFEST_FILE, analyzer_params, check_manifest, parse_overrides
+
+
+def test_parse_overrides():
+    assert parse_overrides(["NUM_CANDLES=24", " RIGHT_REGION_RATIO = 0.55"]) == \
+        {'NUM_CANDLES': 24, 'RIGHT_REGION_RATIO': 0.55}
+    assert parse_overrides(None) == {}
+
+
+@pytest.mark.parametrize("item", ["NUM_CANDLES", "=3", "NUM_CANDLES=много"])
+def test_parse_overrides_rejects(item):
+    with pytest.raises(ValueError):
+        parse_overrides([item])
+
+
+def test_unknown_param():
+    with pytest.raises(ValueError):
+        analyzer_params({'NO_SUCH_PARAM': 1})
+
+
+def test_resume_same_params(tmp_path):
+    params = analyzer_params({})
+    check_manifest(str(tmp_path), params)
+    assert (tmp_path / MANIFEST_FILE).exists()
+    check_manifest(str(tmp_path), analyzer_params({}))
+
+
+def test_resume_changed_params(tmp_path):
+    check_manifest(str(tmp_path), analyzer_params({}))
+    with pytest.raises(ValueError, match="NUM_CANDLES"):
+        check_manifest(str(tmp_path), analyzer_params({'NUM_CANDLES': 7}))
+
+
+def test_segments_without_manifest(tmp_path):
+    (tmp_path / f"{backtest.SEGMENT_PREFIX}00000.npz").write_bytes(b"")
+    with pytest.raises(ValueError):
+        check_manifest(str(tmp_path), analyzer_params({}))
+    assert not (tmp_path / MANIFEST_FILE).exists()
+
+
+def test_run_backtest_refuses(tmp_path):
+    out = str(tmp_path / "out")
+    os.makedirs(out)
+    check_manifest(out, analyzer_params({}))
+    with pytest.raises(ValueError):
+        backtest.run_backtest(str(tmp_path / "none"), out, {'NUM_CANDLES': 7}, workers=1, verbose=False)
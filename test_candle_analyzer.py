@@ -0,0 +1,69 @@
+# test_candle_analyzer.py
+# Векторный analyze_columns должен давать ровно то же, что исходный поколоночный analyze_column
+# (он повторён здесь как эталон).
+
+import numpy as np
+import pytest
+
+import candle_analyzer
+from synthetic_chart import make_chart
+
+CHARTS = [
+    dict(seed=0),
+    dict(seed=1, candles=25, noise=6.0),
+    dict(seed=2, background=(245, 245, 245), wick_scale=2.0),
+    dict(seed=3, candles=60, body_ratio=0.3, noise=3.0),
+]
+
+
+@pytest.fixture(autouse=True)
+def fixed_layout(monkeypatch):
+    # раскладку не ищем: сравниваем сканирование колонок, а не chart_layout
+    monkeypatch.setattr(candle_analyzer, "AUTO_LAYOUT", False)
+
+
+# ----- эталон: candle_analyzer.analyze_column до векторизации -----
+def reference_column(region_img, x):
+    px = region_img.load()
+    w, h = region_img.size
+    col_vals = []
+    for y in range(h):
+        r_sum = g_sum = b_sum = 0
+        for dx in (-1, 0, 1):
+            xx = min(max(x + dx, 0), w - 1)
+            r, g, b = px[xx, y][:3]
+            r_sum += r; g_sum += g; b_sum += b
+        col_vals.append((r_sum // 3, g_sum // 3, b_sum // 3))
+    brightness = np.array([0.299*r + 0.587*g + 0.114*b for (r, g, b) in col_vals])
+    green_ratio = np.array([g / (r+g+b+1e-6) for (r, g, b) in col_vals])
+    red_ratio = np.array([r / (r+g+b+1e-6) for (r, g, b) in col_vals])
+
+    score = np.abs(green_ratio - np.roll(green_ratio, 1)) + np.abs(red_ratio - np.roll(red_ratio, 1))
+    score_s = np.convolve(score, np.ones(5)/5, mode='same')
+    candidates = np.where(score_s >= np.percentile(score_s, 85))[0]
+    if candidates.size == 0:
+        middle = h // 2
+        return {'open': middle+2, 'close': middle-2, 'high': middle+5, 'low': middle-5, 'color': 'neutral'}
+    y_min, y_max = int(candidates.min()), int(candidates.max())
+    if y_max - y_min < candle_analyzer.MIN_BODY_HEIGHT:
+        middle = (y_min + y_max)//2
+        return {'open': middle+1, 'close': middle-1, 'high': y_min-3, 'low': y_max+3, 'color': 'neutral'}
+    color = 'up' if green_ratio[y_min:y_max+1].mean() > red_ratio[y_min:y_max+1].mean() else 'down'
+    bright_diff = np.abs(brightness - np.median(brightness))
+    high_candidates = np.where((bright_diff[:y_min] > np.percentile(bright_diff, 70)))[0]
+    high = high_candidates.min() if high_candidates.size else max(y_min-5, 0)
+    low_candidates = np.where((bright_diff[y_max+1:] > np.percentile(bright_diff, 70)))[0]
+    low = (y_max+1) + low_candidates.max() if low_candidates.size else min(y_max+5, h-1)
+    open_px = y_max if color == 'up' else y_min
+    close_px = y_min if color == 'up' else y_max
+    return {'open': int(open_px), 'close': int(close_px), 'high': int(high), 'low': int(low), 'color': color}
+
+
+@pytest.mark.parametrize("params", CHARTS)
+def test_candle_columns_match_reference(params):
+    img = make_chart(width=720, height=1280, **params)
+    region, _ = candle_analyzer.crop_right_region(img)
+    centers = candle_analyzer.estimate_candle_columns(region)
+    expected = [reference_column(region, x) for x in centers]
+    assert candle_analyzer.analyze_columns(region, centers) == expected
+    assert candle_analyzer.extract_candles_from_image(img) == expected
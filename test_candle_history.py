@@ -0,0 +1,75 @@
+# test_candle_history.py
+# Склейка истории из перекрывающихся кадров: match_shift и CandleHistory.update.
+
+import numpy as np
+import pytest
+
+from candle_history import CandleHistory, match_shift
+from synthetic_chart import random_walk
+
+FRAME = 20
+
+
+def to_candles(ohlc, a=1.0, b=0.0):
+    """Цены -> свечи кадра в px (ось y вниз), с перемасштабированием графика px = -(a*price + b)."""
+    px = -(a * ohlc + b)
+    return [{'open': o, 'high': h, 'low': l, 'close': c, 'color': 'up' if c < o else 'down'}
+            for o, h, l, c in px]
+
+
+def assert_affine(got, ref, tol=1e-6):
+    """got ≈ a*ref + b с a > 0: история хранится в координатах первого кадра."""
+    a, b = np.polyfit(ref.ravel(), got.ravel(), 1)
+    assert a > 0
+    assert np.abs(a * ref + b - got).max() <= tol * np.ptp(got)
+
+
+@pytest.mark.parametrize("new", [0, 1, 3])
+def test_match_shift_exact(new):
+    walk = random_walk(60, 1)
+    tail = walk[10:30]
+    frame = 3.0 * walk[10 + new:30 + new] + 5.0
+    got, a, b = match_shift(tail, frame)
+    assert got == new
+    assert a == pytest.approx(3.0) and b == pytest.approx(5.0)
+
+
+def test_match_shift_ignores_unclosed_candle():
+    walk = random_walk(60, 2)
+    tail = walk[10:30].copy()
+    tail[-1] += 7.0                       # незакрытая свеча в истории ещё менялась
+    got, _, _ = match_shift(tail, walk[12:32])
+    assert got == 2
+
+
+@pytest.mark.parametrize("seed", [0, 3, 4])
+def test_update_stitches_frames(seed):
+    walk = random_walk(300, seed)
+    rng = np.random.default_rng(seed)
+    hist = CandleHistory()
+    end, t = FRAME, 0.0
+    assert hist.update(to_candles(walk[:end]), t) == FRAME
+    while end < len(walk):
+        step = min(int(rng.integers(0, 4)), len(walk) - end)
+        end += step
+        t += 60.0 * step
+        frame = walk[end - FRAME:end].copy()
+        frame[-1, 3] += rng.normal(0, 0.5)            # последняя свеча ещё формируется
+        frame[-1, 1] = max(frame[-1, 1], frame[-1, 3])
+        frame[-1, 2] = min(frame[-1, 2], frame[-1, 3])
+        added = hist.update(to_candles(frame, rng.uniform(0.5, 2.0), rng.uniform(-50, 50)), t)
+        assert added == step
+    assert hist.resets == 0
+    assert hist.count == len(walk)
+    # все свечи, кроме последней незакрытой, совпадают с исходным рядом с точностью до масштаба
+    assert_affine(hist.ohlc()[:-1], walk[:-1])
+    assert np.all(np.diff(hist.series()['t']) == 1)
+
+
+def test_update_resets_on_other_chart():
+    hist = CandleHistory()
+    hist.update(to_candles(random_walk(FRAME, 0)), 0.0)
+    other = random_walk(FRAME, 9)[::-1]
+    assert hist.update(to_candles(other), 60.0) == -1
+    assert hist.resets == 1
+    assert hist.count == FRAME
@@ -0,0 +1,117 @@
+# test_capture.py
+# Разделяемый буфер кадра: что записал захват, то и читает анализ. Архив PNG кадры не теряет.
+
+import struct
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import capture
+from capture import Archiver, SharedFrame, SharedFrameSource, parse_raw_screencap
+from frame import Frame
+
+
+def make_frame(w, h, seed=0, name=None, t=None):
+    buf = np.random.default_rng(seed).integers(0, 256, (h, w, 4), dtype=np.uint8)
+    return Frame(buf, name, t)
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "frame.buf")
+    writer, reader = SharedFrame(path), SharedFrame(path)
+    assert reader.read() is None                          # файла ещё нет
+    frame = make_frame(32, 24, name="screenshots/shot_1.png", t=123.5)
+    seq = writer.write(frame)
+    assert seq == 2 and reader.seq() == 2
+    got_seq, got = reader.read()
+    assert got_seq == seq
+    assert np.array_equal(got.buf, frame.buf)
+    assert got.path == "screenshots/shot_1.png" and got.time == 123.5
+    assert reader.read(after=seq) is None                 # нового кадра нет
+    writer.close()
+    reader.close()
+
+
+def test_reader_follows_growth(tmp_path):
+    path = str(tmp_path / "frame.buf")
+    writer, reader = SharedFrame(path), SharedFrame(path)
+    writer.write(make_frame(8, 8, 1))
+    seq, _ = reader.read()
+    big = make_frame(64, 48, 2, name="big.png")
+    writer.write(big)                                     # файл растёт — читатель отображает заново
+    seq2, got = reader.read(after=seq)
+    assert seq2 > seq
+    assert got.buf.shape == (48, 64, 4) and np.array_equal(got.buf, big.buf)
+    small = make_frame(4, 2, 3)
+    writer.write(small)                                   # кадр меньше — файл не сжимается
+    _, got = reader.read(after=seq2)
+    assert np.array_equal(got.buf, small.buf) and got.path is None
+
+
+def test_odd_seq_left_by_crashed_writer(tmp_path):
+    path = str(tmp_path / "frame.buf")
+    writer = SharedFrame(path)
+    writer.write(make_frame(4, 4))
+    struct.pack_into("<Q", writer._map(), 0, 5)           # писатель упал посреди кадра
+    assert SharedFrame(path).read() is None
+    assert writer.write(make_frame(4, 4, 1)) == 8
+    assert SharedFrame(path).read()[0] == 8
+
+
+def test_source_yields_new_frames(tmp_path):
+    path = str(tmp_path / "frame.buf")
+    writer = SharedFrame(path)
+    writer.write(make_frame(4, 4, 0, name="old.png"))
+    source = SharedFrameSource(path, poll_interval=0.001, include_existing=True)
+    frames = iter(source)
+    assert next(frames).path == "old.png"
+    writer.write(make_frame(4, 4, 1, name="new.png"))
+    assert next(frames).path == "new.png"
+    source.close()
+
+
+@pytest.mark.parametrize("header", [12, 16])
+def test_parse_raw_screencap(header):
+    frame = make_frame(5, 3)
+    data = struct.pack("<III", 5, 3, 1) + b"\0" * (header - 12) + frame.buf.tobytes()
+    got = parse_raw_screencap(data, 1.0)
+    assert np.array_equal(got.buf, frame.buf) and got.time == 1.0
+
+
+@pytest.mark.parametrize("data", [b"", struct.pack("<III", 5, 3, 1) + b"\0" * 10,
+                                  struct.pack("<III", 1, 1, 5) + b"\0" * 4])
+def test_parse_raw_screencap_rejects(data):
+    with pytest.raises(ValueError):
+        parse_raw_screencap(data)
+
+
+def test_archiver_slow_disk_keeps_every_frame(tmp_path, monkeypatch):
+    write = capture._write_atomic
+
+    def slow_write(path, data):
+        time.sleep(0.02)
+        write(path, data)
+    monkeypatch.setattr(capture, "_write_atomic", slow_write)
+    archiver = Archiver(maxsize=2)
+    paths = [str(tmp_path / f"shot_{i}.png") for i in range(10)]
+    assert all(archiver.submit(b"png%d" % i, p) for i, p in enumerate(paths))
+    assert archiver.flush(5.0)
+    assert [open(p, "rb").read() for p in paths] == [b"png%d" % i for i in range(10)]
+    assert archiver.stats()['dropped'] == 0
+    archiver.close()
+
+
+def test_archiver_stuck_disk_reports_drop(tmp_path, monkeypatch):
+    release = threading.Event()
+    monkeypatch.setattr(capture, "_write_atomic", lambda path, data: release.wait(5.0))
+    archiver = Archiver(maxsize=1, timeout=0.05)
+    assert archiver.submit(b"a", str(tmp_path / "a.png"))      # пишется (висит на диске)
+    time.sleep(0.05)
+    assert archiver.submit(b"b", str(tmp_path / "b.png"))      # ждёт в очереди
+    assert not archiver.submit(b"c", str(tmp_path / "c.png"))  # очередь полна дольше timeout
+    assert archiver.stats()['dropped'] == 1
+    release.set()
+    assert archiver.flush(5.0)
+    archiver.close()
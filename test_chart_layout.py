@@ -0,0 +1,20 @@
+# test_chart_layout.py
+# Раскладка синтетического графика находится; прогон в scratch_layouts() не трогает рабочий кэш.
+
+import chart_layout
+from chart_layout import LayoutCache, scratch_layouts
+from synthetic_chart import make_chart
+
+
+def test_scratch_layouts_leave_default_cache(tmp_path, monkeypatch):
+    path = tmp_path / "layout.json"
+    monkeypatch.setattr(chart_layout, "_default", LayoutCache(str(path)))
+    fingerprint = chart_layout.default_layouts().fingerprint()
+    with scratch_layouts() as scratch:
+        assert chart_layout.default_layouts() is scratch
+        layout = chart_layout.default_layouts().get(make_chart(width=360, height=800, candles=20))
+        assert layout is not None and len(layout.centers) >= 15
+    assert chart_layout.default_layouts().fingerprint() == fingerprint
+    assert not path.exists()
+    chart_layout.default_layouts().get(make_chart(width=360, height=800, candles=20))
+    assert path.exists() and chart_layout.default_layouts().fingerprint() != fingerprint
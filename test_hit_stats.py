@@ -0,0 +1,47 @@
+# test_hit_stats.py
+# Один результат на id сигнала — и при повторном, и при одновременном feedback.
+
+import threading
+import time
+
+import pytest
+
+from hit_stats import HitStats
+
+SIGNAL = {'id': 42, 'pair': 'EUR/USD', 'signal': 'UP', 'confidence': 71.5, 'expiry_min': 1}
+
+
+def test_repeat_replaces_outcome():
+    stats = HitStats()
+    stats.observe_signal(SIGNAL)
+    assert stats.record_outcome(42, True)
+    assert stats.record_outcome(42, False)
+    snap = stats.snapshot()
+    assert snap['overall']['trades'] == 1 and snap['overall']['wins'] == 0
+    assert snap['groups']['pair']['EUR/USD']['rolling_win_rate'] == 0.0
+    assert snap['duplicates'] == 1
+
+
+@pytest.mark.parametrize("observed", [True, False])
+def test_concurrent_same_id_counted_once(observed):
+    # медленный lookup (SignalStore.get с диска) держит оба потока между проверкой и учётом
+    def lookup(sid):
+        time.sleep(0.05)
+        return SIGNAL
+    stats = HitStats(lookup=lookup)
+    if observed:
+        stats.observe_signal(SIGNAL)
+    start = threading.Barrier(8)
+
+    def post():
+        start.wait()
+        stats.record_outcome(42, True)
+    threads = [threading.Thread(target=post) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    snap = stats.snapshot()
+    assert snap['overall']['trades'] == 1
+    assert snap['groups']['direction']['UP']['trades'] == 1
+    assert snap['duplicates'] == 7
@@ -0,0 +1,53 @@
+# test_indicators.py
+# Инкрементальный режим IncrementalIndicators должен давать то же, что пакетный latest().
+
+import numpy as np
+import pytest
+
+from indicators import INDICATORS, IncrementalIndicators, latest
+from synthetic_chart import random_walk
+
+TOL = 1e-9
+
+
+def assert_same(inc, ref):
+    assert inc.keys() == ref.keys()
+    for name, v in ref.items():
+        if v is None:
+            assert inc[name] is None, name
+        else:
+            assert inc[name] == pytest.approx(v, rel=TOL, abs=TOL), name
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_push_matches_batch(seed):
+    ohlc = random_walk(120, seed)
+    inc = IncrementalIndicators()
+    for i, row in enumerate(ohlc):
+        inc.push(*row)
+        assert_same(inc.values(), latest(ohlc[:i + 1], INDICATORS))
+
+
+def test_replace_last_matches_batch():
+    # незакрытая свеча: каждая свеча сначала приходит «черновиком», потом окончательной
+    ohlc = random_walk(80, 5)
+    draft = ohlc + np.random.default_rng(5).normal(0, 0.5, ohlc.shape)
+    inc = IncrementalIndicators()
+    for i in range(len(ohlc)):
+        inc.push(*draft[i])
+        assert_same(inc.values(), latest(np.vstack([ohlc[:i], draft[i:i + 1]]), INDICATORS))
+        inc.replace_last(*ohlc[i])
+        assert_same(inc.values(), latest(ohlc[:i + 1], INDICATORS))
+
+
+def test_prices_near_one():
+    # котировки вида 1.0850: окна считаются со сдвигом, дисперсия не тонет в округлении
+    ohlc = 1.085 + random_walk(60, 7) * 1e-5
+    inc = IncrementalIndicators()
+    inc.extend(ohlc)
+    ref = latest(ohlc, INDICATORS)
+    assert inc.values()['bb_width_20'] == pytest.approx(ref['bb_width_20'], rel=1e-6)
+
+
+def test_empty():
+    assert IncrementalIndicators().values() == latest(np.empty((0, 4)), INDICATORS)
@@ -0,0 +1,70 @@
+# test_price_calibration.py
+# Калибровка переиспользуется, пока подписи сетки на месте: плашка текущей цены, которая
+# ездит по шкале каждый тик, не должна запускать OCR заново.
+
+import pytest
+from PIL import Image, ImageDraw
+
+import price_calibration
+from price_calibration import Calibrator, axis_box
+
+SIZE = (720, 1280)
+STEP = 100              # px между подписями сетки
+
+
+def draw_axis(first_price, badge_y, offset=0):
+    """Кадр со шкалой: подписи first_price, first_price-1, ... через STEP px и плашка цены на badge_y.
+       Возвращает (картинка, слова OCR в координатах полосы шкалы)."""
+    img = Image.new("RGB", SIZE, (19, 23, 34))
+    draw = ImageDraw.Draw(img)
+    left, top, right, bottom = axis_box(SIZE)
+    words = []
+    for i, y in enumerate(range(top + 40 + offset, bottom - 20, STEP)):
+        text = f"{first_price - i:.2f}"
+        draw.text((left + 10, y), text, fill=(200, 200, 200))
+        words.append((text, 10, y - top, 40, 10))
+    draw.rectangle((left, badge_y, right, badge_y + 14), fill=(38, 166, 91))
+    return img, words
+
+
+@pytest.fixture
+def ocr(monkeypatch):
+    calls = []
+
+    def image_words(strip, psm=None, whitelist=None):
+        calls.append(1)
+        return ocr.words
+    monkeypatch.setattr(price_calibration.ocr_pool, "image_words", image_words)
+    ocr.calls = calls
+    return ocr
+
+
+def test_moving_badge_reuses_fit(ocr, tmp_path):
+    cal = Calibrator(str(tmp_path / "calibration.json"))
+    for frame, badge_y in enumerate(range(150, 1100, 37)):
+        img, ocr.words = draw_axis(1234.0, badge_y)
+        pm = cal.price_map(img)
+        assert pm is not None and pm.a == pytest.approx(-1.0 / STEP)
+    assert len(ocr.calls) == 1
+    # сохранённая калибровка подхватывается новым процессом без OCR
+    assert Calibrator(str(tmp_path / "calibration.json")).price_map(img) is not None
+    assert len(ocr.calls) == 1
+
+
+def test_rescaled_axis_runs_ocr_again(ocr, tmp_path):
+    cal = Calibrator(str(tmp_path / "calibration.json"))
+    img, ocr.words = draw_axis(1234.0, 300)
+    first = cal.price_map(img)
+    img, ocr.words = draw_axis(1240.0, 300, offset=30)
+    second = cal.price_map(img)
+    assert len(ocr.calls) == 2
+    assert second.to_price(300) != pytest.approx(first.to_price(300))
+
+
+def test_failure_is_not_retried_every_frame(ocr, tmp_path):
+    cal = Calibrator(str(tmp_path / "calibration.json"))
+    ocr.words = []
+    for badge_y in (200, 400, 600):
+        img, _ = draw_axis(1234.0, badge_y)
+        assert cal.price_map(img) is None
+    assert len(ocr.calls) == 1
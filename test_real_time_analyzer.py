@@ -0,0 +1,53 @@
+# test_real_time_analyzer.py
+# Сканирование по маскам должно давать ровно то же, что исходный цикл по getpixel
+# (он повторён здесь как эталон).
+
+import pytest
+
+import real_time_analyzer
+from synthetic_chart import make_chart
+
+CHARTS = [
+    dict(seed=0),
+    dict(seed=1, candles=25, noise=6.0),
+    dict(seed=2, background=(245, 245, 245), wick_scale=2.0),
+    dict(seed=3, candles=60, body_ratio=0.3, noise=3.0),
+]
+
+
+@pytest.fixture(autouse=True)
+def fixed_layout(monkeypatch):
+    # раскладку не ищем: сканируется CROP, как до chart_layout
+    monkeypatch.setattr(real_time_analyzer, "AUTO_LAYOUT", False)
+
+
+# ----- эталон: real_time_analyzer — сканирование колонок через getpixel -----
+def reference_scan(img):
+    left, top, right, bottom = real_time_analyzer.CROP
+    crop = img.crop((left, top, right, bottom))
+    w, h = crop.size
+    is_red, is_green = real_time_analyzer.is_red, real_time_analyzer.is_green
+    infos = []
+    for x in real_time_analyzer.sample_columns(w):
+        column = [crop.getpixel((x, y))[:3] for y in range(h)]
+        ys = [y for y, px in enumerate(column) if is_red(px) or is_green(px)]
+        if not ys:
+            infos.append(None)
+            continue
+        top_y, bottom_y = min(ys), max(ys)
+        mid_y = (top_y + bottom_y) // 2
+        sample = [column[yy] for yy in range(mid_y - 2, mid_y + 3) if 0 <= yy < h]
+        avg = tuple(sum(c[i] for c in sample)//len(sample) for i in range(3))
+        color = 'green' if is_green(avg) else ('red' if is_red(avg) else 'none')
+        infos.append({'x': x, 'top': top_y, 'bottom': bottom_y, 'color': color, 'mid': (top_y + bottom_y) / 2})
+    return infos
+
+
+@pytest.mark.parametrize("params, sample_cols", [(p, 40) for p in CHARTS] + [(CHARTS[1], 0)])
+def test_real_time_scan_matches_reference(params, sample_cols, monkeypatch):
+    monkeypatch.setattr(real_time_analyzer, "SAMPLE_COLS", sample_cols)
+    img = make_chart(width=720, height=1280, **params)
+    expected = reference_scan(img)
+    arr, cols = real_time_analyzer.frame_columns(img)
+    assert real_time_analyzer.scan_columns(arr[:, cols], cols) == expected
+    assert real_time_analyzer.analyze_candles(img) == real_time_analyzer.signal_from_columns(expected)
@@ -1,6 +1,7 @@
 # test_run.py
 import os
 from machine_learning import predict_direction
+from candle_analyzer import extract_candles_from_image
 
 def main():
     screenshots_folder = "screenshots"
@@ -19,8 +20,8 @@ def main():
     print(f"Используем скриншот: {filepath}")
 
     # Анализируем через модель
-    signal = predict_direction()
-    print(f"Сигнал: {signal}")
+    signal, prob = predict_direction(extract_candles_from_image(filepath))
+    print(f"Сигнал: {signal} ({prob:.2f}%)")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,66 @@
+# test_screenshot_watcher.py
+# Новые файлы приходят по одному разу; удалённые из папки забываются без пересканирования.
+
+import os
+import time
+
+import pytest
+
+import screenshot_watcher
+from screenshot_watcher import ScreenshotWatcher
+
+
+def put(folder, name, data=b"png", mtime=None):
+    tmp = folder / f".{name}.tmp"
+    tmp.write_bytes(data)
+    if mtime is not None:
+        os.utime(tmp, (mtime, mtime))
+    os.replace(tmp, folder / name)
+
+
+def collect(watcher, count, timeout=3.0):
+    """Первые count новых файлов (или сколько успели за timeout) — тем же путём, что и __iter__."""
+    got = []
+    deadline = time.monotonic() + timeout
+    while len(got) < count and time.monotonic() < deadline:
+        if watcher.mode == "inotify":
+            got += watcher._read_events(0.1)
+        else:
+            got += watcher._poll()
+    return [os.path.basename(p) for p in got]
+
+
+def make_watcher(folder, mode):
+    w = ScreenshotWatcher(str(folder), include_existing=False, poll_interval=0.01, settle_time=0,
+                          use_inotify=(mode == "inotify"))
+    if w.mode != mode:
+        w.close()
+        pytest.skip("inotify недоступен")
+    return w
+
+
+@pytest.mark.parametrize("mode", ["inotify", "scandir"])
+def test_new_and_moved_in_files(tmp_path, mode):
+    put(tmp_path, "old.png")
+    with make_watcher(tmp_path, mode) as w:
+        put(tmp_path, "a.png")
+        put(tmp_path, "b.png", mtime=time.time() - 86400)        # перемещён с old mtime
+        put(tmp_path, "note.txt")
+        assert sorted(collect(w, 2)) == ["a.png", "b.png"]
+        assert collect(w, 1, timeout=0.3) == []
+
+
+@pytest.mark.parametrize("mode", ["inotify", "scandir"])
+def test_deleted_files_are_forgotten(tmp_path, mode, monkeypatch):
+    with make_watcher(tmp_path, mode) as w:
+        put(tmp_path, "a.png")
+        assert collect(w, 1) == ["a.png"]
+        if mode == "inotify":
+            # в режиме inotify папка не пересканируется
+            monkeypatch.setattr(screenshot_watcher.os, "listdir", None)
+            monkeypatch.setattr(w, "_scan", None)
+        os.remove(tmp_path / "a.png")
+        collect(w, 1, timeout=0.3)
+        assert "a.png" not in w._known
+        put(tmp_path, "a.png", b"again")
+        assert collect(w, 1) == ["a.png"]
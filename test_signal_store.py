@@ -0,0 +1,35 @@
+# test_signal_store.py
+# Одиночный сигнал уходит на диск по сроку flush_interval, не дожидаясь следующего append().
+
+import json
+import time
+
+from signal_store import JOURNAL_FILE, SignalStore
+
+
+def journal_ids(root):
+    path = root / JOURNAL_FILE
+    if not path.exists():
+        return []
+    return [json.loads(line)['id'] for line in path.read_text().splitlines()]
+
+
+def test_single_row_flushed_by_deadline(tmp_path):
+    store = SignalStore(str(tmp_path), flush_interval=0.2)
+    sid = store.append({'signal': 'UP', 'confidence': 70.0})
+    assert journal_ids(tmp_path) == []                  # пока в буфере
+    deadline = time.monotonic() + 5.0
+    while not journal_ids(tmp_path) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert journal_ids(tmp_path) == [sid]
+    # другой процесс (новый экземпляр) видит строку
+    assert SignalStore(str(tmp_path)).get(sid)['signal'] == 'UP'
+    store.close()
+
+
+def test_close_cancels_timer(tmp_path):
+    store = SignalStore(str(tmp_path), flush_interval=60.0)
+    sid = store.append({'signal': 'DOWN'})
+    store.close()
+    assert journal_ids(tmp_path) == [sid]
+    assert store._timer is None
@@ -0,0 +1,33 @@
+# test_state_dir.py
+# Файлы состояния не зависят от текущего каталога: каталог проекта или TA_STATE_DIR.
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SHOW = ("import chart_layout, result_cache, instrumentation, price_calibration, signal_store;"
+        "print(chart_layout.LAYOUT_FILE, result_cache.CACHE_FILE, instrumentation.METRICS_DIR,"
+        " price_calibration.CALIBRATION_FILE, signal_store.STORE_DIR)")
+
+
+def paths_from(cwd, state_dir=None):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    env.pop("TA_STATE_DIR", None)
+    if state_dir:
+        env["TA_STATE_DIR"] = str(state_dir)
+    out = subprocess.run([sys.executable, "-c", SHOW], cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    return out.stdout.split()
+
+
+def test_other_cwd_uses_project_dir(tmp_path):
+    paths = paths_from(tmp_path)
+    assert len(paths) == 5 and all(p.startswith(ROOT + os.sep) for p in paths)
+    assert os.listdir(tmp_path) == []
+
+
+def test_state_dir_from_env(tmp_path):
+    state = tmp_path / "state"
+    paths = paths_from(tmp_path, state)
+    assert all(p.startswith(str(state) + os.sep) for p in paths)
+    assert state.is_dir()